@@ -0,0 +1,106 @@
+# backend/AccuracyRoutes.py
+from flask import Blueprint, request, jsonify
+from pymongo import ASCENDING
+from dotenv import load_dotenv
+
+from utils.accuracy import GRANULARITIES, accuracy, accuracy_datasets, ensure_cache_indexes
+from utils.bootstrap import register_index, register_task
+from utils.datasets import DATASETS
+from utils.dates import naive_utc, parse_date
+from utils.mongo import collection
+
+load_dotenv()
+
+accuracyAPI = Blueprint("accuracyAPI", __name__)
+
+# Range $match on the final collections + cache expiry (built at bootstrap)
+for _name in accuracy_datasets():
+    _dataset = DATASETS[_name]
+    _keys = [(_dataset["time_field"], ASCENDING)]
+    if _dataset["series_field"]:
+        _keys.append((_dataset["series_field"], ASCENDING))
+    register_index(collection(_dataset["final"], _dataset["db"]), _keys)
+register_task("Accuracy_Cache: TTL and range indexes", ensure_cache_indexes)
+
+
+@accuracyAPI.route("/<dataset>", methods=["GET"])
+def get_accuracy(dataset):
+    """
+    Forecast accuracy (MAPE, RMSE, bias) of approved data
+    ---
+    tags:
+      - Accuracy
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        enum: [demand, iex_price, plant]
+        required: true
+      - in: query
+        name: start
+        type: string
+        required: false
+        description: "Range start (ISO datetime, inclusive)"
+      - in: query
+        name: end
+        type: string
+        required: false
+        description: "Range end (ISO datetime, exclusive)"
+      - in: query
+        name: granularity
+        type: string
+        enum: [day, week, month, all]
+        required: false
+        description: "Period per row (default day; weeks start on Monday)"
+      - in: query
+        name: by
+        type: string
+        enum: [plant]
+        required: false
+        description: "plant: one row per period and plant (plant dataset only)"
+      - in: query
+        name: plant
+        type: string
+        required: false
+        description: Only this Plant_Name (plant dataset only)
+    responses:
+      200:
+        description: Accuracy rows per period (cached until an approval touches the range)
+      400:
+        description: Invalid parameters
+    """
+    try:
+        if dataset not in accuracy_datasets():
+            return jsonify({"error": f"Accuracy is available for: {', '.join(accuracy_datasets())}"}), 400
+
+        granularity = request.args.get("granularity", "day").lower()
+        if granularity not in GRANULARITIES:
+            return jsonify({"error": f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+
+        by = (request.args.get("by") or "").lower()
+        series = (request.args.get("plant") or "").strip() or None
+        has_series = DATASETS[dataset]["series_field"] is not None
+        if (by or series) and not has_series:
+            return jsonify({"error": "by/plant only apply to the plant dataset"}), 400
+        if by and by != "plant":
+            return jsonify({"error": "by must be 'plant'"}), 400
+
+        try:
+            start = naive_utc(parse_date(request.args.get("start")))
+            end = naive_utc(parse_date(request.args.get("end")))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date: {e}"}), 400
+        if start and end and start >= end:
+            return jsonify({"error": "start must be before end"}), 400
+
+        result = accuracy(dataset, start, end, granularity, by_series=bool(by), series=series)
+        return jsonify({
+            "dataset": dataset,
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "plant": series,
+            **result,
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,96 @@
+# backend/AutoApproveRoutes.py
+from flask import Blueprint, request, jsonify
+from dotenv import load_dotenv
+
+from utils.autoapprove import AutoApproveError, enqueue, load_rules, run, validate_rules
+from utils.dates import parse_date
+
+load_dotenv()
+
+autoApproveAPI = Blueprint("autoApproveAPI", __name__)
+
+
+@autoApproveAPI.route("/rules", methods=["GET"])
+def get_auto_approve_rules():
+    """
+    Auto-approval rules in effect, per dataset
+    ---
+    tags:
+      - Auto Approve
+    responses:
+      200:
+        description: "{dataset: rules} from AUTO_APPROVE_RULES_FILE (empty when disabled)"
+    """
+    try:
+        return jsonify(load_rules()), 200
+    except AutoApproveError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@autoApproveAPI.route("/<dataset>", methods=["POST"])
+def run_auto_approve(dataset):
+    """
+    Evaluate the auto-approval rules over staged days and approve the passing ones
+
+    A real run is queued on this worker's auto-approve thread (202) and its
+    approvals show up on /changes; dry_run is evaluated in the request.
+    ---
+    tags:
+      - Auto Approve
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        required: true
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            start:
+              type: string
+              description: "ISO datetime (default: all staged rows); widened to whole days"
+            end:
+              type: string
+              description: "ISO datetime, exclusive"
+            dry_run:
+              type: boolean
+              description: Report only, approve nothing
+            rules:
+              type: object
+              description: Rules to try instead of the configured ones (dry_run only)
+    responses:
+      200:
+        description: "dry_run: days evaluated, passed, approved_rows, and the held days with their reasons"
+      202:
+        description: "Run queued: dataset, start/end widened to whole days, queued_runs"
+      400:
+        description: Invalid parameters or no rules for the dataset
+    """
+    try:
+        body = request.get_json(silent=True, force=True) or {}
+        if not isinstance(body, dict):
+            return jsonify({"error": "Body must be an object"}), 400
+        try:
+            start = parse_date(body.get("start"))
+            end = parse_date(body.get("end"))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date: {e}"}), 400
+        dry_run = bool(body.get("dry_run"))
+        rules = body.get("rules")
+        if rules is not None:
+            if not dry_run:
+                return jsonify({"error": "rules can only be overridden with dry_run"}), 400
+            rules = validate_rules(dataset, rules)
+
+        if dry_run:
+            return jsonify(run(dataset, start, end, dry_run=True, rules=rules)), 200
+        # Migration + after_approve hooks over a backlog can outlast the worker timeout
+        return jsonify({"message": "Auto-approval queued", **enqueue(dataset, start, end)}), 202
+    except AutoApproveError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
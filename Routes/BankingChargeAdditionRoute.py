@@ -1,33 +1,34 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient, ReplaceOne, ASCENDING, DESCENDING
+from pymongo import ReplaceOne, ASCENDING, DESCENDING
 from bson import ObjectId
 from datetime import datetime
-import os
 from dotenv import load_dotenv
 
+from utils.approval_hooks import after_approve
+from utils.bootstrap import register_index
+from utils.changefeed import publish
+from utils.coalesce import coalesced
+from utils.metrics import record_approval
+from utils.mongo import collection, POWERCASTING_NEW_DB
+from utils.query_guard import QueryRejected, guarded_find
+
 load_dotenv()
 
 bankingAPI = Blueprint("bankingAPI", __name__)
 
 # Mongo setup
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client["power_casting_new"]
-
-approval_collection = db["Banking_Adjust_Consolidated_approval"]
-final_collection = db["Banking_Adjust_Consolidated"]
+approval_collection = collection("Banking_Adjust_Consolidated_approval", POWERCASTING_NEW_DB)
+final_collection = collection("Banking_Adjust_Consolidated", POWERCASTING_NEW_DB)
 
-# Ensure unique index on Timestamp
-try:
-    approval_collection.create_index([("Timestamp", ASCENDING)], unique=True)
-except Exception:
-    pass
+# Ensure unique index on Timestamp (built at bootstrap)
+register_index(approval_collection, [("Timestamp", ASCENDING)], unique=True)
 
 
 # ===============================
 # GET Approval Records
 # ===============================
 @bankingAPI.route("/approvals", methods=["GET"])
+@coalesced
 def get_banking_approvals():
     """
     Get Banking Adjustment Approval Records
@@ -61,13 +62,16 @@ def get_banking_approvals():
         limit = int(request.args.get("limit", 100))
         sort_order = ASCENDING if order == "asc" else DESCENDING
 
-        cursor = approval_collection.find().sort(sort_field, sort_order).limit(limit)
+        cursor = guarded_find(approval_collection, {}, [(sort_field, sort_order)], limit,
+                              fallback_sort=[("Timestamp", sort_order)])
         records = []
         for doc in cursor:
             doc["_id"] = str(doc["_id"])
             records.append(doc)
 
         return jsonify(records), 200
+    except QueryRejected as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -118,6 +122,8 @@ def approve_banking_data():
 
         if ops:
             result = final_collection.bulk_write(ops, ordered=False)
+            record_approval("banking", len(docs))
+            after_approve("banking", docs)
             approval_collection.delete_many({"_id": {"$in": object_ids}})
             return jsonify({
                 "message": "Banking approval migration completed",
@@ -172,6 +178,7 @@ def edit_banking_approval(approval_id):
         if result.matched_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("banking", "updated", 1, ids=[approval_id])
         return jsonify({
             "message": "Approval record updated",
             "updated_fields": data
@@ -206,6 +213,7 @@ def delete_banking_approval(approval_id):
         if result.deleted_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("banking", "deleted", 1, ids=[approval_id])
         return jsonify({"message": "Approval record deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,64 @@
+# backend/ChangeFeedRoutes.py
+from flask import Blueprint, Response, request, jsonify
+from dotenv import load_dotenv
+
+from utils.bootstrap import register_task
+from utils.changefeed import ChangeFeedError, ensure_feed_indexes, iter_sse, open_tail, wsgi_can_stream
+
+load_dotenv()
+
+changesAPI = Blueprint("changesAPI", __name__)
+
+# TTL on Change_Feed when events go through Mongo (built at bootstrap)
+register_task("Change feed: TTL index", ensure_feed_indexes)
+
+
+@changesAPI.route("/<dataset>", methods=["GET"])
+def stream_changes(dataset):
+    """
+    Server-Sent Events feed of an approval queue's changes
+    ---
+    tags:
+      - Changes
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        required: true
+        description: "Queue to follow (demand, iex_price, iex_quantity, plant, demand_output, banking) or a comma-separated list"
+      - in: header
+        name: Last-Event-ID
+        type: string
+        required: false
+        description: Resume after this event (sent automatically by EventSource on reconnect)
+      - in: query
+        name: last_event_id
+        type: string
+        required: false
+        description: Same as Last-Event-ID, for clients that cannot set headers
+    produces:
+      - text/event-stream
+    responses:
+      200:
+        description: "event: inserted|updated|deleted|approved, data: {dataset, op, count, start, end, ids, by, at}; the stream ends after CHANGE_FEED_STREAM_MAX_SECONDS and the client reconnects"
+      400:
+        description: Unknown dataset
+      503:
+        description: "Served by a sync worker (start_app.sh); subscribe through the async server (start_app_async.sh)"
+    """
+    try:
+        # A sync worker would be pinned for the whole stream; asgi.py serves /changes natively
+        if not wsgi_can_stream(request.environ):
+            return jsonify({"error": "The change feed needs the async server (start_app_async.sh) "
+                                     "or a threaded/gevent worker"}), 503
+        names = list(dict.fromkeys(n.strip() for n in dataset.split(",") if n.strip()))
+        last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or None
+        tail = open_tail(names, last_id)
+        return Response(iter_sse(tail), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+    except ChangeFeedError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,116 @@
+# backend/ChecksumRoutes.py
+from flask import Blueprint, request, jsonify
+from datetime import date
+from dotenv import load_dotenv
+
+from utils.bootstrap import register_task
+from utils.checksums import ChecksumError, ensure_checksum_indexes, list_checksums, reconcile
+
+load_dotenv()
+
+checksumAPI = Blueprint("checksumAPI", __name__)
+
+# Unique (day[, series]) index on every checksum collection (built at bootstrap)
+register_task("Checksums: day indexes", ensure_checksum_indexes)
+
+
+@checksumAPI.route("/<dataset>", methods=["GET"])
+def get_checksums(dataset):
+    """
+    Stored per-day checksums of approved data
+    ---
+    tags:
+      - Checksums
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        enum: [demand, iex_price, iex_quantity, plant]
+        required: true
+      - in: query
+        name: start
+        type: string
+        required: true
+        description: "First day (YYYY-MM-DD, inclusive)"
+      - in: query
+        name: end
+        type: string
+        required: true
+        description: "Last day (YYYY-MM-DD, exclusive)"
+      - in: query
+        name: plant
+        type: string
+        required: false
+        description: Only this Plant_Name (plant dataset only)
+    responses:
+      200:
+        description: "day (and Plant_Name), count, checksum per stored day; see utils/checksums.py for the digest format"
+      400:
+        description: Invalid parameters
+    """
+    try:
+        try:
+            start = date.fromisoformat(request.args.get("start", ""))
+            end = date.fromisoformat(request.args.get("end", ""))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid day: {e}"}), 400
+
+        days = list_checksums(dataset, start, end, series=(request.args.get("plant") or "").strip() or None)
+        return jsonify({"dataset": dataset, "days": days}), 200
+    except ChecksumError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@checksumAPI.route("/<dataset>/reconcile", methods=["POST"])
+def reconcile_checksums(dataset):
+    """
+    Compare a source system's per-day checksums with the approved data
+    ---
+    tags:
+      - Checksums
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        enum: [demand, iex_price, iex_quantity, plant]
+        required: true
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            days:
+              type: array
+              items:
+                type: object
+                properties:
+                  day:
+                    type: string
+                    example: "2025-08-01"
+                  Plant_Name:
+                    type: string
+                    description: Required for the plant dataset
+                  checksum:
+                    type: string
+                    description: SHA-256 hex digest of the day's rows
+                  count:
+                    type: integer
+                    description: Optional row count, compared too
+    responses:
+      200:
+        description: "Only the differing days: mismatched, missing_here (no approved rows), missing_client (approved but not sent)"
+      400:
+        description: Invalid body
+    """
+    try:
+        body = request.get_json(silent=True, force=True)
+        if not isinstance(body, dict):
+            return jsonify({"error": "Body must be an object with a days list"}), 400
+        return jsonify(reconcile(dataset, body.get("days"))), 200
+    except ChecksumError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
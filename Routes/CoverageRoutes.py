@@ -0,0 +1,91 @@
+# backend/CoverageRoutes.py
+from flask import Blueprint, request, jsonify
+from pymongo import ASCENDING
+from dotenv import load_dotenv
+
+from utils.bootstrap import register_index
+from utils.coverage import SLOT_MINUTES, CoverageError, coverage
+from utils.datasets import DATASETS
+from utils.dates import parse_date
+from utils.mongo import collection
+
+load_dotenv()
+
+coverageAPI = Blueprint("coverageAPI", __name__)
+
+# Coverage walks the time index of the final collections too (built at bootstrap)
+for _dataset in DATASETS.values():
+    _keys = [(_dataset["time_field"], ASCENDING)]
+    if _dataset["series_field"]:
+        _keys.append((_dataset["series_field"], ASCENDING))
+    register_index(collection(_dataset["final"], _dataset["db"]), _keys)
+
+
+@coverageAPI.route("/<dataset>", methods=["GET"])
+def get_coverage(dataset):
+    """
+    Missing and duplicate time slots of a dataset
+    ---
+    tags:
+      - Coverage
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        enum: [demand, iex_price, iex_quantity, plant, demand_output, banking]
+        required: true
+      - in: query
+        name: stage
+        type: string
+        enum: [staging, final]
+        required: false
+        description: "Collection to check (default final)"
+      - in: query
+        name: start
+        type: string
+        required: false
+        description: "Range start (ISO datetime, inclusive; default the oldest point)"
+      - in: query
+        name: end
+        type: string
+        required: false
+        description: "Range end (ISO datetime, exclusive; default one slot past the newest point)"
+      - in: query
+        name: slot_minutes
+        type: integer
+        required: false
+        description: "Expected spacing of points (default 15)"
+      - in: query
+        name: plant
+        type: string
+        required: false
+        description: Only this Plant_Name (plant dataset only)
+    responses:
+      200:
+        description: Per-series counts with gap and duplicate ranges ([start, end))
+      400:
+        description: Invalid parameters
+    """
+    try:
+        if dataset not in DATASETS:
+            return jsonify({"error": f"Unknown dataset (expected one of {', '.join(DATASETS)})"}), 400
+        try:
+            start = parse_date(request.args.get("start"))
+            end = parse_date(request.args.get("end"))
+            slot_minutes = int(request.args.get("slot_minutes", SLOT_MINUTES))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid parameter: {e}"}), 400
+
+        report = coverage(
+            dataset,
+            stage=request.args.get("stage", "final").lower(),
+            start=start,
+            end=end,
+            slot_minutes=slot_minutes,
+            series=(request.args.get("plant") or "").strip() or None,
+        )
+        return jsonify(report), 200
+    except CoverageError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
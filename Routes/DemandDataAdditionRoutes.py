@@ -1,29 +1,32 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient, ReplaceOne, ASCENDING, DESCENDING
+from pymongo import ReplaceOne, ASCENDING, DESCENDING
 from bson import ObjectId
 from datetime import datetime, timedelta
-import os
 from dotenv import load_dotenv
 
+from utils.anomaly import flag_buffer
+from utils.approval_hooks import after_approve, after_bulk_add
+from utils.bootstrap import register_index
+from utils.changefeed import publish
+from utils.coalesce import coalesced
+from utils.ingest import FLUSH_ROWS, PayloadError, bulk_ingest, iter_request_rows
+from utils.metrics import record_approval, record_bulk_add
+from utils.mongo import collection
+from utils.query_guard import QueryRejected, guarded_find
+
 load_dotenv()
 
 demandAPI = Blueprint("demandAPI", __name__)
 
 # --- MongoDB setup ---
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri, maxPoolSize=200)
-db = client["powercasting"]
-
-approval_collection = db["Demand_approval"]
-main_collection = db["Demand"]
+approval_collection = collection("Demand_approval")
+main_collection = collection("Demand")
 
-# Ensure a unique index on TimeStamp in approval table
-try:
-    approval_collection.create_index([("TimeStamp", ASCENDING)], unique=True)
-except Exception:
-    pass
+# Ensure a unique index on TimeStamp in approval table (built at bootstrap)
+register_index(approval_collection, [("TimeStamp", ASCENDING)], unique=True)
 
 # --- Config ---
+# Row batch of the async (asgi.py) bulk-add; the Flask route flushes per utils.ingest.FLUSH_ROWS
 CHUNK_SIZE = 50_000
 
 
@@ -49,6 +52,25 @@ def get_ist_datetime():
     return ist_now
 
 
+def _build_demand_doc(item: dict, uploader: str, uploaded_at: datetime) -> dict:
+    """Validate one uploaded row into a Demand_approval document"""
+    ts = _parse_timestamp(item.get("TimeStamp"))
+    actual = _to_float(item.get("Demand(Actual)"), "Demand(Actual)")
+
+    pred_present = "Demand(Pred)" in item and item.get("Demand(Pred)") != ""
+    predicted = _to_float(item.get("Demand(Pred)"), "Demand(Pred)") if pred_present else None
+
+    doc = {
+        "TimeStamp": ts,
+        "Demand(Actual)": actual,
+        "uploaded_by": uploader or None,
+        "uploaded_at": uploaded_at,
+    }
+    if pred_present:
+        doc["Demand(Pred)"] = predicted
+    return doc
+
+
 # ===========================================================
 # ✅ Existing: Bulk Add Demand Data
 # ===========================================================
@@ -89,98 +111,32 @@ def bulk_add_demand_data():
         description: Bulk insert/update summary
     """
     try:
-        data = request.get_json(silent=True, force=True)
-
-        if not isinstance(data, list):
-            return jsonify({"error": "Payload must be a list of records"}), 400
-
-        total_received = len(data)
-        if total_received == 0:
-            return jsonify({"message": "No records received"}), 200
-
         user_email = (request.headers.get("X-User-Email") or "").strip()
         now_utc = get_ist_datetime()
 
-        ops: list[ReplaceOne] = []
-        total_upserts = 0
-        total_matched = 0
-        total_modified = 0
-        skipped_invalid = 0
-        first_errors = []
-
-        def flush_ops():
-            nonlocal ops, total_upserts, total_matched, total_modified
-            if not ops:
-                return
-            result = approval_collection.bulk_write(
-                ops,
-                ordered=False,
-                bypass_document_validation=True,
-            )
-            total_upserts += result.upserted_count or 0
-            total_matched += result.matched_count or 0
-            total_modified += result.modified_count or 0
-            ops = []
-
-        for i, item in enumerate(data):
-            try:
-                ts_raw = item.get("TimeStamp")
-                act_raw = item.get("Demand(Actual)")
-
-                ts = _parse_timestamp(ts_raw)
-                actual = _to_float(act_raw, "Demand(Actual)")
-
-                pred_present = "Demand(Pred)" in item and item.get("Demand(Pred)") != ""
-                predicted = _to_float(item.get("Demand(Pred)"), "Demand(Pred)") if pred_present else None
-
-                doc = {
-                    "TimeStamp": ts,
-                    "Demand(Actual)": actual,
-                    "uploaded_by": user_email or None,
-                    "uploaded_at": now_utc,
-                }
-                if pred_present:
-                    doc["Demand(Pred)"] = predicted
-
-                ops.append(
-                    ReplaceOne(
-                        {"TimeStamp": ts},
-                        doc,
-                        upsert=True,
-                    )
-                )
-
-                if len(ops) >= CHUNK_SIZE:
-                    flush_ops()
-
-            except Exception as ex:
-                skipped_invalid += 1
-                if len(first_errors) < 5:
-                    first_errors.append(
-                        {
-                            "row_index": i,
-                            "error": str(ex),
-                            "row_sample": {k: item.get(k) for k in ("TimeStamp", "Demand(Actual)", "Demand(Pred)")},
-                        }
-                    )
-                continue
-
-        flush_ops()
-
-        summary = {
-            "message": "Bulk add completed",
-            "received": total_received,
-            "inserted_new": total_upserts,
-            "replaced_existing": total_matched,
-            "modified_existing": total_modified,
-            "skipped_invalid": skipped_invalid,
-            "chunk_size": CHUNK_SIZE,
-        }
+        result = bulk_ingest(
+            iter_request_rows(request),
+            lambda item: _build_demand_doc(item, user_email, now_utc),
+            approval_collection,
+            ("TimeStamp",),
+            sample_fields=("TimeStamp", "Demand(Actual)", "Demand(Pred)"),
+            flag_rows=lambda buffer: flag_buffer("demand", buffer),
+        )
+        time_range = result.pop("time_range")
+        if result["received"] == 0:
+            return jsonify({"message": "No records received"}), 200
+
+        first_errors = result.pop("sample_errors")
+        summary = {"message": "Bulk add completed", **result, "chunk_size": FLUSH_ROWS}
         if first_errors:
             summary["sample_errors"] = first_errors
 
+        record_bulk_add("demand", summary)
+        after_bulk_add("demand", summary, time_range, user_email)
         return jsonify(summary), 200
 
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -189,6 +145,7 @@ def bulk_add_demand_data():
 # ✅ New: Get Demand Approvals
 # ===========================================================
 @demandAPI.route("/approvals", methods=["GET"])
+@coalesced
 def get_demand_approvals():
     """
     Get all demand approval records
@@ -225,13 +182,16 @@ def get_demand_approvals():
 
         sort_order = ASCENDING if order == "asc" else DESCENDING
 
-        cursor = approval_collection.find().sort(sort_field, sort_order).limit(limit)
+        cursor = guarded_find(approval_collection, {}, [(sort_field, sort_order)], limit,
+                              fallback_sort=[("TimeStamp", sort_order)])
         records = []
         for doc in cursor:
             doc["_id"] = str(doc["_id"])
             records.append(doc)
 
         return jsonify(records), 200
+    except QueryRejected as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -278,12 +238,15 @@ def approve_demand_data():
         ops = []
         for doc in docs:
             doc.pop("_id", None)  # remove old id
+            doc.pop("anomalies", None)  # upload flags stay in staging
             ops.append(
                 ReplaceOne({"TimeStamp": doc["TimeStamp"]}, doc, upsert=True)
             )
 
         if ops:
             result = main_collection.bulk_write(ops, ordered=False)
+            record_approval("demand", len(docs))
+            after_approve("demand", docs)
             approval_collection.delete_many({"_id": {"$in": object_ids}})
 
             return jsonify({
@@ -342,12 +305,14 @@ def edit_demand_approval(approval_id):
 
         result = approval_collection.update_one(
             {"_id": ObjectId(approval_id)},
-            {"$set": update_fields}
+            # Upload-time anomaly flags no longer describe a reviewer-corrected row
+            {"$set": update_fields, "$unset": {"anomalies": ""}}
         )
 
         if result.matched_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("demand", "updated", 1, ids=[approval_id])
         return jsonify({"message": "Approval record updated", "updated_fields": update_fields}), 200
 
     except Exception as e:
@@ -377,6 +342,7 @@ def delete_demand_approval(approval_id):
         if result.deleted_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("demand", "deleted", 1, ids=[approval_id])
         return jsonify({"message": "Approval record deleted"}), 200
 
     except Exception as e:
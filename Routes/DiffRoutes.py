@@ -0,0 +1,85 @@
+# backend/DiffRoutes.py
+from flask import Blueprint, request, jsonify
+from dotenv import load_dotenv
+
+from utils.dates import parse_date
+from utils.diff import DEFAULT_PAGE_SIZE, DiffError, diff
+
+load_dotenv()
+
+diffAPI = Blueprint("diffAPI", __name__)
+
+
+@diffAPI.route("/<dataset>", methods=["GET"])
+def get_diff(dataset):
+    """
+    Preview of what approving staged rows would change in the final collection
+    ---
+    tags:
+      - Diff
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        enum: [demand, iex_price, iex_quantity, plant]
+        required: true
+      - in: query
+        name: start
+        type: string
+        required: false
+        description: "Range start (ISO datetime, inclusive; default: all staged rows)"
+      - in: query
+        name: end
+        type: string
+        required: false
+        description: "Range end (ISO datetime, exclusive)"
+      - in: query
+        name: plant
+        type: string
+        required: false
+        description: Only this Plant_Name (plant dataset only)
+      - in: query
+        name: status
+        type: string
+        required: false
+        description: "Rows to return: comma-separated new, changed, identical (default new,changed)"
+      - in: query
+        name: page
+        type: integer
+        required: false
+        description: "1-based page (default 1)"
+      - in: query
+        name: page_size
+        type: integer
+        required: false
+        description: "Rows per page (default 500)"
+    responses:
+      200:
+        description: "summary (new/changed/identical/total over the range) and one page of rows with staged and final values and changed_fields"
+      400:
+        description: Invalid parameters
+    """
+    try:
+        try:
+            start = parse_date(request.args.get("start"))
+            end = parse_date(request.args.get("end"))
+            page = int(request.args.get("page", 1))
+            page_size = int(request.args.get("page_size", DEFAULT_PAGE_SIZE))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid parameter: {e}"}), 400
+        statuses = [s.strip().lower() for s in request.args.get("status", "new,changed").split(",") if s.strip()]
+
+        result = diff(
+            dataset,
+            start,
+            end,
+            series=(request.args.get("plant") or "").strip() or None,
+            statuses=tuple(dict.fromkeys(statuses)),
+            page=page,
+            page_size=page_size,
+        )
+        return jsonify(result), 200
+    except DiffError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
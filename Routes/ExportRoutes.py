@@ -0,0 +1,77 @@
+# backend/ExportRoutes.py
+from flask import Blueprint, Response, request, jsonify
+from dotenv import load_dotenv
+
+from utils.dates import parse_date
+from utils.export import Export, ExportError
+
+load_dotenv()
+
+exportAPI = Blueprint("exportAPI", __name__)
+
+
+@exportAPI.route("/<dataset>", methods=["GET"])
+def export_dataset(dataset):
+    """
+    Stream approved data as Parquet, Arrow IPC or CSV
+    ---
+    tags:
+      - Export
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        enum: [demand, iex_price, iex_quantity, plant, demand_output, banking]
+        required: true
+      - in: query
+        name: start
+        type: string
+        required: false
+        description: "Range start (ISO datetime, inclusive; default: everything)"
+      - in: query
+        name: end
+        type: string
+        required: false
+        description: "Range end (ISO datetime, exclusive)"
+      - in: query
+        name: format
+        type: string
+        enum: [parquet, arrow, csv]
+        required: false
+        description: "parquet (default, one row group per batch), arrow (IPC stream) or csv"
+      - in: query
+        name: plant
+        type: string
+        required: false
+        description: Only this Plant_Name (plant dataset only)
+    produces:
+      - application/vnd.apache.parquet
+      - application/vnd.apache.arrow.stream
+      - text/csv
+    responses:
+      200:
+        description: File download, streamed batch by batch in time order
+      400:
+        description: Invalid parameters
+    """
+    try:
+        try:
+            start = parse_date(request.args.get("start"))
+            end = parse_date(request.args.get("end"))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date: {e}"}), 400
+
+        export = Export(
+            dataset,
+            start,
+            end,
+            fmt=request.args.get("format", "parquet").lower(),
+            series=(request.args.get("plant") or "").strip() or None,
+        )
+        return Response(iter(export), mimetype=export.mimetype, headers={
+            "Content-Disposition": f"attachment; filename={export.filename}",
+        })
+    except ExportError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,36 +1,36 @@
 # iex_api.py
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient, ReplaceOne, ASCENDING, DESCENDING
+from pymongo import ReplaceOne, ASCENDING, DESCENDING
 from bson import ObjectId
 from datetime import datetime, timedelta
-import os
 from dotenv import load_dotenv
 
+from utils.anomaly import flag_buffer
+from utils.approval_hooks import after_approve, after_bulk_add
+from utils.bootstrap import register_index
+from utils.changefeed import publish
+from utils.coalesce import coalesced
+from utils.ingest import FLUSH_ROWS, PayloadError, bulk_ingest, iter_request_rows
+from utils.metrics import record_approval, record_bulk_add
+from utils.mongo import collection
+from utils.query_guard import QueryRejected, guarded_find
+
 load_dotenv()
 
 iexAPI = Blueprint("iexAPI", __name__)
 
 # --- MongoDB setup ---
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri, maxPoolSize=200)
-db = client["powercasting"]
-
 # Approval collections
-price_collection = db["IEX_Price_approval"]
-gen_collection = db["IEX_Generation_approval"]
+price_collection = collection("IEX_Price_approval")
+gen_collection = collection("IEX_Generation_approval")
 
 # Final collections
-price_final = db["IEX_Price"]
-gen_final = db["IEX_Generation"]
-
-# Ensure unique index on TimeStamp for both staging collections
-try:
-    price_collection.create_index([("TimeStamp", ASCENDING)], unique=True)
-    gen_collection.create_index([("TimeStamp", ASCENDING)], unique=True)
-except Exception:
-    pass
+price_final = collection("IEX_Price")
+gen_final = collection("IEX_Generation")
 
-CHUNK_SIZE = 50_000
+# Ensure unique index on TimeStamp for both staging collections (built at bootstrap)
+register_index(price_collection, [("TimeStamp", ASCENDING)], unique=True)
+register_index(gen_collection, [("TimeStamp", ASCENDING)], unique=True)
 
 
 # --- Helpers ---
@@ -55,6 +55,38 @@ def get_ist_datetime() -> datetime:
     return utc_now + timedelta(hours=5, minutes=30)
 
 
+def _build_price_doc(item: dict, uploader: str, uploaded_at: datetime) -> dict:
+    """Validate one uploaded row into an IEX_Price_approval document"""
+    ts = _parse_timestamp(item.get("TimeStamp"))
+    actual = _to_float(item.get("Actual"), "Actual")
+
+    pred_present = "Pred" in item and item.get("Pred") != ""
+    pred = _to_float(item.get("Pred"), "Pred") if pred_present else None
+
+    return {
+        "TimeStamp": ts,
+        "Actual": actual,
+        **({"Pred": pred} if pred_present else {}),
+        "uploaded_by": uploader or None,
+        "uploaded_at": uploaded_at,
+    }
+
+
+def _build_quantity_doc(item: dict, uploader: str, uploaded_at: datetime) -> dict:
+    """Validate one uploaded row into an IEX_Generation_approval document"""
+    ts = _parse_timestamp(item.get("TimeStamp"))
+    qty = _to_float(item.get("Qty_Pred"), "Qty_Pred")
+    price = _to_float(item.get("Pred_Price"), "Pred_Price")
+
+    return {
+        "TimeStamp": ts,
+        "Qty_Pred": qty,
+        "Pred_Price": price,
+        "uploaded_by": uploader or None,
+        "uploaded_at": uploaded_at,
+    }
+
+
 # ===========================================================
 # 🔷 Bulk Add Price Data
 # ===========================================================
@@ -94,63 +126,23 @@ def bulk_add_price_data():
     """
     try:
         uploader = request.headers.get("X-User-Email", "").strip()
-        data = request.get_json(silent=True, force=True)
-        if not isinstance(data, list):
-            return jsonify({"error": "Payload must be a list of records"}), 400
-        if not data:
+        result = bulk_ingest(
+            iter_request_rows(request),
+            lambda item: _build_price_doc(item, uploader, get_ist_datetime()),
+            price_collection,
+            ("TimeStamp",),
+            flag_rows=lambda buffer: flag_buffer("iex_price", buffer),
+        )
+        time_range = result.pop("time_range")
+        if result["received"] == 0:
             return jsonify({"message": "No records received"}), 200
 
-        ops, total_upserts, total_matched, total_modified = [], 0, 0, 0
-        skipped_invalid, first_errors = 0, []
-
-        def flush_ops():
-            nonlocal ops, total_upserts, total_matched, total_modified
-            if not ops:
-                return
-            result = price_collection.bulk_write(
-                ops, ordered=False, bypass_document_validation=True
-            )
-            total_upserts += result.upserted_count or 0
-            total_matched += result.matched_count or 0
-            total_modified += result.modified_count or 0
-            ops = []
-
-        for i, item in enumerate(data):
-            try:
-                ts = _parse_timestamp(item.get("TimeStamp"))
-                actual = _to_float(item.get("Actual"), "Actual")
-
-                pred_present = "Pred" in item and item.get("Pred") != ""
-                pred = _to_float(item.get("Pred"), "Pred") if pred_present else None
-
-                doc = {
-                    "TimeStamp": ts,
-                    "Actual": actual,
-                    **({"Pred": pred} if pred_present else {}),
-                    "uploaded_by": uploader or None,
-                    "uploaded_at": get_ist_datetime(),
-                }
-
-                ops.append(ReplaceOne({"TimeStamp": ts}, doc, upsert=True))
-
-                if len(ops) >= CHUNK_SIZE:
-                    flush_ops()
-            except Exception as ex:
-                skipped_invalid += 1
-                if len(first_errors) < 5:
-                    first_errors.append({"row_index": i, "error": str(ex), "row_sample": item})
-
-        flush_ops()
-        return jsonify({
-            "message": "Bulk add completed",
-            "received": len(data),
-            "inserted_new": total_upserts,
-            "replaced_existing": total_matched,
-            "modified_existing": total_modified,
-            "skipped_invalid": skipped_invalid,
-            "chunk_size": CHUNK_SIZE,
-            "sample_errors": first_errors,
-        }), 200
+        summary = {"message": "Bulk add completed", **result, "chunk_size": FLUSH_ROWS}
+        record_bulk_add("iex_price", summary)
+        after_bulk_add("iex_price", summary, time_range, uploader)
+        return jsonify(summary), 200
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -194,61 +186,23 @@ def bulk_add_iex_data():
     """
     try:
         uploader = request.headers.get("X-User-Email", "").strip()
-        data = request.get_json(silent=True, force=True)
-        if not isinstance(data, list):
-            return jsonify({"error": "Payload must be a list of records"}), 400
-        if not data:
+        result = bulk_ingest(
+            iter_request_rows(request),
+            lambda item: _build_quantity_doc(item, uploader, get_ist_datetime()),
+            gen_collection,
+            ("TimeStamp",),
+            flag_rows=lambda buffer: flag_buffer("iex_quantity", buffer),
+        )
+        time_range = result.pop("time_range")
+        if result["received"] == 0:
             return jsonify({"message": "No records received"}), 200
 
-        ops, total_upserts, total_matched, total_modified = [], 0, 0, 0
-        skipped_invalid, first_errors = 0, []
-
-        def flush_ops():
-            nonlocal ops, total_upserts, total_matched, total_modified
-            if not ops:
-                return
-            result = gen_collection.bulk_write(
-                ops, ordered=False, bypass_document_validation=True
-            )
-            total_upserts += result.upserted_count or 0
-            total_matched += result.matched_count or 0
-            total_modified += result.modified_count or 0
-            ops = []
-
-        for i, item in enumerate(data):
-            try:
-                ts = _parse_timestamp(item.get("TimeStamp"))
-                qty = _to_float(item.get("Qty_Pred"), "Qty_Pred")
-                price = _to_float(item.get("Pred_Price"), "Pred_Price")
-
-                doc = {
-                    "TimeStamp": ts,
-                    "Qty_Pred": qty,
-                    "Pred_Price": price,
-                    "uploaded_by": uploader or None,
-                    "uploaded_at": get_ist_datetime(),
-                }
-
-                ops.append(ReplaceOne({"TimeStamp": ts}, doc, upsert=True))
-
-                if len(ops) >= CHUNK_SIZE:
-                    flush_ops()
-            except Exception as ex:
-                skipped_invalid += 1
-                if len(first_errors) < 5:
-                    first_errors.append({"row_index": i, "error": str(ex), "row_sample": item})
-
-        flush_ops()
-        return jsonify({
-            "message": "Bulk add completed",
-            "received": len(data),
-            "inserted_new": total_upserts,
-            "replaced_existing": total_matched,
-            "modified_existing": total_modified,
-            "skipped_invalid": skipped_invalid,
-            "chunk_size": CHUNK_SIZE,
-            "sample_errors": first_errors,
-        }), 200
+        summary = {"message": "Bulk add completed", **result, "chunk_size": FLUSH_ROWS}
+        record_bulk_add("iex_quantity", summary)
+        after_bulk_add("iex_quantity", summary, time_range, uploader)
+        return jsonify(summary), 200
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -257,6 +211,7 @@ def bulk_add_iex_data():
 # ✅ Approval APIs for Price
 # ===========================================================
 @iexAPI.route("/price/approvals", methods=["GET"])
+@coalesced
 def get_price_approvals():
     """
     Get IEX Price Approvals
@@ -290,12 +245,15 @@ def get_price_approvals():
         limit = int(request.args.get("limit", 100))
         sort_order = ASCENDING if order == "asc" else DESCENDING
 
-        cursor = price_collection.find().sort(sort_field, sort_order).limit(limit)
+        cursor = guarded_find(price_collection, {}, [(sort_field, sort_order)], limit,
+                              fallback_sort=[("TimeStamp", sort_order)])
         records = []
         for doc in cursor:
             doc["_id"] = str(doc["_id"])
             records.append(doc)
         return jsonify(records), 200
+    except QueryRejected as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -339,10 +297,13 @@ def approve_price_data():
         ops = []
         for doc in docs:
             doc.pop("_id", None)
+            doc.pop("anomalies", None)
             ops.append(ReplaceOne({"TimeStamp": doc["TimeStamp"]}, doc, upsert=True))
 
         if ops:
             result = price_final.bulk_write(ops, ordered=False)
+            record_approval("iex_price", len(docs))
+            after_approve("iex_price", docs)
             price_collection.delete_many({"_id": {"$in": object_ids}})
             return jsonify({
                 "message": "Price approval migration completed",
@@ -398,12 +359,14 @@ def edit_price_approval(approval_id):
 
         result = price_collection.update_one(
             {"_id": ObjectId(approval_id)},
-            {"$set": update_fields}
+            # Upload-time anomaly flags no longer describe a reviewer-corrected row
+            {"$set": update_fields, "$unset": {"anomalies": ""}}
         )
 
         if result.matched_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("iex_price", "updated", 1, ids=[approval_id])
         return jsonify({"message": "Price approval record updated", "fields_updated": update_fields}), 200
 
     except Exception as e:
@@ -431,6 +394,7 @@ def delete_price_approval(approval_id):
         if result.deleted_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("iex_price", "deleted", 1, ids=[approval_id])
         return jsonify({"message": "Price approval record deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -440,6 +404,7 @@ def delete_price_approval(approval_id):
 # ✅ Approval APIs for Generation
 # ===========================================================
 @iexAPI.route("/quantity/approvals", methods=["GET"])
+@coalesced
 def get_quantity_approvals():
     """
     Get IEX Quantity Approvals
@@ -473,12 +438,15 @@ def get_quantity_approvals():
         limit = int(request.args.get("limit", 100))
         sort_order = ASCENDING if order == "asc" else DESCENDING
 
-        cursor = gen_collection.find().sort(sort_field, sort_order).limit(limit)
+        cursor = guarded_find(gen_collection, {}, [(sort_field, sort_order)], limit,
+                              fallback_sort=[("TimeStamp", sort_order)])
         records = []
         for doc in cursor:
             doc["_id"] = str(doc["_id"])
             records.append(doc)
         return jsonify(records), 200
+    except QueryRejected as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -522,10 +490,13 @@ def approve_quantity_data():
         ops = []
         for doc in docs:
             doc.pop("_id", None)
+            doc.pop("anomalies", None)
             ops.append(ReplaceOne({"TimeStamp": doc["TimeStamp"]}, doc, upsert=True))
 
         if ops:
             result = gen_final.bulk_write(ops, ordered=False)
+            record_approval("iex_quantity", len(docs))
+            after_approve("iex_quantity", docs)
             gen_collection.delete_many({"_id": {"$in": object_ids}})
             return jsonify({
                 "message": "Generation approval migration completed",
@@ -581,12 +552,14 @@ def edit_quantity_approval(approval_id):
 
         result = gen_collection.update_one(
             {"_id": ObjectId(approval_id)},
-            {"$set": update_fields}
+            # Upload-time anomaly flags no longer describe a reviewer-corrected row
+            {"$set": update_fields, "$unset": {"anomalies": ""}}
         )
 
         if result.matched_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("iex_quantity", "updated", 1, ids=[approval_id])
         return jsonify({"message": "Quantity approval record updated", "fields_updated": update_fields}), 200
 
     except Exception as e:
@@ -614,6 +587,7 @@ def delete_quantity_approval(approval_id):
         if result.deleted_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("iex_quantity", "deleted", 1, ids=[approval_id])
         return jsonify({"message": "Quantity approval record deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
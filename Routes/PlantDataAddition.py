@@ -1,33 +1,34 @@
 # backend/plant_api.py
-from flask import Blueprint, request, jsonify
-from pymongo import MongoClient, ReplaceOne, ASCENDING, DESCENDING
+from flask import Blueprint, Response, request, jsonify
+from pymongo import ReplaceOne, ASCENDING, DESCENDING
 from bson import ObjectId
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import os
+
+from utils.anomaly import flag_buffer
+from utils.approval_hooks import after_approve, after_bulk_add
+from utils.bootstrap import register_index
+from utils.changefeed import publish
+from utils.coalesce import coalesced
+from utils.dates import parse_date
+from utils.ingest import FLUSH_ROWS, PayloadError, bulk_ingest, iter_request_rows
+from utils.metrics import record_approval, record_bulk_add
+from utils.mongo import collection as mongo_collection
+from utils.pivot import ARROW_MIMETYPE, FORMATS, PivotError, build_pivot
+from utils.query_guard import QueryRejected, guarded_find
+from utils.rollups import RollupError, parse_interval
 
 load_dotenv()
 
 plantAPI = Blueprint("plantAPI", __name__)
 
 # ── MongoDB setup ───────────────────────────────────────────────────
-mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(mongo_uri, maxPoolSize=200)
-db = client["powercasting"]
-
 # Staging + Final collections
-collection = db["mustrunplantconsumption_approval"]
-final_collection = db["mustrunplantconsumption"]
-
-# Ensure composite unique index on staging
-try:
-    collection.create_index([("TimeStamp", ASCENDING), ("Plant_Name", ASCENDING)], unique=True)
-except Exception:
-    pass
-
-# ── Config ──────────────────────────────────────────────────────────
-CHUNK_SIZE = 50_000
+collection = mongo_collection("mustrunplantconsumption_approval")
+final_collection = mongo_collection("mustrunplantconsumption")
 
+# Ensure composite unique index on staging (built at bootstrap)
+register_index(collection, [("TimeStamp", ASCENDING), ("Plant_Name", ASCENDING)], unique=True)
 
 # ── Helpers ─────────────────────────────────────────────────────────
 def _parse_timestamp(ts_val: str) -> datetime:
@@ -53,6 +54,25 @@ def get_ist_datetime() -> datetime:
     return datetime.utcnow() + timedelta(hours=5, minutes=30)
 
 
+def _build_plant_doc(item: dict, uploader: str, uploaded_at: datetime) -> dict:
+    """Validate one uploaded row into a mustrunplantconsumption_approval document"""
+    ts = _parse_timestamp(item.get("TimeStamp"))
+    plant_name = (item.get("Plant_Name") or "").strip()
+    if not plant_name:
+        raise ValueError("Plant_Name empty")
+    actual = _to_float(item.get("Actual"), "Actual")
+    pred_val = float(item.get("Pred")) if item.get("Pred") not in (None, "") else 0.0
+
+    return {
+        "TimeStamp": ts,
+        "Plant_Name": plant_name,
+        "Actual": actual,
+        "Pred": pred_val,
+        "uploaded_by": uploader or None,
+        "uploaded_at": uploaded_at,
+    }
+
+
 # ── Routes ─────────────────────────────────────────────────────────
 @plantAPI.route("/bulk-add", methods=["POST"])
 def bulk_add_plant_consumption():
@@ -92,66 +112,26 @@ def bulk_add_plant_consumption():
         description: Bulk insert/update summary
     """
     try:
-        data = request.get_json(silent=True, force=True)
-        if not isinstance(data, list):
-            return jsonify({"error": "Payload must be a list of records"}), 400
-        if not data:
-            return jsonify({"message": "No records received"}), 200
-
         user_email = (request.headers.get("X-User-Email") or "").strip()
-
-        ops, total_upserts, total_matched, total_modified = [], 0, 0, 0
-        skipped_invalid, first_errors = 0, []
-
-        def flush_ops():
-            nonlocal ops, total_upserts, total_matched, total_modified
-            if not ops:
-                return
-            result = collection.bulk_write(ops, ordered=False, bypass_document_validation=True)
-            total_upserts += result.upserted_count or 0
-            total_matched += result.matched_count or 0
-            total_modified += result.modified_count or 0
-            ops.clear()
-
         now_ist = get_ist_datetime()
 
-        for i, item in enumerate(data):
-            try:
-                ts = _parse_timestamp(item.get("TimeStamp"))
-                plant_name = (item.get("Plant_Name") or "").strip()
-                if not plant_name:
-                    raise ValueError("Plant_Name empty")
-                actual = _to_float(item.get("Actual"), "Actual")
-                pred_val = float(item.get("Pred")) if item.get("Pred") not in (None, "") else 0.0
-
-                doc = {
-                    "TimeStamp": ts,
-                    "Plant_Name": plant_name,
-                    "Actual": actual,
-                    "Pred": pred_val,
-                    "uploaded_by": user_email or None,
-                    "uploaded_at": now_ist,
-                }
-                ops.append(ReplaceOne({"TimeStamp": ts, "Plant_Name": plant_name}, doc, upsert=True))
-
-                if len(ops) >= CHUNK_SIZE:
-                    flush_ops()
-            except Exception as ex:
-                skipped_invalid += 1
-                if len(first_errors) < 5:
-                    first_errors.append({"row_index": i, "error": str(ex), "row_sample": item})
-
-        flush_ops()
-        return jsonify({
-            "message": "Bulk add completed",
-            "received": len(data),
-            "inserted_new": total_upserts,
-            "replaced_existing": total_matched,
-            "modified_existing": total_modified,
-            "skipped_invalid": skipped_invalid,
-            "chunk_size": CHUNK_SIZE,
-            "sample_errors": first_errors,
-        }), 200
+        result = bulk_ingest(
+            iter_request_rows(request),
+            lambda item: _build_plant_doc(item, user_email, now_ist),
+            collection,
+            ("TimeStamp", "Plant_Name"),
+            flag_rows=lambda buffer: flag_buffer("plant", buffer),
+        )
+        time_range = result.pop("time_range")
+        if result["received"] == 0:
+            return jsonify({"message": "No records received"}), 200
+
+        summary = {"message": "Bulk add completed", **result, "chunk_size": FLUSH_ROWS}
+        record_bulk_add("plant", summary)
+        after_bulk_add("plant", summary, time_range, user_email)
+        return jsonify(summary), 200
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -160,6 +140,7 @@ def bulk_add_plant_consumption():
 # 🔷 Approval APIs
 # ===========================================================
 @plantAPI.route("/approvals", methods=["GET"])
+@coalesced
 def get_plant_approvals():
     """
     Get Plant Consumption Approvals
@@ -193,12 +174,15 @@ def get_plant_approvals():
         limit = int(request.args.get("limit", 100))
         sort_order = ASCENDING if order == "asc" else DESCENDING
 
-        cursor = collection.find().sort(sort_field, sort_order).limit(limit)
+        cursor = guarded_find(collection, {}, [(sort_field, sort_order)], limit,
+                              fallback_sort=[("TimeStamp", sort_order)])
         records = []
         for doc in cursor:
             doc["_id"] = str(doc["_id"])
             records.append(doc)
         return jsonify(records), 200
+    except QueryRejected as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -242,10 +226,13 @@ def approve_plant_data():
         ops = []
         for doc in docs:
             doc.pop("_id", None)
+            doc.pop("anomalies", None)
             ops.append(ReplaceOne({"TimeStamp": doc["TimeStamp"], "Plant_Name": doc["Plant_Name"]}, doc, upsert=True))
 
         if ops:
             result = final_collection.bulk_write(ops, ordered=False)
+            record_approval("plant", len(docs))
+            after_approve("plant", docs)
             collection.delete_many({"_id": {"$in": object_ids}})
             return jsonify({
                 "message": "Plant approval migration completed",
@@ -302,12 +289,14 @@ def edit_plant_approval(approval_id):
 
         result = collection.update_one(
             {"_id": ObjectId(approval_id)},
-            {"$set": update_fields}
+            # Upload-time anomaly flags no longer describe a reviewer-corrected row
+            {"$set": update_fields, "$unset": {"anomalies": ""}}
         )
 
         if result.matched_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("plant", "updated", 1, ids=[approval_id])
         return jsonify({"message": "Plant approval record updated", "fields_updated": update_fields}), 200
 
     except Exception as e:
@@ -336,6 +325,102 @@ def delete_plant_approval(approval_id):
         if result.deleted_count == 0:
             return jsonify({"error": "Approval record not found"}), 404
 
+        publish("plant", "deleted", 1, ids=[approval_id])
         return jsonify({"message": "Plant approval record deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+# ===========================================================
+# 🔷 Pivot (TimeStamp × Plant matrix of approved data)
+# ===========================================================
+@plantAPI.route("/pivot", methods=["GET"])
+def get_plant_pivot():
+    """
+    Plant consumption as a TimeStamp × Plant matrix
+    ---
+    tags:
+      - Plant
+    parameters:
+      - in: query
+        name: start
+        type: string
+        required: true
+        description: "Range start (ISO datetime, inclusive)"
+      - in: query
+        name: end
+        type: string
+        required: true
+        description: "Range end (ISO datetime, exclusive)"
+      - in: query
+        name: field
+        type: string
+        enum: [Actual, Pred]
+        required: false
+        description: Value to pivot (default Actual)
+      - in: query
+        name: plants
+        type: string
+        required: false
+        description: "Comma-separated Plant_Names, in column order (default: every plant with data)"
+      - in: query
+        name: interval
+        type: string
+        required: false
+        description: "Row bucket: 15m, 1h, 1d … counted from start (default 15m)"
+      - in: query
+        name: agg
+        type: string
+        enum: [mean, sum, min, max, count]
+        required: false
+        description: How points sharing a cell are combined (default mean)
+      - in: query
+        name: format
+        type: string
+        enum: [json, csv, arrow]
+        required: false
+        description: "json (columnar), csv (streamed) or arrow (IPC stream)"
+    responses:
+      200:
+        description: One row per bucket in [start, end), one column per plant; empty cells are null
+      400:
+        description: Invalid parameters
+    """
+    try:
+        try:
+            start = parse_date(request.args.get("start"))
+            end = parse_date(request.args.get("end"))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date: {e}"}), 400
+
+        interval = request.args.get("interval", "15m")
+        kind, every = parse_interval(interval)
+        if kind != "fixed":
+            return jsonify({"error": "interval must be a fixed size (15m, 1h, 1d …)"}), 400
+        fmt = request.args.get("format", "json").lower()
+        if fmt not in FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+        plants = [p.strip() for p in (request.args.get("plants") or "").split(",") if p.strip()]
+        field = request.args.get("field", "Actual")
+        agg = request.args.get("agg", "mean").lower()
+
+        pivot = build_pivot("plant", start, end, every, field, agg, list(dict.fromkeys(plants)) or None)
+
+        if fmt == "csv":
+            filename = f"plant_{field}_{start:%Y%m%d%H%M}_{end:%Y%m%d%H%M}.csv"
+            return Response(pivot.iter_csv(), mimetype="text/csv",
+                            headers={"Content-Disposition": f"attachment; filename={filename}"})
+        if fmt == "arrow":
+            return Response(pivot.to_arrow(), mimetype=ARROW_MIMETYPE)
+        return jsonify({
+            "start": start,
+            "end": end,
+            "interval": interval,
+            "field": field,
+            "agg": agg,
+            **pivot.to_columnar(),
+        }), 200
+    except (PivotError, RollupError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
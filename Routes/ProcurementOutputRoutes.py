@@ -1,11 +1,17 @@
 # backend/ProcurementOutputRoutes.py
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient, ASCENDING, DESCENDING, ReplaceOne
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
 from bson import ObjectId
 from datetime import datetime
 from dotenv import load_dotenv
-import os
 
+from utils.approval_hooks import after_approve
+from utils.bootstrap import register_index
+from utils.changefeed import publish
+from utils.coalesce import coalesced
+from utils.metrics import record_approval
+from utils.mongo import collection as mongo_collection
+from utils.query_guard import QueryRejected, guarded_find
 from utils.transaction_logger import log_transaction
 
 load_dotenv()
@@ -13,12 +19,11 @@ load_dotenv()
 mongoDemandOutput_bp = Blueprint('mongoDemandOutput_bp', __name__)
 
 # MongoDB setup
-mongo_uri = os.getenv("MONGO_URI")
-client = MongoClient(mongo_uri)
+collection = mongo_collection("Demand_Output")  # final table
+approval_collection = mongo_collection("Demand_Output_Approval")  # staging table
 
-db = client["powercasting"]
-collection = db["Demand_Output"]  # final table
-approval_collection = db["Demand_Output_Approval"]  # staging table
+# Default listing sort; without it every /approvals call is a COLLSCAN + SORT (built at bootstrap)
+register_index(approval_collection, [("TimeStamp", ASCENDING)])
 
 
 def parse_timestamp(ts_str):
@@ -37,6 +42,7 @@ def parse_timestamp(ts_str):
 
 # =============== Approval APIs ==================
 @mongoDemandOutput_bp.route('/approvals', methods=['GET'])
+@coalesced
 def get_demand_output_approvals():
     """
     Get Demand Output Approvals (staging list)
@@ -50,12 +56,15 @@ def get_demand_output_approvals():
         limit = int(request.args.get("limit", 100))
         sort_order = ASCENDING if order == "asc" else DESCENDING
 
-        cursor = approval_collection.find().sort(sort_field, sort_order).limit(limit)
+        cursor = guarded_find(approval_collection, {}, [(sort_field, sort_order)], limit,
+                              fallback_sort=[("TimeStamp", sort_order)])
         records = []
         for doc in cursor:
             doc["_id"] = str(doc["_id"])
             records.append(doc)
         return jsonify(records), 200
+    except QueryRejected as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -86,6 +95,8 @@ def approve_demand_output():
 
         if ops:
             result = collection.bulk_write(ops, ordered=False)
+            record_approval("demand_output", len(docs))
+            after_approve("demand_output", docs)
             approval_collection.delete_many({"_id": {"$in": object_ids}})
             return jsonify({
                 "message": "Demand Output approval migration completed",
@@ -122,6 +133,7 @@ def update_approval_by_id(_id):
         if result.matched_count == 0:
             return jsonify({"error": "Document not found"}), 404
 
+        publish("demand_output", "updated", 1, ids=[_id])
         return jsonify({
             "message": "Approval document updated successfully",
             "modified_count": result.modified_count
@@ -145,6 +157,7 @@ def delete_approval_by_id(_id):
         if result.deleted_count == 0:
             return jsonify({"error": "Document not found"}), 404
 
+        publish("demand_output", "deleted", 1, ids=[_id])
         return jsonify({"message": "Approval document deleted"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,87 @@
+# backend/ProfileRoutes.py
+from flask import Blueprint, request, jsonify, send_file
+
+from utils.profiling import PROFILE_TOKEN, token_ok, list_profiles, get_profile
+
+profileAPI = Blueprint("profileAPI", __name__)
+
+
+def _authorized() -> bool:
+    # Stored profiles include endpoint details; require the token when one is set
+    return not PROFILE_TOKEN or token_ok(request.headers)
+
+
+@profileAPI.route("", methods=["GET"])
+def get_profiles():
+    """
+    List stored request profiles
+    ---
+    tags:
+      - Profiling
+    parameters:
+      - in: header
+        name: X-Profile-Token
+        type: string
+        required: false
+      - in: query
+        name: limit
+        type: integer
+        required: false
+        description: Number of profiles to return (default 50)
+    responses:
+      200:
+        description: Newest profiles first
+    """
+    if not _authorized():
+        return jsonify({"error": "Invalid or missing X-Profile-Token"}), 403
+    limit = int(request.args.get("limit", 50))
+    return jsonify(list_profiles(limit)), 200
+
+
+@profileAPI.route("/<profile_id>", methods=["GET"])
+def download_profile(profile_id):
+    """
+    Download one profile
+    ---
+    tags:
+      - Profiling
+    parameters:
+      - in: header
+        name: X-Profile-Token
+        type: string
+        required: false
+      - in: path
+        name: profile_id
+        type: string
+        required: true
+      - in: query
+        name: format
+        type: string
+        enum: [pstats, speedscope]
+        required: false
+        description: "pstats for cProfile profiles, speedscope for sampled ones (default: the stored format)"
+    responses:
+      200:
+        description: Profile file
+      404:
+        description: Unknown profile
+    """
+    if not _authorized():
+        return jsonify({"error": "Invalid or missing X-Profile-Token"}), 403
+
+    found = get_profile(profile_id)
+    if not found:
+        return jsonify({"error": "Profile not found"}), 404
+    meta, path = found
+
+    fmt = request.args.get("format", meta["formats"][0])
+    if fmt not in meta["formats"]:
+        return jsonify({
+            "error": f"Profile was captured in {meta['mode']} mode; available formats: {meta['formats']}"
+        }), 400
+
+    if fmt == "speedscope":
+        return send_file(path, mimetype="application/json", as_attachment=True,
+                         download_name=f"{profile_id}.speedscope.json")
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True,
+                     download_name=f"{profile_id}.prof")
@@ -0,0 +1,153 @@
+# backend/SeriesRoutes.py
+from flask import Blueprint, Response, request, jsonify
+from dotenv import load_dotenv
+
+from utils.bootstrap import register_task
+from utils.dates import parse_date
+from utils.join import FORMATS as JOIN_FORMATS, Join, JoinError
+from utils.rollups import RollupError, ensure_rollup_indexes, resample
+
+load_dotenv()
+
+seriesAPI = Blueprint("seriesAPI", __name__)
+
+# Bucket indexes on every rollup collection (built at bootstrap)
+register_task("Rollups: bucket indexes", ensure_rollup_indexes)
+
+
+@seriesAPI.route("/join", methods=["GET"])
+def get_joined_series():
+    """
+    Several datasets aligned on one slot grid, streamed
+    ---
+    tags:
+      - Series
+    parameters:
+      - in: query
+        name: datasets
+        type: string
+        required: false
+        description: "Comma-separated datasets, in column order (default demand,iex_price,iex_quantity,plant,demand_output)"
+      - in: query
+        name: start
+        type: string
+        required: true
+        description: "Range start (ISO datetime, inclusive)"
+      - in: query
+        name: end
+        type: string
+        required: true
+        description: "Range end (ISO datetime, exclusive)"
+      - in: query
+        name: slot_minutes
+        type: integer
+        required: false
+        description: "Row spacing (default 15)"
+      - in: query
+        name: fill
+        type: string
+        enum: [null, ffill, zero, drop]
+        required: false
+        description: "Empty cells: null (default), ffill (previous value), zero, or drop the row"
+      - in: query
+        name: plants
+        type: string
+        required: false
+        description: "Comma-separated Plant_Names for per-plant columns (default: plant totals per slot)"
+      - in: query
+        name: format
+        type: string
+        enum: [json, ndjson, csv]
+        required: false
+    responses:
+      200:
+        description: "One row per slot in [start, end); columns are <dataset>.<field>"
+      400:
+        description: Invalid parameters
+    """
+    try:
+        try:
+            start = parse_date(request.args.get("start"))
+            end = parse_date(request.args.get("end"))
+            slot_minutes = int(request.args.get("slot_minutes", 15))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid parameter: {e}"}), 400
+        fmt = request.args.get("format", "json").lower()
+        if fmt not in JOIN_FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(JOIN_FORMATS)}"}), 400
+        names = [n.strip() for n in request.args.get(
+            "datasets", "demand,iex_price,iex_quantity,plant,demand_output").split(",") if n.strip()]
+        plants = [p.strip() for p in (request.args.get("plants") or "").split(",") if p.strip()]
+
+        join = Join(list(dict.fromkeys(names)), start, end, slot_minutes,
+                    fill=request.args.get("fill", "null").lower(), plants=list(dict.fromkeys(plants)) or None)
+        headers = {"X-Join-Columns": ",".join(join.columns)}
+        if fmt == "csv":
+            return Response(join.iter_csv(), mimetype="text/csv", headers=headers)
+        if fmt == "ndjson":
+            return Response(join.iter_ndjson(), mimetype="application/x-ndjson", headers=headers)
+        return Response(join.iter_json(), mimetype="application/json", headers=headers)
+    except JoinError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@seriesAPI.route("/<dataset>", methods=["GET"])
+def get_series(dataset):
+    """
+    Resampled range read of approved data
+    ---
+    tags:
+      - Series
+    parameters:
+      - in: path
+        name: dataset
+        type: string
+        enum: [demand, iex_price, iex_quantity, plant]
+        required: true
+      - in: query
+        name: start
+        type: string
+        required: true
+        description: "Range start (ISO datetime, inclusive)"
+      - in: query
+        name: end
+        type: string
+        required: true
+        description: "Range end (ISO datetime, exclusive)"
+      - in: query
+        name: interval
+        type: string
+        required: false
+        description: "Bucket size: 15m, 1h, 1d, 7d, month … (default 1h; fixed sizes count from start)"
+      - in: query
+        name: plant
+        type: string
+        required: false
+        description: Only this Plant_Name (plant dataset only)
+    responses:
+      200:
+        description: "count, sum, min, max, n and avg per value field and bucket; source names the rollup used (or raw)"
+      400:
+        description: Invalid parameters
+    """
+    try:
+        try:
+            start = parse_date(request.args.get("start"))
+            end = parse_date(request.args.get("end"))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid date: {e}"}), 400
+
+        result = resample(
+            dataset,
+            start,
+            end,
+            interval=request.args.get("interval", "1h"),
+            series=(request.args.get("plant") or "").strip() or None,
+        )
+        return jsonify(result), 200
+    except RollupError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
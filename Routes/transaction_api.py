@@ -1,20 +1,25 @@
 # backend/transaction_api.py
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
-import os
 from dotenv import load_dotenv
 
+from utils.bootstrap import register_task
+from utils.coalesce import coalesced
+from utils.dates import parse_date
+from utils.mongo import collection
+from utils.transaction_retention import ensure_ttl_index, purge_range, purge_newest
+
 load_dotenv()
 
 transactionAPI = Blueprint("transactionAPI", __name__)
 
-mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(mongo_uri)
-db = client["powercasting"]
-transaction_collection = db["Transaction_History"]
+transaction_collection = collection("Transaction_History")
+
+# TTL / timestamp index backing retention and range deletes (built at bootstrap)
+register_task("Transaction_History: timestamp index", ensure_ttl_index)
 
 
 @transactionAPI.route("/history", methods=["GET"])
+@coalesced
 def get_transaction_history():
     """
     Get Transaction History
@@ -51,24 +56,38 @@ def delete_transaction_history():
         type: integer
         required: false
         description: "Number of recent records to delete (default: delete all)"
+      - in: query
+        name: before
+        type: string
+        required: false
+        description: "Delete records with timestamp before this ISO datetime"
+      - in: query
+        name: after
+        type: string
+        required: false
+        description: "Delete records with timestamp at or after this ISO datetime"
     responses:
       200:
         description: Deletion result
     """
     try:
         limit = request.args.get("limit")
+        before = parse_date(request.args.get("before"))
+        after = parse_date(request.args.get("after"))
+
+        if limit and (before or after):
+            return jsonify({"error": "Use either limit or before/after, not both"}), 400
 
         if limit:
-            limit = int(limit)
-            ids_to_delete = transaction_collection.find().sort("timestamp", -1).limit(limit)
-            ids = [doc["_id"] for doc in ids_to_delete]
-            result = transaction_collection.delete_many({"_id": {"$in": ids}})
+            deleted_count = purge_newest(int(limit))
+        elif before or after:
+            deleted_count = purge_range(start=after, end=before)
         else:
-            result = transaction_collection.delete_many({})
+            deleted_count = transaction_collection.delete_many({}).deleted_count
 
         return jsonify({
             "message": "Transaction history deleted",
-            "deleted_count": result.deleted_count
+            "deleted_count": deleted_count
         }), 200
 
     except Exception as e:
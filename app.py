@@ -1,10 +1,22 @@
-from flask import Flask, jsonify, request, g
+from flask import Flask, Response, jsonify, request, g
 from flask_cors import CORS
 from flasgger import Swagger
 from datetime import datetime
+import click
 import json
+import time
 
+from utils import admission, autoapprove, checksums, coalesce, rollups
+from utils.bootstrap import ensure_indexes
+from utils.compression import compress_flask_response
+from utils.datasets import BULK_ADD_PATHS
+from utils.ingest import streams_body
+from utils.metrics import observe_request, record_admission, render_metrics
+from utils.mongo import pool_stats
+from utils import profiling
 from utils.transaction_logger import log_transaction
+from utils.transaction_spool import pending_segments
+from utils.transaction_retention import start_retention_worker
 
 from Routes.ProcurementOutputRoutes import mongoDemandOutput_bp
 from Routes.DemandDataAdditionRoutes import demandAPI
@@ -12,6 +24,15 @@ from Routes.IEXDataAdditionRoutes import iexAPI
 from Routes.PlantDataAddition import plantAPI
 from Routes.transaction_api import transactionAPI
 from Routes.BankingChargeAdditionRoute import bankingAPI
+from Routes.ProfileRoutes import profileAPI
+from Routes.AccuracyRoutes import accuracyAPI
+from Routes.CoverageRoutes import coverageAPI
+from Routes.SeriesRoutes import seriesAPI
+from Routes.ExportRoutes import exportAPI
+from Routes.ChangeFeedRoutes import changesAPI
+from Routes.DiffRoutes import diffAPI
+from Routes.ChecksumRoutes import checksumAPI
+from Routes.AutoApproveRoutes import autoApproveAPI
 
 app = Flask(__name__)
 
@@ -31,6 +52,8 @@ swagger_config = {
     "specs_route": "/docs/"  # Swagger UI at http://localhost:4000/docs/
 }
 
+# Flasgger only registers its routes here; the spec itself is built on
+# the first /apispec_1.json hit and cached (outside debug mode).
 swagger = Swagger(app, config=swagger_config)
 
 # ---------- CORS ----------
@@ -43,34 +66,190 @@ app.register_blueprint(iexAPI, url_prefix="/iex")
 app.register_blueprint(plantAPI, url_prefix="/plant-consumption")
 app.register_blueprint(bankingAPI, url_prefix="/baking-charges")
 app.register_blueprint(transactionAPI, url_prefix="/transaction")
+app.register_blueprint(profileAPI, url_prefix="/profiles")
+app.register_blueprint(accuracyAPI, url_prefix="/accuracy")
+app.register_blueprint(coverageAPI, url_prefix="/coverage")
+app.register_blueprint(seriesAPI, url_prefix="/series")
+app.register_blueprint(exportAPI, url_prefix="/export")
+app.register_blueprint(changesAPI, url_prefix="/changes")
+app.register_blueprint(diffAPI, url_prefix="/diff")
+app.register_blueprint(checksumAPI, url_prefix="/checksums")
+app.register_blueprint(autoApproveAPI, url_prefix="/auto-approve")
+
+
+# ---------- Bootstrap ----------
+# Imports do no network I/O: indexes are built by `python -m utils.bootstrap`
+# (or `flask --app app bootstrap`) and Mongo connects on first use.
+@app.cli.command("bootstrap")
+def bootstrap_command():
+    """Build indexes and other one-time startup state"""
+    for name, outcome in ensure_indexes().items():
+        print(f"[Bootstrap] {name} → {outcome}")
+
+
+@app.cli.command("rebuild-rollups")
+@click.argument("dataset", required=False)
+@click.option("--start", type=datetime.fromisoformat, help="ISO datetime (default: oldest approved point)")
+@click.option("--end", type=datetime.fromisoformat, help="ISO datetime, exclusive (default: newest)")
+def rebuild_rollups_command(dataset, start, end):
+    """Recompute hourly/daily/monthly rollups (whole months) from approved data"""
+    for name in [dataset] if dataset else rollups.rollup_datasets():
+        print(f"[Rollups] {name}: {rollups.rebuild(name, start, end)} month(s) rebuilt")
+
+
+@app.cli.command("rebuild-checksums")
+@click.argument("dataset", required=False)
+@click.option("--start", type=datetime.fromisoformat, help="ISO datetime (default: oldest approved point)")
+@click.option("--end", type=datetime.fromisoformat, help="ISO datetime, exclusive (default: newest)")
+def rebuild_checksums_command(dataset, start, end):
+    """Recompute per-day checksums (whole days) from approved data"""
+    for name in [dataset] if dataset else checksums.checksum_datasets():
+        print(f"[Checksums] {name}: {checksums.rebuild(name, start, end)} day(s) rebuilt")
+
+
+@app.cli.command("auto-approve")
+@click.argument("dataset", required=False)
+@click.option("--start", type=datetime.fromisoformat, help="ISO datetime (default: all staged rows)")
+@click.option("--end", type=datetime.fromisoformat, help="ISO datetime, exclusive")
+@click.option("--dry-run", is_flag=True, help="Report only, approve nothing")
+def auto_approve_command(dataset, start, end, dry_run):
+    """Apply the auto-approval rules to staged data (for cron schedules)"""
+    for name in [dataset] if dataset else list(autoapprove.load_rules()):
+        report = autoapprove.run(name, start, end, dry_run=dry_run)
+        print(f"[Auto Approve] {name}: {report['passed']}/{report['days']} day(s) passed, "
+              f"{report['approved_rows']} row(s) {'would be ' if dry_run else ''}approved, "
+              f"{report['held_total']} held")
+
+
+# ---------- Response Compression ----------
+# Flask runs after_request hooks in reverse registration order: registered
+# first so logging, metrics and profiling all see the uncompressed response.
+@app.after_request
+def after_request_compression(response):
+    return compress_flask_response(response, request.headers.get("Accept-Encoding", ""), request.method)
+
+
+# ---------- Admission Control ----------
+# Runs before every other hook: the body of a rejected upload is never read.
+@app.before_request
+def before_request_admission():
+    g.admission_ticket = None
+    dataset = admission.ingest_dataset(request.path) if request.method == "POST" else None
+    if dataset is None:
+        return None
+    rows = admission.estimate_rows(request.content_length)
+    ticket, waited = admission.acquire(dataset, rows)
+    record_admission(dataset, ticket is not None, waited)
+    if ticket is None:
+        response = jsonify(admission.rejection_body(dataset))
+        response.status_code = 429
+        response.headers["Retry-After"] = str(admission.RETRY_AFTER_SECONDS)
+        return response
+    g.admission_ticket = ticket
+    return None
+
+
+@app.teardown_request
+def teardown_request_admission(exc):
+    ticket = g.pop("admission_ticket", None)
+    if ticket:
+        admission.release(ticket)
+
+
+# ---------- Read Coalescing ----------
+# Writes drop this worker's micro-cached listings of the same dataset
+@app.after_request
+def after_request_invalidate(response):
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        coalesce.invalidate(request.path)
+    return response
+
+
+# ---------- Profiling Hooks ----------
+# Registered before the logging hooks so a profile spans the whole
+# request, including body capture and log_transaction.
+@app.before_request
+def before_request_profiling():
+    g.profile = None
+    if request.path.startswith("/profiles") or not profiling.should_profile(request.headers):
+        return
+    mode = request.headers.get("X-Profile-Mode", profiling.MODE_CPROFILE)
+    try:
+        g.profile = profiling.start(mode)
+    except ValueError as e:
+        # Python 3.12+: only one cProfile may be active per process
+        print(f"[Profiling Skipped] {e}")
+
+
+@app.after_request
+def after_request_profiling(response):
+    handle = g.get("profile")
+    if handle is None:
+        return response
+    try:
+        profile_id = profiling.finish(handle, {
+            "endpoint": request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "query": request.query_string.decode("utf-8", "replace"),
+        })
+        response.headers["X-Profile-Id"] = profile_id
+    except Exception as e:
+        print(f"[Profiling Error] {e}")
+    return response
 
 
 # ---------- Middleware Hooks ----------
+# Scrapes, health probes and profile downloads are not audit events
+UNLOGGED_PATHS = ("/metrics", "/health", "/profiles", "/admission")
+TEXT_MIMETYPES = ("text/", "application/json", "application/javascript", "application/xml")
+
+
 @app.before_request
 def before_request_logging():
+    # Background retention purge / scheduled auto-approval start with the first request in each worker
+    start_retention_worker()
+    autoapprove.start_schedule_worker()
     g.request_body = None
     try:
-        if request.is_json:
+        if request.path.rstrip("/") in BULK_ADD_PATHS and streams_body(request):
+            # The route parses large uploads as a stream; the log keeps only their size
+            g.request_body = {"omitted": "streamed bulk upload", "content_length": request.content_length}
+        elif request.is_json:
             g.request_body = request.get_json(silent=True, force=True)
         elif request.form:
             g.request_body = request.form.to_dict()
     except Exception:
         g.request_body = None
     g.start_time = datetime.utcnow()
+    g.perf_start = time.perf_counter()
 
 
 @app.after_request
 def after_request_logging(response):
+    if "perf_start" in g:
+        observe_request(request.blueprint, request.url_rule.rule if request.url_rule else None,
+                        request.method, response.status_code, g.perf_start)
+    if request.path.startswith(UNLOGGED_PATHS):
+        return response
     try:
         endpoint = request.path
         method = request.method
         request_body = g.get("request_body")
         response_status = response.status_code
 
-        try:
-            response_body = json.loads(response.get_data(as_text=True))
-        except Exception:
-            response_body = {"raw": response.get_data(as_text=True)}
+        if response.is_streamed or response.direct_passthrough:
+            # Reading would buffer the whole stream / file; log what it was instead
+            response_body = {"streamed": True, "mimetype": response.mimetype}
+        elif not response.mimetype.startswith(TEXT_MIMETYPES):
+            # Binary bodies (Arrow etc.) are not valid text; log their size
+            response_body = {"binary": True, "mimetype": response.mimetype, "bytes": response.content_length}
+        else:
+            raw = response.get_data(as_text=True)
+            try:
+                response_body = json.loads(raw)
+            except Exception:
+                response_body = {"raw": raw}
 
         log_transaction(
             endpoint=endpoint,
@@ -98,5 +277,49 @@ def hello_world():
     return jsonify({"message": "GUVNL Alternative Server for Audit is running!"})
 
 
+@app.route('/health')
+def health():
+    """Worker health: shared Mongo pool stats and transaction spool backlog
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: Pool stats for the worker that served the request
+    """
+    return jsonify({
+        "mongo_pool": pool_stats(),
+        "transaction_spool_pending_segments": pending_segments(),
+    })
+
+
+@app.route('/admission')
+def admission_occupancy():
+    """Upload admission: in-progress uploads and rows per staging collection (all workers)
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: Current occupancy and configured limits
+    """
+    return jsonify(admission.occupancy())
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics (aggregated across workers in multiprocess mode)
+    ---
+    tags:
+      - General
+    responses:
+      200:
+        description: Prometheus text exposition format
+    """
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 if __name__ == '__main__':
+    ensure_indexes()
     app.run(host='0.0.0.0', port=4000, threaded=True, debug=True)
@@ -0,0 +1,337 @@
+"""
+ASGI entry point: async ingestion, approval and listing routes.
+
+The bulk-add, /approvals and /approvals/approve routes of the demand,
+IEX price/quantity and plant datasets run as async handlers, so slow
+uploads and dashboard polls only hold a coroutine instead of a whole
+worker. Listing and approval use pymongo's AsyncMongoClient; bulk-add
+receives the body on the event loop and runs utils.ingest.bulk_ingest
+(the Flask routes' streaming parser, row buffer and batched writes) in a
+thread, so its summary matches the Flask one field for field. The /changes SSE feed is served here
+natively too (an async tail per subscriber). Every other route (PATCH/DELETE,
+transaction history, banking, procurement output, docs) is served by the
+existing Flask app through a WSGI adapter, so URL and response contracts
+are unchanged.
+
+Run with:  ./start_app_async.sh   (hypercorn asgi:app)
+"""
+from quart import Quart, Response, request, jsonify, g
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+from pymongo import ReplaceOne, ASCENDING, DESCENDING
+from bson import ObjectId
+from datetime import datetime
+import asyncio
+import json
+import time
+
+from app import app as flask_app
+from utils.async_mongo import get_async_collection, close_async_client
+from utils.datasets import BULK_ADD_PATHS, DATASETS
+from utils import admission, coalesce
+from utils.anomaly import flag_buffer
+from utils.approval_hooks import after_approve_async, after_bulk_add_async
+from utils.changefeed import ChangeFeedError, aiter_sse, open_tail_async
+from utils.compression import compress_quart_response
+from utils.ingest import FLUSH_ROWS, PayloadError, bulk_ingest, iter_json_array, streams_body
+from utils.metrics import observe_request, record_admission, record_approval, record_bulk_add
+from utils.query_guard import QueryRejected, guarded_find_async
+from utils.mongo import get_collection
+from utils.transaction_logger import log_transaction
+
+from Routes.DemandDataAdditionRoutes import _build_demand_doc, get_ist_datetime
+from Routes.IEXDataAdditionRoutes import _build_price_doc, _build_quantity_doc
+from Routes.PlantDataAddition import _build_plant_doc
+
+quart_app = Quart(__name__)
+# Quart caps bodies at 16 MB by default; bulk uploads get the Flask app's limit
+quart_app.config["MAX_CONTENT_LENGTH"] = flask_app.config["MAX_CONTENT_LENGTH"]
+
+# Per-dataset differences between the Flask bulk-add routes (all of them go through
+# utils.ingest.bulk_ingest, as does the async one)
+#   sample_fields     None → whole row in sample_errors
+#   errors_if_any     True → sample_errors only present when non-empty
+ASYNC_INGEST = {
+    "demand": {
+        "builder": _build_demand_doc,
+        "sample_fields": ("TimeStamp", "Demand(Actual)", "Demand(Pred)"),
+        "errors_if_any": True,
+    },
+    "iex_price": {"builder": _build_price_doc, "sample_fields": None, "errors_if_any": False},
+    "iex_quantity": {"builder": _build_quantity_doc, "sample_fields": None, "errors_if_any": False},
+    "plant": {"builder": _build_plant_doc, "sample_fields": None, "errors_if_any": False},
+}
+
+
+class _BlockingBody:
+    """read() over the Quart request body for iter_json_array in a worker thread;
+    each call waits on the event loop for the next received chunk"""
+
+    def __init__(self, body, loop):
+        self._body, self._loop, self._done = body, loop, False
+
+    def read(self, size=-1):
+        if self._done:
+            return b""
+        try:
+            return asyncio.run_coroutine_threadsafe(self._body.__anext__(), self._loop).result()
+        except StopAsyncIteration:
+            self._done = True
+            return b""
+
+
+def _make_bulk_add(name: str):
+    dataset = DATASETS[name]
+    ingest = ASYNC_INGEST[name]
+
+    async def bulk_add():
+        try:
+            if streams_body(request):
+                rows = iter_json_array(_BlockingBody(request.body, asyncio.get_running_loop()))
+            else:
+                data = await request.get_json(silent=True, force=True)
+                if not isinstance(data, list):
+                    raise PayloadError("Payload must be a list of records")
+                rows = iter(data)
+
+            uploader = (request.headers.get("X-User-Email") or "").strip()
+            uploaded_at = get_ist_datetime()
+            builder = ingest["builder"]
+            result = await asyncio.to_thread(
+                bulk_ingest,
+                rows,
+                lambda item: builder(item, uploader, uploaded_at),
+                get_collection(dataset["db"], dataset["staging"]),
+                dataset["key_fields"],
+                sample_fields=ingest["sample_fields"],
+                flag_rows=lambda buffer: flag_buffer(name, buffer),
+            )
+            time_range = result.pop("time_range")
+            if result["received"] == 0:
+                return jsonify({"message": "No records received"}), 200
+
+            first_errors = result.pop("sample_errors")
+            summary = {"message": "Bulk add completed", **result, "chunk_size": FLUSH_ROWS}
+            if first_errors or not ingest["errors_if_any"]:
+                summary["sample_errors"] = first_errors
+            record_bulk_add(name, summary)
+            await after_bulk_add_async(name, summary, time_range, uploader)
+            return jsonify(summary), 200
+        except PayloadError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    return bulk_add
+
+
+def _make_list_approvals(name: str):
+    dataset = DATASETS[name]
+
+    @coalesce.coalesced_async
+    async def list_approvals():
+        try:
+            sort_field = request.args.get("sort", dataset["time_field"])
+            order = request.args.get("order", "asc").lower()
+            limit = int(request.args.get("limit", 100))
+            sort_order = ASCENDING if order == "asc" else DESCENDING
+
+            staging = get_async_collection(dataset["db"], dataset["staging"])
+            records = []
+            cursor = await guarded_find_async(staging, {}, [(sort_field, sort_order)], limit,
+                                              fallback_sort=[(dataset["time_field"], sort_order)])
+            async for doc in cursor:
+                doc["_id"] = str(doc["_id"])
+                records.append(doc)
+            return jsonify(records), 200
+        except QueryRejected as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    return list_approvals
+
+
+def _make_approve(name: str):
+    dataset = DATASETS[name]
+
+    async def approve():
+        try:
+            body = await request.get_json(force=True)
+            ids = body.get("ids", [])
+            if not ids or not isinstance(ids, list):
+                return jsonify({"error": "ids must be a non-empty list"}), 400
+
+            object_ids = [ObjectId(i) for i in ids]
+            staging = get_async_collection(dataset["db"], dataset["staging"])
+            final = get_async_collection(dataset["db"], dataset["final"])
+
+            docs = await staging.find({"_id": {"$in": object_ids}}).to_list(None)
+            if not docs:
+                return jsonify({"error": "No matching documents found"}), 404
+
+            ops = []
+            for doc in docs:
+                doc.pop("_id", None)
+                doc.pop("anomalies", None)
+                ops.append(ReplaceOne({k: doc.get(k) for k in dataset["key_fields"]}, doc, upsert=True))
+
+            result = await final.bulk_write(ops, ordered=False)
+            record_approval(name, len(docs))
+            await after_approve_async(name, docs)
+            await staging.delete_many({"_id": {"$in": object_ids}})
+            return jsonify({
+                "message": dataset["approve_message"],
+                "migrated": len(docs),
+                "inserted_new": result.upserted_count or 0,
+                "updated_existing": result.modified_count or 0,
+                "deleted_from_approval": len(docs)
+            }), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    return approve
+
+
+async def stream_changes(dataset):
+    """/changes/<dataset[,dataset]>: Server-Sent Events, see Routes/ChangeFeedRoutes.py"""
+    try:
+        names = list(dict.fromkeys(n.strip() for n in dataset.split(",") if n.strip()))
+        last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or None
+        tail = await open_tail_async(names, last_id)
+        response = Response(aiter_sse(tail), mimetype="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        # Bounded by CHANGE_FEED_STREAM_MAX_SECONDS instead of RESPONSE_TIMEOUT
+        response.timeout = None
+        return response
+    except ChangeFeedError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+quart_app.add_url_rule("/changes/<dataset>", "stream_changes", stream_changes, methods=["GET"])
+
+for _name in ASYNC_INGEST:
+    _prefix = DATASETS[_name]["url_prefix"]
+    quart_app.add_url_rule(f"{_prefix}/bulk-add", f"{_name}_bulk_add",
+                           _make_bulk_add(_name), methods=["POST"])
+    quart_app.add_url_rule(f"{_prefix}/approvals", f"{_name}_approvals",
+                           _make_list_approvals(_name), methods=["GET"])
+    quart_app.add_url_rule(f"{_prefix}/approvals/approve", f"{_name}_approve",
+                           _make_approve(_name), methods=["POST"])
+
+
+# ---------- Middleware Hooks (mirror app.py) ----------
+# Registered first so it runs after the logging hook (reverse order)
+@quart_app.after_request
+async def after_request_compression(response):
+    return await compress_quart_response(response, request.headers.get("Accept-Encoding", ""), request.method)
+
+
+@quart_app.before_request
+async def before_request_admission():
+    g.admission_ticket = None
+    dataset = admission.ingest_dataset(request.path) if request.method == "POST" else None
+    if dataset is None:
+        return None
+    rows = admission.estimate_rows(request.content_length)
+    ticket, waited = await admission.acquire_async(dataset, rows)
+    record_admission(dataset, ticket is not None, waited)
+    if ticket is None:
+        response = jsonify(admission.rejection_body(dataset))
+        response.status_code = 429
+        response.headers["Retry-After"] = str(admission.RETRY_AFTER_SECONDS)
+        return response
+    g.admission_ticket = ticket
+    return None
+
+
+@quart_app.teardown_request
+async def teardown_request_admission(exc):
+    ticket = g.pop("admission_ticket", None)
+    if ticket:
+        await asyncio.to_thread(admission.release, ticket)
+
+
+@quart_app.before_request
+async def before_request_logging():
+    g.request_body = None
+    try:
+        if request.path.rstrip("/") in BULK_ADD_PATHS and streams_body(request):
+            # The route parses large uploads as a stream; the log keeps only their size
+            g.request_body = {"omitted": "streamed bulk upload", "content_length": request.content_length}
+        elif request.is_json:
+            g.request_body = await request.get_json(silent=True, force=True)
+        elif (form := await request.form):
+            g.request_body = form.to_dict()
+    except Exception:
+        g.request_body = None
+    g.start_time = datetime.utcnow()
+    g.perf_start = time.perf_counter()
+
+
+@quart_app.after_request
+async def after_request_invalidate(response):
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        coalesce.invalidate(request.path)
+    return response
+
+
+@quart_app.after_request
+async def after_request_logging(response):
+    if "perf_start" in g:
+        observe_request("async", request.url_rule.rule if request.url_rule else None,
+                        request.method, response.status_code, g.perf_start)
+    try:
+        if not hasattr(response.response, "data"):
+            # Streamed (change feed): reading it would drain the stream
+            response_body = {"streamed": True, "mimetype": response.mimetype}
+        else:
+            raw = await response.get_data(as_text=True)
+            try:
+                response_body = json.loads(raw)
+            except Exception:
+                response_body = {"raw": raw}
+
+        log_transaction(
+            endpoint=request.path,
+            method=request.method,
+            request_body=g.get("request_body"),
+            request_headers=request.headers,
+            response_status=response.status_code,
+            response_body=response_body
+        )
+    except Exception as e:
+        print(f"[Middleware Logger Error] {e}")
+
+    # Same open CORS policy as flask-cors in app.py
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    if request.method == "OPTIONS":
+        response.headers["Access-Control-Allow-Methods"] = \
+            request.headers.get("Access-Control-Request-Method", "GET, POST, OPTIONS")
+        if "Access-Control-Request-Headers" in request.headers:
+            response.headers["Access-Control-Allow-Headers"] = request.headers["Access-Control-Request-Headers"]
+    return response
+
+
+@quart_app.after_serving
+async def shutdown():
+    await close_async_client()
+
+
+# ---------- ASGI dispatcher ----------
+_flask_asgi = WsgiToAsgi(flask_app)
+
+
+async def app(scope, receive, send):
+    """Async routes go to Quart; anything else falls through to Flask"""
+    if scope["type"] == "http":
+        try:
+            quart_app.url_map.bind("localhost").match(scope["path"], method=scope["method"])
+        except HTTPException:
+            await _flask_asgi(scope, receive, send)
+            return
+    await quart_app(scope, receive, send)
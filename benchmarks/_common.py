@@ -0,0 +1,146 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against either a throwaway `mongod` (--mongo-uri) or the
+in-memory stand-in in memory_mongo.py (default). They write the route modules'
+real database names, so never point --mongo-uri at a shared server.
+"""
+from datetime import datetime, timedelta
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SLOT = timedelta(minutes=15)
+SERIES_START = datetime(2024, 1, 1)
+
+
+def prepare_env(mongo_uri=None):
+    """Env vars that must be set before `app` is imported"""
+    os.environ.setdefault("TRANSACTION_SPOOL_DIR", tempfile.mkdtemp(prefix="guvnl_bench_spool_"))
+    os.environ.setdefault("PROFILE_SAMPLE_RATE", "0")
+    if mongo_uri:
+        os.environ["MONGO_URI"] = mongo_uri
+
+
+def install_stand_in(mongo_uri=None, discard_writes=False) -> str:
+    """Point utils.mongo at the stand-in; returns a label for the results file"""
+    from utils import mongo
+    from memory_mongo import MemoryClient
+
+    if mongo_uri:
+        return "mongod"
+    mongo.use_client(MemoryClient(discard_writes=discard_writes))
+    return "discard" if discard_writes else "memory"
+
+
+def ensure_indexes():
+    from utils.bootstrap import ensure_indexes as run
+
+    run(force=True)
+
+
+# ── Synthetic 15-minute series ──────────────────────────────────────
+def slot_times(rows: int, start: datetime = SERIES_START):
+    for i in range(rows):
+        yield start + SLOT * i
+
+
+def _fmt(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Generators: a 1M-row list would dominate the benchmark's own peak RSS
+def demand_rows(rows: int):
+    for i, ts in enumerate(slot_times(rows)):
+        yield {"TimeStamp": _fmt(ts), "Demand(Actual)": 9000 + (i % 96) * 10.5, "Demand(Pred)": 9050 + (i % 96) * 10.0}
+
+
+def price_rows(rows: int):
+    for i, ts in enumerate(slot_times(rows)):
+        yield {"TimeStamp": _fmt(ts), "Actual": 3000 + (i % 96) * 7.25, "Pred": 3010 + (i % 96) * 7.0}
+
+
+def quantity_rows(rows: int):
+    for i, ts in enumerate(slot_times(rows)):
+        yield {"TimeStamp": _fmt(ts), "Qty_Pred": 500 + (i % 96) * 1.5, "Pred_Price": 3000 + (i % 96) * 7.0}
+
+
+def plant_rows(rows: int, plants: int = 20):
+    """`rows` documents spread over `plants` plants (rows // plants slots each)"""
+    slots = max(1, rows // plants)
+    names = [f"PLANT_{p:03d}" for p in range(plants)]
+    for i, ts in enumerate(slot_times(slots)):
+        stamp = _fmt(ts)
+        for p, name in enumerate(names):
+            yield {"TimeStamp": stamp, "Plant_Name": name, "Actual": 100 + p + (i % 96), "Pred": 101 + p}
+
+
+def write_json_array(rows, f) -> int:
+    """Stream `rows` into binary file `f` as one JSON array; returns bytes written"""
+    written = f.write(b"[")
+    for i, row in enumerate(rows):
+        written += f.write((b"," if i else b"") + json.dumps(row).encode())
+    written += f.write(b"]")
+    f.flush()
+    return written
+
+
+# ── Measurements / results ──────────────────────────────────────────
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def run_child(script: str, args: list) -> dict:
+    """Run one case in a fresh interpreter so peak RSS is per case"""
+    out = subprocess.run([sys.executable, script, "--child", *args], cwd=ROOT,
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"benchmark case failed: {args}\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def write_results(path: str, results: dict):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def compare(current: list, previous: list, key_fields: tuple, metrics: tuple) -> list:
+    """Per-case relative change of each metric vs a previous results list"""
+    index = {tuple(r[k] for k in key_fields): r for r in previous}
+    rows = []
+    for r in current:
+        old = index.get(tuple(r[k] for k in key_fields))
+        if not old:
+            continue
+        row = {k: r[k] for k in key_fields}
+        for m in metrics:
+            if old.get(m):
+                row[f"{m}_change_pct"] = round((r[m] - old[m]) / old[m] * 100, 1)
+        rows.append(row)
+    return rows
@@ -0,0 +1,215 @@
+"""
+Approval and listing benchmark with regression thresholds.
+
+Seeds a staging collection (and its final collection) plus
+Transaction_History locally, then times through the Flask test client:
+  - GET <dataset>/approvals at several limits and sort orders
+  - GET /transaction/history at several limits
+  - POST <dataset>/approvals/approve at several id batch sizes
+
+Each staging size runs in a fresh interpreter. Results are checked against
+a stored baseline; the run exits 1 when any metric is slower than the
+baseline by more than --threshold:
+
+    python benchmarks/approval_benchmark.py --sizes 10000,100000 --update-baseline
+    python benchmarks/approval_benchmark.py --sizes 10000,100000 --threshold 0.25
+
+Baselines (benchmarks/baselines/approval.json by default) are only
+comparable on the machine and backend that recorded them.
+"""
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _common  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "approval.json")
+
+LISTING_LIMITS = (100, 1000, 10000)
+LISTING_SORTS = (("TimeStamp", "asc"), ("TimeStamp", "desc"), ("uploaded_at", "desc"))
+HISTORY_LIMITS = (10, 100, 1000)
+APPROVE_BATCHES = (100, 1000, 10000)
+HISTORY_DOCS = 50_000
+SEED_BATCH = 50_000
+
+
+def _seed(collection, docs_iter):
+    batch = []
+    for doc in docs_iter:
+        batch.append(doc)
+        if len(batch) >= SEED_BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def _demand_docs(n: int, offset: int = 0):
+    uploaded_at = datetime(2025, 1, 1)
+    for i, ts in enumerate(_common.slot_times(n, _common.SERIES_START + _common.SLOT * offset)):
+        yield {"TimeStamp": ts, "Demand(Actual)": 9000.0 + i % 96, "Demand(Pred)": 9050.0 + i % 96,
+               "uploaded_by": "bench@example.com", "uploaded_at": uploaded_at + timedelta(seconds=i)}
+
+
+def _history_docs(n: int):
+    start = datetime(2025, 1, 1)
+    for i in range(n):
+        yield {"author": "bench@example.com", "endpoint": "/demand/approvals", "method": "GET",
+               "request_body": None, "response_status": 200, "response_body": {"raw": ""},
+               "timestamp": start + timedelta(seconds=i)}
+
+
+def _time(fn, repeat: int) -> dict:
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return {
+        "p50_s": round(_common.percentile(latencies, 50), 5),
+        "p95_s": round(_common.percentile(latencies, 95), 5),
+    }
+
+
+def run_size(size: int, repeat: int, mongo_uri) -> list:
+    _common.prepare_env(mongo_uri)
+    # Keep request logs in an unsealed spool segment for the whole run so the
+    # seeded Transaction_History stays fixed and history timings are comparable
+    os.environ["TRANSACTION_SPOOL_ENABLED"] = "1"
+    os.environ["TRANSACTION_SPOOL_SEGMENT_AGE_SECONDS"] = "86400"
+    os.environ["TRANSACTION_SPOOL_SEGMENT_BYTES"] = str(1 << 40)
+    # The uploaded_at sort has no index: the default guard mode rejects it on
+    # the larger sizes, and it is timed here as the blocking-sort worst case
+    os.environ["QUERY_GUARD_MODE"] = "log"
+    stand_in = _common.install_stand_in(mongo_uri)
+    import app
+    from Routes import DemandDataAdditionRoutes as demand
+    from utils.transaction_logger import transaction_collection
+
+    _common.ensure_indexes()
+    demand.approval_collection.delete_many({})
+    demand.main_collection.delete_many({})
+    transaction_collection.delete_many({})
+    _seed(demand.approval_collection, _demand_docs(size))
+    # Half of the staged slots already exist in final → approvals mix inserts and replaces
+    _seed(demand.main_collection, _demand_docs(size // 2))
+    _seed(transaction_collection, _history_docs(HISTORY_DOCS))
+
+    client = app.app.test_client()
+    results = []
+
+    def record(case: str, timing: dict, **extra):
+        results.append({"case": case, "staging_docs": size, "stand_in": stand_in, **extra, **timing})
+
+    def checked_get(url):
+        resp = client.get(url)
+        if resp.status_code != 200:
+            raise RuntimeError(f"{url} → {resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+
+    for limit in LISTING_LIMITS:
+        for sort_field, order in LISTING_SORTS:
+            url = f"/demand/approvals?limit={limit}&sort={sort_field}&order={order}"
+            record(f"list limit={limit} sort={sort_field}:{order}", _time(lambda: checked_get(url), repeat))
+
+    for limit in HISTORY_LIMITS:
+        url = f"/transaction/history?limit={limit}"
+        record(f"history limit={limit}", _time(lambda: checked_get(url), repeat))
+
+    for batch in APPROVE_BATCHES:
+        if batch * repeat > demand.approval_collection.estimated_document_count():
+            continue
+
+        def approve_batch():
+            ids = [str(d["_id"]) for d in demand.approval_collection.find({}, {"_id": 1}).limit(batch)]
+            resp = client.post("/demand/approvals/approve", json={"ids": ids})
+            if resp.status_code != 200:
+                raise RuntimeError(f"approve → {resp.status_code}: {resp.get_json()}")
+
+        record(f"approve batch={batch}", _time(approve_batch, repeat))
+
+    return results
+
+
+def check_regressions(results: list, baseline: list, threshold: float) -> list:
+    index = {(b["case"], b["staging_docs"]): b for b in baseline}
+    regressions = []
+    for r in results:
+        base = index.get((r["case"], r["staging_docs"]))
+        if not base:
+            continue
+        for metric in ("p50_s", "p95_s"):
+            # Sub-millisecond timings are noise; never flag them
+            if base[metric] >= 0.001 and r[metric] > base[metric] * (1 + threshold):
+                regressions.append({
+                    "case": r["case"], "staging_docs": r["staging_docs"], "metric": metric,
+                    "baseline": base[metric], "current": r[metric],
+                    "change_pct": round((r[metric] - base[metric]) / base[metric] * 100, 1),
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Approval/listing benchmark with regression thresholds")
+    parser.add_argument("--sizes", default="10000,100000", help="Staging docs, e.g. 10000,1000000,5000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongo-uri", help="Throwaway mongod; default is the in-memory stand-in")
+    parser.add_argument("--out", default="approval_results.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_REGRESSION_THRESHOLD", "0.2")),
+                        help="Allowed slowdown vs baseline as a fraction (0.2 = 20%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_size(args.size, args.repeat, args.mongo_uri)))
+        return
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        child_args = ["--size", str(size), "--repeat", str(args.repeat)]
+        if args.mongo_uri:
+            child_args += ["--mongo-uri", args.mongo_uri]
+        for r in _common.run_child(os.path.abspath(__file__), child_args):
+            print(f"{r['staging_docs']:>9} {r['case']:<40} p50 {r['p50_s']:>9}s  p95 {r['p95_s']:>9}s")
+            results.append(r)
+
+    output = {
+        "benchmark": "approval",
+        "created_at": datetime.utcnow().isoformat(),
+        "git_commit": _common.git_commit(),
+        "python": sys.version.split()[0],
+        "threshold": args.threshold,
+        "results": results,
+    }
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        _common.write_results(args.baseline, output)
+        _common.write_results(args.out, output)
+        return
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = check_regressions(results, json.load(f)["results"], args.threshold)
+        output["regressions"] = regressions
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+    _common.write_results(args.out, output)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for reg in regressions:
+            print(f"  {reg['staging_docs']:>9} {reg['case']:<40} {reg['metric']} "
+                  f"{reg['baseline']}s → {reg['current']}s ({reg['change_pct']:+}%)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Ingestion benchmark for the bulk-add routes.
+
+Drives /demand, /iex/price, /iex/quantity and /plant-consumption bulk-add
+through the Flask test client with synthetic 15-minute series and records
+rows/s, p50/p95 latency and peak RSS per case (each case runs in a fresh
+interpreter). Results are JSON so two runs can be compared:
+
+    python benchmarks/ingestion_benchmark.py --sizes 1000,10000,100000 --out before.json
+    python benchmarks/ingestion_benchmark.py --sizes 1000,10000,100000 --out after.json --compare before.json
+
+Default backend is the in-memory stand-in (memory_mongo.py); pass
+--mongo-uri for a throwaway local mongod. The stand-in keeps every document
+in the benchmark process, so use --discard-writes when comparing the
+routes' own peak memory.
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _common  # noqa: E402
+
+# endpoint → (url, row generator)
+CASES = {
+    "demand": ("/demand/bulk-add", _common.demand_rows),
+    "iex_price": ("/iex/price/bulk-add", _common.price_rows),
+    "iex_quantity": ("/iex/quantity/bulk-add", _common.quantity_rows),
+    "plant": ("/plant-consumption/bulk-add", _common.plant_rows),
+}
+
+
+def run_case(dataset: str, rows: int, repeat: int, plants: int, mongo_uri, discard_writes=False) -> dict:
+    _common.prepare_env(mongo_uri)
+    stand_in = _common.install_stand_in(mongo_uri, discard_writes)
+    import app
+
+    _common.ensure_indexes()
+    client = app.app.test_client()
+    url, generator = CASES[dataset]
+    # The body is read from a temp file like a socket, so it never sits in this process whole
+    body = tempfile.TemporaryFile()
+    body_bytes = _common.write_json_array(generator(rows, plants) if dataset == "plant" else generator(rows), body)
+
+    latencies = []
+    summary = {}
+    for _ in range(repeat):
+        body.seek(0)
+        started = time.perf_counter()
+        resp = client.post(url, input_stream=body, content_length=body_bytes, content_type="application/json",
+                           headers={"X-User-Email": "bench@example.com"})
+        latencies.append(time.perf_counter() - started)
+        summary = resp.get_json()
+        if resp.status_code != 200:
+            raise RuntimeError(f"{url} → {resp.status_code}: {summary}")
+
+    received = summary.get("received", rows)
+    return {
+        "dataset": dataset,
+        "rows": received,
+        "repeat": repeat,
+        "stand_in": stand_in,
+        "payload_mb": round(body_bytes / (1024 * 1024), 2),
+        "rows_per_s": round(received / (sum(latencies) / len(latencies)), 1),
+        "p50_s": round(_common.percentile(latencies, 50), 4),
+        "p95_s": round(_common.percentile(latencies, 95), 4),
+        "peak_rss_mb": _common.peak_rss_mb(),
+        "skipped_invalid": summary.get("skipped_invalid", 0),
+        "route_peak_increase_mb": summary.get("memory", {}).get("peak_increase_mb"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-add ingestion benchmark")
+    parser.add_argument("--datasets", default=",".join(CASES), help="Comma list of " + ", ".join(CASES))
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Rows per upload, e.g. 1000,1000000")
+    parser.add_argument("--plants", type=int, default=20, help="Plant fan-out for plant uploads")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--mongo-uri", help="Throwaway mongod; default is the in-memory stand-in")
+    parser.add_argument("--out", default="ingestion_results.json")
+    parser.add_argument("--discard-writes", action="store_true",
+                        help="Stand-in drops written docs so peak RSS reflects the route only")
+    parser.add_argument("--compare", help="Previous results JSON to diff against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        dataset, rows = args.case.split(":")
+        print(json.dumps(run_case(dataset, int(rows), args.repeat, args.plants, args.mongo_uri,
+                                  args.discard_writes)))
+        return
+
+    results = []
+    for dataset in args.datasets.split(","):
+        for size in (int(s) for s in args.sizes.split(",")):
+            child_args = ["--case", f"{dataset}:{size}", "--repeat", str(args.repeat),
+                          "--plants", str(args.plants)]
+            if args.mongo_uri:
+                child_args += ["--mongo-uri", args.mongo_uri]
+            if args.discard_writes:
+                child_args.append("--discard-writes")
+            result = _common.run_child(os.path.abspath(__file__), child_args)
+            print(f"{dataset:>12} {result['rows']:>9} rows  {result['rows_per_s']:>10} rows/s  "
+                  f"p95 {result['p95_s']:>8}s  peak {result['peak_rss_mb']:>7} MB")
+            results.append(result)
+
+    output = {
+        "benchmark": "ingestion",
+        "created_at": datetime.utcnow().isoformat(),
+        "git_commit": _common.git_commit(),
+        "python": sys.version.split()[0],
+        "results": results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["results"]
+        output["comparison"] = _common.compare(
+            results, previous, ("dataset", "rows"), ("rows_per_s", "p95_s", "peak_rss_mb"))
+        for row in output["comparison"]:
+            print(row)
+    _common.write_results(args.out, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Minimal in-memory Mongo stand-in for the benchmarks.
+
+Implements only the collection API the route modules use (bulk_write with
+ReplaceOne/UpdateOne, find/sort/skip/limit, insert/update/delete, counts)
+with hash indexes for equality filters, so ingestion and approval paths can
+be timed at realistic sizes without a server. It does not model network
+round-trips, write concern or the query planner; use --mongo-uri for those.
+"""
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne, InsertOne, DeleteOne, DeleteMany, UpdateMany
+from pymongo.results import (
+    BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult,
+)
+import copy
+import itertools
+
+_OPS = {
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$ne": lambda a, b: a != b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+_MISSING = object()
+
+
+def _match_value(value, cond) -> bool:
+    if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+        for op, arg in cond.items():
+            if op == "$exists":
+                if (value is not _MISSING) != bool(arg):
+                    return False
+                continue
+            if value is _MISSING:
+                value = None
+            if not _OPS[op](value, arg):
+                return False
+        return True
+    return (None if value is _MISSING else value) == cond
+
+
+def _matches(doc: dict, flt: dict) -> bool:
+    for field, cond in flt.items():
+        if field == "$and":
+            if not all(_matches(doc, f) for f in cond):
+                return False
+            continue
+        if field == "$or":
+            if not any(_matches(doc, f) for f in cond):
+                return False
+            continue
+        if not _match_value(doc.get(field, _MISSING), cond):
+            return False
+    return True
+
+
+def _project(doc: dict, projection):
+    if not projection:
+        return copy.copy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1):
+            out["_id"] = doc["_id"]
+        return out
+    out = {k: v for k, v in doc.items() if projection.get(k, 1)}
+    return out
+
+
+def _sort_key(spec):
+    def key(doc):
+        parts = []
+        for field, direction in spec:
+            v = doc.get(field)
+            parts.append((v is not None, v))
+        return parts
+    return key
+
+
+class MemoryCursor:
+    def __init__(self, collection, flt, projection):
+        self._collection = collection
+        self._filter = flt or {}
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._iter = None
+
+    def sort(self, key_or_list, direction=1):
+        self._sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def _results(self):
+        docs = self._collection._candidates(self._filter)
+        if self._sort:
+            # Stable multi-key sort: apply keys from last to first
+            docs = list(docs)
+            for field, direction in reversed(self._sort):
+                docs.sort(key=_sort_key([(field, direction)]), reverse=direction < 0)
+        it = iter(docs)
+        if self._skip:
+            it = itertools.islice(it, self._skip, None)
+        if self._limit:
+            it = itertools.islice(it, self._limit)
+        return (_project(d, self._projection) for d in it)
+
+    def __iter__(self):
+        return self._results()
+
+    def __next__(self):
+        if self._iter is None:
+            self._iter = self._results()
+        return next(self._iter)
+
+    def to_list(self, length=None):
+        return list(self)
+
+
+class MemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._docs = {}
+        self._indexes = {}  # tuple(fields) → {values: _id}
+        self._unique = set()
+
+    # ── internals ──
+    def _index_key(self, fields, doc):
+        return tuple(doc.get(f) for f in fields)
+
+    def _index_add(self, doc):
+        for fields, index in self._indexes.items():
+            index[self._index_key(fields, doc)] = doc["_id"]
+
+    def _index_remove(self, doc):
+        for fields, index in self._indexes.items():
+            key = self._index_key(fields, doc)
+            if index.get(key) == doc["_id"]:
+                del index[key]
+
+    def _equality_index(self, flt):
+        fields = tuple(sorted(flt))
+        if fields not in self._indexes:
+            index = {}
+            for doc in self._docs.values():
+                index[self._index_key(fields, doc)] = doc["_id"]
+            self._indexes[fields] = index
+        return fields, self._indexes[fields]
+
+    def _candidates(self, flt, single=False):
+        """Matching docs; `single` lookups (replace/update one) may use a hash index"""
+        flt = flt or {}
+        id_cond = flt.get("_id")
+        if isinstance(id_cond, dict) and "$in" in id_cond:
+            docs = (self._docs.get(i) for i in id_cond["$in"])
+            return [d for d in docs if d is not None and _matches(d, flt)]
+        if id_cond is not None and not isinstance(id_cond, dict):
+            doc = self._docs.get(id_cond)
+            return [doc] if doc is not None and _matches(doc, flt) else []
+        equality = flt and all(not isinstance(v, dict) for v in flt.values()) and \
+            not any(k.startswith("$") for k in flt)
+        if equality and (single or tuple(sorted(flt)) in self._unique):
+            fields, index = self._equality_index(flt)
+            _id = index.get(tuple(flt[f] for f in fields))
+            return [self._docs[_id]] if _id is not None else []
+        return [d for d in self._docs.values() if _matches(d, flt)]
+
+    def _insert(self, doc):
+        doc = dict(doc)
+        doc.setdefault("_id", ObjectId())
+        self._docs[doc["_id"]] = doc
+        self._index_add(doc)
+        return doc["_id"]
+
+    def _replace(self, flt, replacement, upsert):
+        found = self._candidates(flt, single=True)
+        if found:
+            old = found[0]
+            new = dict(replacement)
+            new["_id"] = old["_id"]
+            modified = old != new
+            self._index_remove(old)
+            self._docs[old["_id"]] = new
+            self._index_add(new)
+            return 1, int(modified), None
+        if upsert:
+            doc = dict(replacement)
+            for k, v in flt.items():
+                if not isinstance(v, dict):
+                    doc.setdefault(k, v)
+            return 0, 0, self._insert(doc)
+        return 0, 0, None
+
+    def _update(self, flt, update, upsert, many=False):
+        found = self._candidates(flt, single=not many)
+        if not many:
+            found = found[:1]
+        matched = modified = 0
+        for doc in found:
+            new = dict(doc)
+            new.update(update.get("$set", {}))
+            for k, v in update.get("$inc", {}).items():
+                new[k] = new.get(k, 0) + v
+            for k in update.get("$unset", {}):
+                new.pop(k, None)
+            matched += 1
+            if new != doc:
+                modified += 1
+                self._index_remove(doc)
+                self._docs[doc["_id"]] = new
+                self._index_add(new)
+        if not found and upsert:
+            doc = {k: v for k, v in flt.items() if not isinstance(v, dict)}
+            doc.update(update.get("$set", {}))
+            doc.update(update.get("$setOnInsert", {}))
+            doc.update(update.get("$inc", {}))
+            return 0, 0, self._insert(doc)
+        return matched, modified, None
+
+    def _delete(self, flt, many):
+        found = self._candidates(flt)
+        if not many:
+            found = found[:1]
+        for doc in found:
+            self._index_remove(doc)
+            del self._docs[doc["_id"]]
+        return len(found)
+
+    # ── pymongo API subset ──
+    def create_index(self, keys, unique=False, **kwargs):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        fields = tuple(sorted(k for k, _ in keys))
+        if unique:
+            self._equality_index({f: None for f in fields})
+            self._unique.add(fields)
+        return "_".join(fields)
+
+    def create_indexes(self, models):
+        return [self.create_index(list(m.document["key"].items()), unique=m.document.get("unique", False))
+                for m in models]
+
+    def find(self, filter=None, projection=None, **kwargs):
+        return MemoryCursor(self, filter, projection)
+
+    def find_one(self, filter=None, projection=None, **kwargs):
+        return next(iter(MemoryCursor(self, filter, projection).limit(1)), None)
+
+    def insert_one(self, document, **kwargs):
+        _id = self._insert(document)
+        document.setdefault("_id", _id)
+        return InsertOneResult(_id, True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        ids = []
+        for d in documents:
+            _id = self._insert(d)
+            d.setdefault("_id", _id)
+            ids.append(_id)
+        return InsertManyResult(ids, True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        matched, modified, upserted = self._replace(filter, replacement, upsert)
+        raw = {"n": matched or int(upserted is not None), "nModified": modified}
+        if upserted is not None:
+            raw["upserted"] = upserted
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        matched, modified, upserted = self._update(filter, update, upsert)
+        raw = {"n": matched or int(upserted is not None), "nModified": modified}
+        if upserted is not None:
+            raw["upserted"] = upserted
+        return UpdateResult(raw, True)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        matched, modified, upserted = self._update(filter, update, upsert, many=True)
+        return UpdateResult({"n": matched, "nModified": modified}, True)
+
+    def delete_one(self, filter, **kwargs):
+        return DeleteResult({"n": self._delete(filter, False)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        return DeleteResult({"n": self._delete(filter, True)}, True)
+
+    def find_one_and_delete(self, filter, **kwargs):
+        found = self._candidates(filter)
+        if not found:
+            return None
+        doc = found[0]
+        self._delete({"_id": doc["_id"]}, False)
+        return doc
+
+    def count_documents(self, filter, **kwargs):
+        return len(self._candidates(filter))
+
+    def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    def drop(self):
+        self._docs.clear()
+        self._indexes.clear()
+
+    def bulk_write(self, requests, ordered=True, bypass_document_validation=False, **kwargs):
+        if self.database.client.discard_writes:
+            # Count every op as an upsert without keeping it (app-side memory runs)
+            upserted = [{"index": i, "_id": ObjectId()} for i in range(len(requests))]
+            return BulkWriteResult({"nInserted": 0, "nUpserted": len(upserted), "nMatched": 0,
+                                    "nModified": 0, "nRemoved": 0, "upserted": upserted}, True)
+        n_inserted = n_matched = n_modified = n_removed = 0
+        upserted = []
+        for i, op in enumerate(requests):
+            if isinstance(op, ReplaceOne):
+                m, mod, up = self._replace(op._filter, op._doc, op._upsert)
+            elif isinstance(op, (UpdateOne, UpdateMany)):
+                m, mod, up = self._update(op._filter, op._doc, op._upsert, many=isinstance(op, UpdateMany))
+            elif isinstance(op, InsertOne):
+                self._insert(op._doc)
+                n_inserted += 1
+                continue
+            elif isinstance(op, (DeleteOne, DeleteMany)):
+                n_removed += self._delete(op._filter, isinstance(op, DeleteMany))
+                continue
+            else:
+                raise TypeError(f"unsupported bulk op {op!r}")
+            n_matched += m
+            n_modified += mod
+            if up is not None:
+                upserted.append({"index": i, "_id": up})
+        return BulkWriteResult({
+            "nInserted": n_inserted,
+            "nUpserted": len(upserted),
+            "nMatched": n_matched,
+            "nModified": n_modified,
+            "nRemoved": n_removed,
+            "upserted": upserted,
+        }, True)
+
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+    def command(self, *args, **kwargs):
+        return {"ok": 1}
+
+
+class MemoryClient:
+    def __init__(self, discard_writes: bool = False):
+        self.discard_writes = discard_writes
+        self._dbs = {}
+
+    def __getitem__(self, name) -> MemoryDatabase:
+        if name not in self._dbs:
+            self._dbs[name] = MemoryDatabase(self, name)
+        return self._dbs[name]
+
+    def close(self):
+        pass
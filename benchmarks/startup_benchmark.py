@@ -0,0 +1,78 @@
+"""
+Startup benchmark: time from `import app` to the first response.
+
+Each run is a fresh interpreter, like a gunicorn worker respawn. By
+default MONGO_URI points at an unroutable address so any network I/O
+left on the import path shows up as a multi-second stall.
+
+    python benchmarks/startup_benchmark.py --runs 10 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.app.test_client()
+resp = client.get("/")
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "first_response_s": t2 - t1,
+                  "total_s": t2 - t0, "status": resp.status_code}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: list, key: str) -> dict:
+    values = sorted(s[key] for s in samples)
+    return {
+        "min": values[0],
+        "median": statistics.median(values),
+        "p95": values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+        "max": values[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mongo-uri", default="mongodb://192.0.2.1:27017/",
+                        help="Defaults to an unroutable TEST-NET address")
+    parser.add_argument("--out", help="Write results JSON here")
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGO_URI=args.mongo_uri,
+               TRANSACTION_SPOOL_DIR=os.path.join("/tmp", "guvnl_startup_bench_spool"))
+    samples = [run_once(env) for _ in range(args.runs)]
+
+    results = {
+        "benchmark": "startup",
+        "runs": args.runs,
+        "mongo_uri": args.mongo_uri,
+        "import_s": summarize(samples, "import_s"),
+        "first_response_s": summarize(samples, "first_response_s"),
+        "total_s": summarize(samples, "total_s"),
+        "statuses": sorted({s["status"] for s in samples}),
+    }
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+# Gunicorn server hooks (CLI flags in start_app.sh still set bind/workers)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges from the multiprocess metrics dir
+    from utils.metrics import mark_worker_dead
+
+    mark_worker_dead(worker.pid)
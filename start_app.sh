@@ -9,8 +9,16 @@ WORKERS=4
 # Activate venv if needed
 # source venv/bin/activate
 
+# Metrics from all workers are aggregated through files in this directory
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/guvnl_metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# One-time bootstrap (indexes); workers start without touching Mongo
+python -m utils.bootstrap
+
 # Run Flask with Gunicorn
 exec gunicorn $APP_MODULE \
+    --config gunicorn.conf.py \
     --workers $WORKERS \
     --bind $HOST:$PORT \
     --timeout 120 \
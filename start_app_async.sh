@@ -0,0 +1,25 @@
+#!/bin/bash
+
+APP_NAME="guvnl_alternate_server_async"
+APP_MODULE="asgi:app"   # ASGI dispatcher: async routes + Flask fallback
+HOST="0.0.0.0"
+PORT=4000
+WORKERS=2
+
+# Activate venv if needed
+# source venv/bin/activate
+
+# Metrics from all workers are aggregated through files in this directory
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/guvnl_metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# One-time bootstrap (indexes); workers start without touching Mongo
+python -m utils.bootstrap
+
+# Run the ASGI app with Hypercorn (asyncio workers)
+exec hypercorn $APP_MODULE \
+    --workers $WORKERS \
+    --worker-class asyncio \
+    --bind $HOST:$PORT \
+    --graceful-timeout 120 \
+    --log-level info
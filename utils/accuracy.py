@@ -0,0 +1,200 @@
+"""
+Forecast accuracy (MAPE, RMSE, bias) computed in Mongo.
+
+One aggregation per request groups the final collection's points by
+period ($dateTrunc: day, week, month, or "all" for the whole range) and,
+for multi-series datasets, by series (plant). Per point the error is
+Pred − Actual:
+  - mape      mean |error / Actual| × 100, over points with Actual ≠ 0
+  - rmse      sqrt(mean error²)
+  - bias      mean error (positive = over-forecast)
+  - bias_pct  Σ error / Σ Actual × 100
+
+Results are cached in Accuracy_Cache keyed by the full request, with the
+requested range stored alongside. Approving data bumps the dataset's
+generation in Accuracy_Generations, then deletes the cached entries whose
+range overlaps the approved timestamps (every worker sees both). A result
+whose computation saw the generation change is removed again right after
+it is stored, so an aggregation that raced an approval never outlives
+it; ACCURACY_CACHE_TTL_SECONDS only bounds cache size.
+
+$dateTrunc needs MongoDB 5.0+.
+"""
+from datetime import datetime, timezone
+import hashlib
+import os
+
+from pymongo import ASCENDING
+
+from utils.async_mongo import get_async_collection
+from utils.datasets import DATASETS
+from utils.metrics import record_accuracy_cache
+from utils.mongo import POWERCASTING_DB, collection
+
+ACCURACY_CACHE_TTL_SECONDS = int(os.getenv("ACCURACY_CACHE_TTL_SECONDS", "86400"))
+GRANULARITIES = ("day", "week", "month", "all")
+CACHE_COLLECTION = "Accuracy_Cache"
+GENERATION_COLLECTION = "Accuracy_Generations"
+
+# Open range ends are stored as these so overlap checks stay plain comparisons
+_RANGE_MIN = datetime(1, 1, 1)
+_RANGE_MAX = datetime(9999, 12, 31)
+
+cache_collection = collection(CACHE_COLLECTION)
+generation_collection = collection(GENERATION_COLLECTION)
+
+
+def accuracy_datasets() -> list:
+    return [name for name, d in DATASETS.items() if d.get("accuracy_fields")]
+
+
+def ensure_cache_indexes():
+    cache_collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=ACCURACY_CACHE_TTL_SECONDS)
+    cache_collection.create_index([("dataset", ASCENDING), ("start", ASCENDING), ("end", ASCENDING)])
+
+
+# ── Pipeline ────────────────────────────────────────────────────────
+def build_pipeline(name: str, start: datetime = None, end: datetime = None, granularity: str = "day",
+                   by_series: bool = False, series: str = None) -> list:
+    """Aggregation over the final collection of `name`; end is exclusive"""
+    dataset = DATASETS[name]
+    actual_field, pred_field = dataset["accuracy_fields"]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    actual, pred = f"${actual_field}", f"${pred_field}"
+
+    match = {actual_field: {"$type": "number"}, pred_field: {"$type": "number"}}
+    if start or end:
+        match[time_field] = {}
+        if start:
+            match[time_field]["$gte"] = start
+        if end:
+            match[time_field]["$lt"] = end
+    if series and series_field:
+        match[series_field] = series
+
+    if granularity == "all":
+        period = None
+    elif granularity == "week":
+        period = {"$dateTrunc": {"date": f"${time_field}", "unit": "week", "startOfWeek": "monday"}}
+    else:
+        period = {"$dateTrunc": {"date": f"${time_field}", "unit": granularity}}
+    group_id = {"period": period}
+    if by_series and series_field:
+        group_id["series"] = f"${series_field}"
+
+    error = {"$subtract": [pred, actual]}
+    nonzero = {"$ne": [actual, 0]}
+    project = {
+        "_id": 0,
+        "period": "$_id.period",
+        "points": 1,
+        "mape": {"$cond": [{"$gt": ["$ape_points", 0]},
+                           {"$round": [{"$multiply": [{"$divide": ["$ape_sum", "$ape_points"]}, 100]}, 4]},
+                           None]},
+        "rmse": {"$round": [{"$sqrt": {"$divide": ["$se_sum", "$points"]}}, 4]},
+        "bias": {"$round": [{"$divide": ["$error_sum", "$points"]}, 4]},
+        "bias_pct": {"$cond": [{"$ne": ["$actual_sum", 0]},
+                               {"$round": [{"$multiply": [{"$divide": ["$error_sum", "$actual_sum"]}, 100]}, 4]},
+                               None]},
+    }
+    sort = {"period": 1}
+    if "series" in group_id:
+        project[series_field] = "$_id.series"
+        sort[series_field] = 1
+
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": group_id,
+            "points": {"$sum": 1},
+            "ape_sum": {"$sum": {"$cond": [nonzero, {"$abs": {"$divide": [error, actual]}}, 0]}},
+            "ape_points": {"$sum": {"$cond": [nonzero, 1, 0]}},
+            "se_sum": {"$sum": {"$multiply": [error, error]}},
+            "error_sum": {"$sum": error},
+            "actual_sum": {"$sum": actual},
+        }},
+        {"$project": project},
+        {"$sort": sort},
+    ]
+
+
+# ── Cached reads ────────────────────────────────────────────────────
+def _cache_key(name, start, end, granularity, by_series, series) -> str:
+    raw = "|".join(str(v) for v in (name, start, end, granularity, by_series, series))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def accuracy(name: str, start: datetime = None, end: datetime = None, granularity: str = "day",
+             by_series: bool = False, series: str = None) -> dict:
+    """Accuracy rows for one request, from the cache when an entry survives"""
+    dataset = DATASETS[name]
+    key = _cache_key(name, start, end, granularity, by_series, series)
+    cached = cache_collection.find_one({"_id": key})
+    record_accuracy_cache(name, cached is not None)
+    if cached is not None:
+        return {"rows": cached["rows"], "cached": True, "computed_at": cached["created_at"]}
+
+    final = collection(dataset["final"], dataset["db"])
+    generation = _generation(name)
+    rows = list(final.aggregate(build_pipeline(name, start, end, granularity, by_series, series)))
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    try:
+        cache_collection.replace_one({"_id": key}, {
+            "dataset": name,
+            "start": start or _RANGE_MIN,
+            "end": end or _RANGE_MAX,
+            "rows": rows,
+            "created_at": now,
+        }, upsert=True)
+        # invalidate() bumps before it deletes: a bump seen here may have missed this entry,
+        # a later one is followed by a delete that sees it
+        if _generation(name) != generation:
+            cache_collection.delete_one({"_id": key, "created_at": now})
+    except Exception as e:
+        print(f"[Accuracy Cache Error] {e}")
+    return {"rows": rows, "cached": False, "computed_at": now}
+
+
+# ── Invalidation (approvals) ────────────────────────────────────────
+def _generation(name: str) -> int:
+    doc = generation_collection.find_one({"_id": name})
+    return doc["generation"] if doc else 0
+
+
+def _overlap_filter(name: str, docs: list):
+    if not DATASETS[name].get("accuracy_fields"):
+        return None
+    time_field = DATASETS[name]["time_field"]
+    stamps = [d[time_field] for d in docs if isinstance(d.get(time_field), datetime)]
+    if not stamps:
+        return None
+    # Cached ranges are [start, end); a point at `end` is outside it
+    return {"dataset": name, "start": {"$lte": max(stamps)}, "end": {"$gt": min(stamps)}}
+
+
+def invalidate(name: str, docs: list) -> int:
+    """Drop cached results of `name` whose range covers any approved doc"""
+    flt = _overlap_filter(name, docs)
+    if flt is None:
+        return 0
+    try:
+        generation_collection.update_one({"_id": name}, {"$inc": {"generation": 1}}, upsert=True)
+        return cache_collection.delete_many(flt).deleted_count
+    except Exception as e:
+        print(f"[Accuracy Cache Error] {e}")
+        return 0
+
+
+async def invalidate_async(name: str, docs: list) -> int:
+    """invalidate() for the ASGI app"""
+    flt = _overlap_filter(name, docs)
+    if flt is None:
+        return 0
+    try:
+        await get_async_collection(POWERCASTING_DB, GENERATION_COLLECTION).update_one(
+            {"_id": name}, {"$inc": {"generation": 1}}, upsert=True)
+        result = await get_async_collection(POWERCASTING_DB, CACHE_COLLECTION).delete_many(flt)
+        return result.deleted_count
+    except Exception as e:
+        print(f"[Accuracy Cache Error] {e}")
+        return 0
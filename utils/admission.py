@@ -0,0 +1,178 @@
+"""
+Admission control for the bulk-add routes.
+
+Every gunicorn/hypercorn worker shares one small state file (guarded by an
+fcntl lock) listing the uploads currently being processed, so the limits
+hold across workers:
+  - ADMISSION_MAX_UPLOADS                  concurrent uploads in total
+  - ADMISSION_MAX_UPLOADS_PER_COLLECTION   concurrent uploads per staging collection
+  - ADMISSION_MAX_INFLIGHT_ROWS            rows in flight per staging collection
+
+Rows are estimated from Content-Length before the body is read, so a
+rejected upload never gets parsed. A request that does not fit waits up to
+ADMISSION_QUEUE_SECONDS for a slot and is then answered 429 with
+Retry-After. Under gunicorn a waiting upload pins a sync worker that read
+requests need, so the Flask app does not queue by default; the ASGI app
+waits as a coroutine (ADMISSION_ASYNC_QUEUE_SECONDS). A single upload
+larger than the row budget is still admitted when its collection is
+otherwise idle.
+
+Tickets of workers that died mid-upload are reclaimed by pid.
+"""
+from contextlib import contextmanager
+import asyncio
+import fcntl
+import itertools
+import json
+import os
+import random
+import time
+
+from utils.datasets import BULK_ADD_PATHS, DATASETS
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") not in ("0", "false", "False")
+MAX_UPLOADS = int(os.getenv("ADMISSION_MAX_UPLOADS", "4"))
+MAX_UPLOADS_PER_COLLECTION = int(os.getenv("ADMISSION_MAX_UPLOADS_PER_COLLECTION", "2"))
+MAX_INFLIGHT_ROWS = int(os.getenv("ADMISSION_MAX_INFLIGHT_ROWS", "200000"))
+# Average JSON bytes per uploaded row; used to turn Content-Length into rows
+BYTES_PER_ROW = int(os.getenv("ADMISSION_BYTES_PER_ROW", "80"))
+QUEUE_SECONDS = float(os.getenv("ADMISSION_QUEUE_SECONDS", "0"))
+ASYNC_QUEUE_SECONDS = float(os.getenv("ADMISSION_ASYNC_QUEUE_SECONDS", "10"))
+RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+POLL_SECONDS = 0.1
+STATE_FILE = os.getenv("ADMISSION_STATE_FILE", "/tmp/guvnl_admission.json")
+
+_ticket_seq = itertools.count()
+
+
+def ingest_dataset(path: str):
+    """Dataset name when `path` is an admission-controlled upload, else None"""
+    if not ADMISSION_ENABLED:
+        return None
+    return BULK_ADD_PATHS.get(path.rstrip("/"))
+
+
+def estimate_rows(content_length) -> int:
+    # Chunked uploads have no length: only admit them into an idle collection
+    if not content_length:
+        return MAX_INFLIGHT_ROWS
+    return max(1, content_length // BYTES_PER_ROW)
+
+
+# ── Shared state ────────────────────────────────────────────────────
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _locked_state():
+    """Yield the live ticket dict under an exclusive lock; changes are saved"""
+    fd = os.open(STATE_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            raw = f.read()
+            try:
+                tickets = json.loads(raw) if raw else {}
+            except ValueError:
+                tickets = {}
+            live = {t: info for t, info in tickets.items() if _pid_alive(info["pid"])}
+            yield live
+            if live != tickets:
+                f.seek(0)
+                f.truncate()
+                json.dump(live, f)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _fits(tickets: dict, collection: str, rows: int) -> bool:
+    if len(tickets) >= MAX_UPLOADS:
+        return False
+    same = [t for t in tickets.values() if t["collection"] == collection]
+    if len(same) >= MAX_UPLOADS_PER_COLLECTION:
+        return False
+    return not same or sum(t["rows"] for t in same) + rows <= MAX_INFLIGHT_ROWS
+
+
+def try_acquire(dataset: str, rows: int):
+    """Ticket id when the upload fits right now, else None"""
+    collection = DATASETS[dataset]["staging"]
+    with _locked_state() as tickets:
+        if not _fits(tickets, collection, rows):
+            return None
+        ticket = f"{os.getpid()}-{next(_ticket_seq)}"
+        tickets[ticket] = {
+            "pid": os.getpid(),
+            "dataset": dataset,
+            "collection": collection,
+            "rows": rows,
+            "since": time.time(),
+        }
+        return ticket
+
+
+def acquire(dataset: str, rows: int, wait_seconds: float = QUEUE_SECONDS):
+    """try_acquire, polling for up to `wait_seconds`; (ticket or None, waited seconds)"""
+    started = time.monotonic()
+    while True:
+        ticket = try_acquire(dataset, rows)
+        waited = time.monotonic() - started
+        if ticket or waited >= wait_seconds:
+            return ticket, waited
+        time.sleep(POLL_SECONDS * (0.5 + random.random()))
+
+
+async def acquire_async(dataset: str, rows: int, wait_seconds: float = ASYNC_QUEUE_SECONDS):
+    """acquire() for the ASGI app; waits without blocking the event loop"""
+    started = time.monotonic()
+    while True:
+        ticket = await asyncio.to_thread(try_acquire, dataset, rows)
+        waited = time.monotonic() - started
+        if ticket or waited >= wait_seconds:
+            return ticket, waited
+        await asyncio.sleep(POLL_SECONDS * (0.5 + random.random()))
+
+
+def release(ticket: str):
+    with _locked_state() as tickets:
+        tickets.pop(ticket, None)
+
+
+def rejection_body(dataset: str) -> dict:
+    return {
+        "error": f"Too many uploads in progress for {dataset}; retry in {RETRY_AFTER_SECONDS}s",
+        "retry_after_seconds": RETRY_AFTER_SECONDS,
+    }
+
+
+def occupancy() -> dict:
+    """Current uploads and in-flight rows across all workers"""
+    with _locked_state() as tickets:
+        active = list(tickets.values())
+    collections = {}
+    now = time.time()
+    for t in active:
+        entry = collections.setdefault(t["collection"], {"uploads": 0, "rows": 0, "oldest_seconds": 0.0})
+        entry["uploads"] += 1
+        entry["rows"] += t["rows"]
+        entry["oldest_seconds"] = max(entry["oldest_seconds"], round(now - t["since"], 1))
+    return {
+        "enabled": ADMISSION_ENABLED,
+        "uploads": len(active),
+        "collections": collections,
+        "limits": {
+            "max_uploads": MAX_UPLOADS,
+            "max_uploads_per_collection": MAX_UPLOADS_PER_COLLECTION,
+            "max_inflight_rows": MAX_INFLIGHT_ROWS,
+            "queue_seconds": QUEUE_SECONDS,
+            "async_queue_seconds": ASYNC_QUEUE_SECONDS,
+            "retry_after_seconds": RETRY_AFTER_SECONDS,
+        },
+    }
@@ -0,0 +1,257 @@
+"""
+Anomaly flags for bulk-add uploads (unit mistakes, shifted timestamps, spikes).
+
+Runs once per upload, after the body is parsed and before anything is
+written. The recent history of the uploaded series (ANOMALY_HISTORY_DAYS
+before the upload up to its last slot) comes from the final collection
+in one aggregation, one document per series with its points as arrays.
+History and upload are then merged per value field into one array sorted
+by (series, time), the upload winning over an approved value at the same
+slot, and every check runs over the whole upload at once:
+
+    zscore   |value − mean| > ANOMALY_ZSCORE × std of the series'
+             history (the upload itself when the history has fewer than
+             ANOMALY_MIN_HISTORY points)
+    jump     step from the previous point (≤ ANOMALY_JUMP_MAX_GAP_MINUTES
+             before) > ANOMALY_JUMP × the series' mean absolute step
+    profile  per uploaded day: RMS of (value − same slot a day earlier)
+             > ANOMALY_PROFILE × std of that earlier day, over at least
+             ANOMALY_PROFILE_MIN_SLOTS matching slots (zscore outliers left
+             out); flags the whole day
+
+A flagged row is staged with  "anomalies": ["zscore:Demand(Actual)", ...]
+and the bulk-add summary counts them:
+
+    "anomalies": {"flagged_rows": 3, "checks": {"jump:Actual": 2, ...},
+                  "history_points": 6720, "elapsed_ms": 4.1}
+
+Flags are advisory: nothing is rejected and auto-approve can hold flagged
+days (no_anomalies). They live in staging only: editing a staged row's
+values (PATCH) clears them and approval strips them from the final doc.
+A failing check stage is printed and reported, never fails the upload.
+ANOMALY_CHECKS= (empty) disables the stage.
+
+The history aggregation uses $isNumber (MongoDB 4.4+).
+"""
+from datetime import datetime, timedelta
+import os
+import time
+
+import numpy as np
+
+from utils.datasets import DATASETS
+from utils.mongo import collection
+
+CHECKS = ("zscore", "jump", "profile")
+ENABLED = tuple(c for c in os.getenv("ANOMALY_CHECKS", ",".join(CHECKS)).replace(" ", "").split(",") if c in CHECKS)
+HISTORY_DAYS = int(os.getenv("ANOMALY_HISTORY_DAYS", "7"))
+MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "96"))
+ZSCORE = float(os.getenv("ANOMALY_ZSCORE", "6"))
+JUMP = float(os.getenv("ANOMALY_JUMP", "8"))
+JUMP_MAX_GAP_MINUTES = int(os.getenv("ANOMALY_JUMP_MAX_GAP_MINUTES", "60"))
+PROFILE = float(os.getenv("ANOMALY_PROFILE", "0.5"))
+PROFILE_MIN_SLOTS = int(os.getenv("ANOMALY_PROFILE_MIN_SLOTS", "12"))
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_DAY_US = 86_400_000_000
+
+
+def anomaly_datasets() -> list:
+    return [name for name, d in DATASETS.items() if d["value_fields"]]
+
+
+def enabled(name: str) -> bool:
+    return bool(ENABLED) and name in DATASETS and bool(DATASETS[name]["value_fields"])
+
+
+# ── History ─────────────────────────────────────────────────────────
+def load_history(name: str, start_us: int, end_us: int, series: list = None) -> list:
+    """[(series, times µs int64, {field: float64})] of the final collection in [start, end]"""
+    dataset = DATASETS[name]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    match = {time_field: {"$gte": _EPOCH + start_us * _MICROSECOND, "$lte": _EPOCH + end_us * _MICROSECOND}}
+    if series_field:
+        match[series_field] = {"$in": series}
+    nan = float("nan")
+    group = {
+        "_id": f"${series_field}" if series_field else None,
+        "t": {"$push": f"${time_field}"},
+        # Missing / non-numeric values stay in place as NaN so the arrays line up
+        **{f"v{i}": {"$push": {"$cond": [{"$isNumber": f"${f}"}, f"${f}", nan]}}
+           for i, f in enumerate(dataset["value_fields"])},
+    }
+    final = collection(dataset["final"], dataset["db"])
+    out = []
+    for doc in final.aggregate([{"$match": match}, {"$group": group}], allowDiskUse=True):
+        times = np.array(doc["t"], dtype="datetime64[us]").astype(np.int64)
+        values = {f: np.array(doc[f"v{i}"], dtype=np.float64) for i, f in enumerate(dataset["value_fields"])}
+        out.append((doc["_id"], times, values))
+    return out
+
+
+# ── Checks ──────────────────────────────────────────────────────────
+def _group_stats(groups, values, weights, n_groups):
+    """(count, mean, std) of values per group, over the points with weight 1"""
+    n = np.bincount(groups, weights, n_groups)
+    s1 = np.bincount(groups, values * weights, n_groups)
+    s2 = np.bincount(groups, values * values * weights, n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s1 / n
+        std = np.sqrt(np.maximum(s2 / n - mean * mean, 0))
+    return n, mean, std
+
+
+def _check_field(times, codes, values, rows, h_times, h_codes, h_values, n_rows):
+    """{check: bool mask over upload rows} for one value field"""
+    t = np.concatenate([times, h_times])
+    c = np.concatenate([codes, h_codes])
+    v = np.concatenate([values, h_values])
+    hist = np.concatenate([np.zeros(len(times), bool), np.ones(len(h_times), bool)])
+    row = np.concatenate([rows, np.full(len(h_times), -1, np.int64)])
+
+    # (series, time) order; at a shared slot the upload sorts first and is kept
+    order = np.lexsort((hist, t, c))
+    t, c, v, hist, row = t[order], c[order], v[order], hist[order], row[order]
+    keep = np.ones(len(t), bool)
+    keep[1:] = (t[1:] != t[:-1]) | (c[1:] != c[:-1])
+    t, c, v, hist, row = t[keep], c[keep], v[keep], hist[keep], row[keep]
+
+    series, s = np.unique(c, return_inverse=True)
+    n_series = len(series)
+    up = ~hist
+    masks = {}
+    outlier = np.zeros(len(v), bool)
+
+    def to_rows(flags):
+        mask = np.zeros(n_rows, bool)
+        mask[row[flags & up]] = True
+        return mask
+
+    if "zscore" in ENABLED:
+        n_h, mean_h, std_h = _group_stats(s, v, hist.astype(np.float64), n_series)
+        _, mean_a, std_a = _group_stats(s, v, np.ones(len(v)), n_series)
+        short = n_h < MIN_HISTORY
+        mean, std = np.where(short, mean_a, mean_h), np.where(short, std_a, std_h)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = np.abs(v - mean[s]) / std[s]
+        outlier = (std[s] > 0) & (z > ZSCORE)
+        masks["zscore"] = to_rows(outlier)
+
+    if "jump" in ENABLED and len(v) > 1:
+        step = np.abs(np.diff(v))
+        pair = (s[1:] == s[:-1]) & (np.diff(t) <= JUMP_MAX_GAP_MINUTES * 60_000_000)
+        pair_s = s[1:]
+        hist_pair = (pair & hist[1:] & hist[:-1]).astype(np.float64)
+        n_h, mean_h, _ = _group_stats(pair_s, step, hist_pair, n_series)
+        _, mean_a, _ = _group_stats(pair_s, step, pair.astype(np.float64), n_series)
+        scale = np.where(n_h < MIN_HISTORY, mean_a, mean_h)[pair_s]
+        jumped = np.zeros(len(v), bool)
+        jumped[1:] = pair & (scale > 0) & (step > JUMP * scale)
+        masks["jump"] = to_rows(jumped)
+
+    if "profile" in ENABLED:
+        t0 = t.min()
+        span = t.max() - t0 + 1
+        key = s * span + (t - t0)
+        wanted = t - _DAY_US
+        has_prev = up & (wanted >= t0)
+        idx = np.searchsorted(key, s * span + (wanted - t0))
+        idx = np.minimum(idx, len(key) - 1)
+        # A single spike is a zscore/jump matter, not a reason to flag its whole day
+        matched = has_prev & (key[idx] == s * span + (wanted - t0)) & ~outlier & ~outlier[idx]
+        prev = np.where(matched, v[idx], 0.0)
+
+        day = t // _DAY_US
+        days, g = np.unique(s * (day.max() - day.min() + 1) + (day - day.min()), return_inverse=True)
+        w = matched.astype(np.float64)
+        n, _, std_prev = _group_stats(g, prev, w, len(days))
+        sq = np.bincount(g, (v - prev) ** 2 * w, len(days))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = np.sqrt(sq / n) / std_prev
+        off = (n >= PROFILE_MIN_SLOTS) & (std_prev > 0) & (ratio > PROFILE)
+        masks["profile"] = to_rows(off[g])
+
+    return masks
+
+
+def flag_arrays(name: str, times, codes, series_names: list, fields: dict, n_rows: int):
+    """
+    ({row: [flag]}, report) for one upload given as arrays:
+    times (µs int64 per row), codes (series number per row, indexes
+    series_names; zeros for single-series data) and {field: (float64
+    values, bool present)}.
+    """
+    started = time.perf_counter()
+    dataset = DATASETS[name]
+    series_field = dataset["series_field"]
+    history = load_history(name, int(times.min()) - HISTORY_DAYS * _DAY_US, int(times.max()),
+                           sorted({series_names[i] for i in np.unique(codes)} - {None}) if series_field else None)
+    code_of = {series: i for i, series in enumerate(series_names)}
+    history = [(code_of.get(series, 0), t, values) for series, t, values in history
+               if not series_field or series in code_of]
+
+    counts, flags = {}, {}
+    for field in dataset["value_fields"]:
+        if field not in fields:
+            continue
+        values, present = fields[field]
+        present = present & np.isfinite(values)
+        rows = np.flatnonzero(present)
+        if not len(rows):
+            continue
+        h_times, h_codes, h_values = [], [], []
+        for code, t, hv in history:
+            ok = np.isfinite(hv[field])
+            h_times.append(t[ok])
+            h_codes.append(np.full(int(ok.sum()), code, np.int64))
+            h_values.append(hv[field][ok])
+        masks = _check_field(times[rows], codes[rows], values[rows], rows,
+                             np.concatenate(h_times or [np.empty(0, np.int64)]),
+                             np.concatenate(h_codes or [np.empty(0, np.int64)]),
+                             np.concatenate(h_values or [np.empty(0)]), n_rows)
+        for check, mask in masks.items():
+            hits = np.flatnonzero(mask)
+            if len(hits):
+                counts[f"{check}:{field}"] = len(hits)
+                for r in hits.tolist():
+                    flags.setdefault(r, []).append(f"{check}:{field}")
+
+    report = {
+        "flagged_rows": len(flags),
+        "checks": counts,
+        "history_points": sum(len(t) for _, t, _ in history),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return flags, report
+
+
+def _failed(name: str, e: Exception):
+    print(f"[Anomaly Error] {name}: {e}")
+    return {}, {"flagged_rows": 0, "checks": {}, "error": str(e)}
+
+
+def flag_buffer(name: str, buffer):
+    """flag_rows hook of utils.ingest.bulk_ingest: flags for the rows of a RowBuffer"""
+    if not enabled(name):
+        return {}, None
+    try:
+        dataset = DATASETS[name]
+        shapes = np.frombuffer(buffer.row_shapes(), dtype=np.uint8)
+        _, raw_times, _ = buffer.column(dataset["time_field"])
+        times = np.frombuffer(raw_times, dtype=np.int64)
+        strings = buffer.strings()
+        codes, series_names = np.zeros(len(buffer), np.int64), [None]
+        if dataset["series_field"]:
+            _, raw_series, _ = buffer.column(dataset["series_field"])
+            codes = np.frombuffer(raw_series, dtype=np.uint32).astype(np.int64)
+            series_names = strings
+        fields = {}
+        for field in dataset["value_fields"]:
+            col = buffer.column(field)
+            if col is None or col[0] != "f":
+                continue
+            fields[field] = (np.frombuffer(col[1], dtype=np.float64), np.array(col[2], bool)[shapes])
+        return flag_arrays(name, times, codes, series_names, fields, len(buffer))
+    except Exception as e:
+        return _failed(name, e)
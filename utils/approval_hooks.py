@@ -0,0 +1,50 @@
+"""
+Derived state kept in step with uploads and approvals.
+
+Every bulk-add route (Flask and ASGI) calls after_bulk_add() with its
+summary; every approve route (and the auto-approver) calls after_approve()
+once the approved docs are in the final collection. A failing hook is reported but
+never fails the approval itself: each one has its own way back to a
+consistent state (cache TTL, `rebuild-rollups`, `rebuild-checksums`,
+clients refetching on reconnect to the change feed).
+"""
+import asyncio
+
+from utils import accuracy, autoapprove, changefeed, checksums, rollups
+
+
+def after_bulk_add(name: str, summary: dict, time_range: tuple = None, by: str = None):
+    changefeed.publish_bulk_add(name, summary, time_range, by)
+    autoapprove.after_bulk_add(name, time_range)
+
+
+async def after_bulk_add_async(name: str, summary: dict, time_range: tuple = None, by: str = None):
+    await changefeed.publish_bulk_add_async(name, summary, time_range, by)
+    autoapprove.after_bulk_add(name, time_range)
+
+
+def after_approve(name: str, docs: list):
+    accuracy.invalidate(name, docs)
+    changefeed.publish(name, "approved", len(docs), docs=docs)
+    try:
+        rollups.refresh(name, docs)
+    except Exception as e:
+        print(f"[Rollup Error] {name}: {e} (run `flask --app app rebuild-rollups {name}`)")
+    try:
+        checksums.refresh(name, docs)
+    except Exception as e:
+        print(f"[Checksum Error] {name}: {e} (run `flask --app app rebuild-checksums {name}`)")
+
+
+async def after_approve_async(name: str, docs: list):
+    await accuracy.invalidate_async(name, docs)
+    await changefeed.publish_async(name, "approved", len(docs), docs=docs)
+    try:
+        # A handful of $merge aggregations; run on the sync client off the event loop
+        await asyncio.to_thread(rollups.refresh, name, docs)
+    except Exception as e:
+        print(f"[Rollup Error] {name}: {e} (run `flask --app app rebuild-rollups {name}`)")
+    try:
+        await asyncio.to_thread(checksums.refresh, name, docs)
+    except Exception as e:
+        print(f"[Checksum Error] {name}: {e} (run `flask --app app rebuild-checksums {name}`)")
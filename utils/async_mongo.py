@@ -0,0 +1,45 @@
+from pymongo import AsyncMongoClient
+import os
+
+from utils.mongo import (
+    MONGO_URI, MAX_POOL_SIZE, MIN_POOL_SIZE, MAX_IDLE_TIME_MS, CONNECT_TIMEOUT_MS,
+    SERVER_SELECTION_TIMEOUT_MS, SOCKET_TIMEOUT_MS, WAIT_QUEUE_TIMEOUT_MS, COMPRESSORS,
+    registered_listeners,
+)
+
+# Same pool settings as the sync client in utils/mongo.py; one client per
+# ASGI worker process, created inside the running event loop.
+_client = None
+_client_pid = None
+
+
+def get_async_client() -> AsyncMongoClient:
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        options = {
+            "maxPoolSize": MAX_POOL_SIZE,
+            "minPoolSize": MIN_POOL_SIZE,
+            "maxIdleTimeMS": MAX_IDLE_TIME_MS,
+            "connectTimeoutMS": CONNECT_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+            "socketTimeoutMS": SOCKET_TIMEOUT_MS,
+            "waitQueueTimeoutMS": WAIT_QUEUE_TIMEOUT_MS,
+            "event_listeners": registered_listeners(),
+        }
+        if COMPRESSORS:
+            options["compressors"] = COMPRESSORS
+        _client = AsyncMongoClient(MONGO_URI, **options)
+        _client_pid = os.getpid()
+    return _client
+
+
+def get_async_collection(db_name: str, collection_name: str):
+    return get_async_client()[db_name][collection_name]
+
+
+async def close_async_client():
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        await _client.close()
+    _client = None
+    _client_pid = None
@@ -0,0 +1,416 @@
+"""
+Rules-based auto-approval of staged data.
+
+Rules live in a JSON file (AUTO_APPROVE_RULES_FILE; unset = disabled),
+one entry per dataset, reloaded when the file changes:
+
+    {
+      "demand": {
+        "complete_day": true,            every slot of the day is staged
+        "slot_minutes": 15,              slot size for complete_day (default 15)
+        "pred_tolerance_pct": 5,         |Pred − Actual| ≤ 5% of |Actual| (accuracy_fields)
+        "bounds": {"Demand(Actual)": [0, 20000]},   per-field [min, max], null = open
+        "max_change_pct": 0,             staged vs approved value: 0 = unchanged,
+                                         rows not approved before always pass
+        "no_anomalies": true,            no row flagged at upload (utils.anomaly)
+        "on_bulk_add": true              evaluate the uploaded range after each bulk-add
+      },
+      "plant": {...}
+    }
+
+A rule set is evaluated over whole days of the staging collection by one
+aggregation that flags each row and groups the flags per day (and per
+plant). A day where every row passes every rule is moved to the final
+collection with the same steps as the approve routes (ReplaceOne upsert,
+record_approval, after_approve, staging delete), so rollups, checksums,
+the accuracy cache and the change feed stay in step. Anything else is
+left in staging for reviewers, with the reasons in the report.
+
+The evaluation records each row's version (uploaded_at and the fields
+the rules read). Migration re-reads the rows and moves a day only if
+every row is still at the version that was checked. A day re-uploaded or
+edited in between stays in staging ("changed since evaluation") for the
+run its new upload queues. Deletes are conditioned on the same version.
+
+Runs:
+  - after a bulk-add, for datasets with on_bulk_add, on a background
+    thread of the worker that took the upload (the upload is not delayed)
+  - every AUTO_APPROVE_INTERVAL_SECONDS over the whole staging collection,
+    in one worker per host (flock on AUTO_APPROVE_LOCK_FILE); 0 disables
+  - on demand: POST /auto-approve/<dataset> queues a run on the same
+    background thread (202; dry_run previews synchronously) or
+    flask --app app auto-approve [DATASET] [--start ISO] [--end ISO] [--dry-run]
+
+$dateTrunc / $isNumber and the $lookup used by max_change_pct need MongoDB 5.0+.
+"""
+from datetime import datetime, timedelta
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+
+from pymongo import DeleteOne, ReplaceOne
+
+from utils import approval_hooks, coalesce
+from utils.datasets import DATASETS
+from utils.dates import naive_utc
+from utils.diff import final_lookup, final_value
+from utils.metrics import record_approval
+from utils.mongo import collection
+
+RULES_FILE = os.getenv("AUTO_APPROVE_RULES_FILE", "")
+INTERVAL_SECONDS = int(os.getenv("AUTO_APPROVE_INTERVAL_SECONDS", "0"))
+LOCK_FILE = os.getenv("AUTO_APPROVE_LOCK_FILE", "/tmp/guvnl_auto_approve.lock")
+# Rows moved per approval batch
+MIGRATE_BATCH = int(os.getenv("AUTO_APPROVE_MIGRATE_BATCH", "10000"))
+# Held days listed in a report (the total is always given)
+MAX_HELD_REPORT = 200
+
+RULE_KEYS = ("complete_day", "slot_minutes", "pred_tolerance_pct", "bounds", "max_change_pct", "no_anomalies",
+             "on_bulk_add")
+CHECK_KEYS = ("complete_day", "pred_tolerance_pct", "bounds", "max_change_pct", "no_anomalies")
+
+_DAY = timedelta(days=1)
+
+_rules_cache = {"mtime": None, "rules": {}}
+_rules_lock = threading.Lock()
+_queue = queue.Queue()
+_workers = {"bulk_add": False, "schedule": False}
+_workers_lock = threading.Lock()
+
+
+class AutoApproveError(ValueError):
+    """Invalid rules or auto-approve request (→ 400)"""
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# ── Rules ───────────────────────────────────────────────────────────
+def _is_number(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def validate_rules(name: str, rules: dict) -> dict:
+    if name not in DATASETS:
+        raise AutoApproveError(f"Unknown dataset '{name}' in rules (expected one of {', '.join(DATASETS)})")
+    if not isinstance(rules, dict):
+        raise AutoApproveError(f"{name}: rules must be an object")
+    unknown = [k for k in rules if k not in RULE_KEYS]
+    if unknown:
+        raise AutoApproveError(f"{name}: unknown rule(s) {', '.join(unknown)} (expected {', '.join(RULE_KEYS)})")
+    # Without a single check every staged day would pass
+    if not any(rules.get(k) not in (None, False, {}) for k in CHECK_KEYS):
+        raise AutoApproveError(f"{name}: at least one of {', '.join(CHECK_KEYS)} is required")
+    dataset = DATASETS[name]
+    slot = rules.get("slot_minutes", 15)
+    if not isinstance(slot, int) or slot <= 0 or 1440 % slot:
+        raise AutoApproveError(f"{name}: slot_minutes must divide a day")
+    for key in ("pred_tolerance_pct", "max_change_pct"):
+        if rules.get(key) is not None and (not _is_number(rules[key]) or rules[key] < 0):
+            raise AutoApproveError(f"{name}: {key} must be a non-negative number")
+    if rules.get("pred_tolerance_pct") is not None and not dataset.get("accuracy_fields"):
+        raise AutoApproveError(f"{name}: pred_tolerance_pct needs an Actual/Pred pair (accuracy_fields)")
+    if rules.get("max_change_pct") is not None and not dataset["value_fields"]:
+        raise AutoApproveError(f"{name}: max_change_pct needs declared value fields")
+    bounds = rules.get("bounds") or {}
+    if not isinstance(bounds, dict):
+        raise AutoApproveError(f"{name}: bounds must map field → [min, max]")
+    for field, pair in bounds.items():
+        if not (isinstance(pair, list) and len(pair) == 2 and all(b is None or _is_number(b) for b in pair)):
+            raise AutoApproveError(f"{name}: bounds.{field} must be [min, max] (null for open)")
+    return rules
+
+
+def load_rules() -> dict:
+    """{dataset: rules} from AUTO_APPROVE_RULES_FILE, re-read when it changes"""
+    if not RULES_FILE:
+        return {}
+    try:
+        mtime = os.stat(RULES_FILE).st_mtime
+    except FileNotFoundError:
+        return {}
+    with _rules_lock:
+        if _rules_cache["mtime"] != mtime:
+            with open(RULES_FILE) as f:
+                raw = json.load(f)
+            if not isinstance(raw, dict):
+                raise AutoApproveError("auto-approve rules must be an object keyed by dataset")
+            _rules_cache["rules"] = {name: validate_rules(name, rules) for name, rules in raw.items()}
+            _rules_cache["mtime"] = mtime
+        return _rules_cache["rules"]
+
+
+# ── Evaluation ──────────────────────────────────────────────────────
+def _fails(cond) -> dict:
+    return {"$cond": [cond, 0, 1]}
+
+
+def version_fields(name: str, rules: dict) -> list:
+    """Fields whose values make up a staged row's version: what the rules read, plus uploaded_at"""
+    dataset = DATASETS[name]
+    return list(dict.fromkeys(("uploaded_at", *dataset["value_fields"], *(dataset.get("accuracy_fields") or ()),
+                               *(rules.get("bounds") or {}), "anomalies")))
+
+
+def build_pipeline(name: str, rules: dict, start: datetime = None, end: datetime = None) -> list:
+    dataset = DATASETS[name]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+
+    match = {}
+    if start or end:
+        match[time_field] = {}
+        if start:
+            match[time_field]["$gte"] = start
+        if end:
+            match[time_field]["$lt"] = end
+
+    flags = {}
+    if rules.get("pred_tolerance_pct") is not None:
+        actual, pred = (f"${f}" for f in dataset["accuracy_fields"])
+        flags["pred_tolerance"] = _fails({"$and": [
+            {"$isNumber": actual}, {"$isNumber": pred},
+            {"$lte": [{"$abs": {"$subtract": [pred, actual]}},
+                      {"$multiply": [{"$abs": actual}, rules["pred_tolerance_pct"] / 100]}]},
+        ]})
+    for field, (lo, hi) in (rules.get("bounds") or {}).items():
+        checks = [{"$isNumber": f"${field}"}]
+        if lo is not None:
+            checks.append({"$gte": [f"${field}", lo]})
+        if hi is not None:
+            checks.append({"$lte": [f"${field}", hi]})
+        flags[f"bounds:{field}"] = _fails({"$and": checks})
+    if rules.get("no_anomalies"):
+        flags["anomalies"] = _fails({"$eq": [{"$size": {"$ifNull": ["$anomalies", []]}}, 0]})
+
+    stages = [{"$match": match}]
+    if rules.get("max_change_pct") is not None:
+        stages += final_lookup(name)
+        pct = rules["max_change_pct"] / 100
+        within = []
+        for f in dataset["value_fields"]:
+            staged, final = f"${f}", final_value(f)
+            within.append({"$cond": [
+                {"$and": [{"$isNumber": staged}, {"$isNumber": final}]},
+                {"$lte": [{"$abs": {"$subtract": [staged, final]}}, {"$multiply": [{"$abs": final}, pct]}]},
+                {"$eq": [staged, final]},
+            ]})
+        flags["max_change"] = _fails({"$or": [{"$eq": [{"$type": "$_final"}, "missing"]}, {"$and": within}]})
+
+    group_id = {"day": {"$dateTrunc": {"date": f"${time_field}", "unit": "day"}}}
+    if series_field:
+        group_id["series"] = f"${series_field}"
+    stages += [
+        {"$group": {
+            "_id": group_id,
+            "rows": {"$sum": 1},
+            # Positional keys: field names like "Demand(Actual)" are fine as values, not as keys
+            "versions": {"$push": {"_id": "$_id", **{f"v{i}": f"${f}"
+                                                     for i, f in enumerate(version_fields(name, rules))}}},
+            **{flag: {"$sum": expr} for flag, expr in flags.items()},
+        }},
+        {"$sort": {"_id.day": 1, **({"_id.series": 1} if series_field else {})}},
+    ]
+    return stages
+
+
+def evaluate(name: str, rules: dict, start: datetime = None, end: datetime = None):
+    """Yield (group, reasons) per staged day (and series) in [start, end); no reasons = passes"""
+    dataset = DATASETS[name]
+    staging = collection(dataset["staging"], dataset["db"])
+    slots = 1440 // rules.get("slot_minutes", 15)
+    flag_names = None
+    for group in staging.aggregate(build_pipeline(name, rules, start, end), allowDiskUse=True):
+        if flag_names is None:
+            flag_names = [k for k in group if k not in ("_id", "rows", "versions")]
+        reasons = [f"{flag}: {group[flag]} row(s)" for flag in flag_names if group[flag]]
+        if rules.get("complete_day") and group["rows"] != slots:
+            reasons.insert(0, f"complete_day: {group['rows']}/{slots} slots staged")
+        yield group, reasons
+
+
+# ── Migration (same steps as the approve routes) ────────────────────
+def _unchanged(doc: dict, version: dict, fields: list) -> bool:
+    return all(doc.get(f) == version.get(f"v{i}") for i, f in enumerate(fields))
+
+
+def _version_filter(version: dict, fields: list) -> dict:
+    # {field: None} also matches a field that is missing, as it was when evaluated
+    return {"_id": version["_id"], **{f: version.get(f"v{i}") for i, f in enumerate(fields)}}
+
+
+def _migrate_batch(name: str, groups: list, fields: list):
+    dataset = DATASETS[name]
+    staging = collection(dataset["staging"], dataset["db"])
+    final = collection(dataset["final"], dataset["db"])
+    ids = [v["_id"] for group in groups for v in group["versions"]]
+    current = {doc["_id"]: doc for doc in staging.find({"_id": {"$in": ids}})}
+
+    moving, changed = [], []
+    for group in groups:
+        if all(v["_id"] in current and _unchanged(current[v["_id"]], v, fields) for v in group["versions"]):
+            moving.append(group)
+        else:
+            changed.append(group)
+    if not moving:
+        return 0, changed
+
+    versions = [v for group in moving for v in group["versions"]]
+    docs = [current[v["_id"]] for v in versions]
+    ops = []
+    for doc in docs:
+        doc.pop("_id", None)
+        doc.pop("anomalies", None)
+        ops.append(ReplaceOne({k: doc.get(k) for k in dataset["key_fields"]}, doc, upsert=True))
+    final.bulk_write(ops, ordered=False)
+    record_approval(name, len(docs))
+    approval_hooks.after_approve(name, docs)
+    # Not a request to the dataset's own routes, so the after_request invalidation never sees it
+    coalesce.invalidate(dataset["url_prefix"])
+    # A row rewritten since it was read stays staged; its checked version is what was approved
+    staging.bulk_write([DeleteOne(_version_filter(v, fields)) for v in versions], ordered=False)
+    return len(docs), changed
+
+
+def migrate(name: str, groups: list, fields: list):
+    """Move evaluated groups whose rows are all still at their checked version → (rows moved, changed groups)"""
+    moved, changed, batch, batch_rows = 0, [], [], 0
+    for group in groups + [None]:
+        if group is not None:
+            batch.append(group)
+            batch_rows += len(group["versions"])
+        if batch and (group is None or batch_rows >= MIGRATE_BATCH):
+            n, held = _migrate_batch(name, batch, fields)
+            moved += n
+            changed.extend(held)
+            batch, batch_rows = [], 0
+    return moved, changed
+
+
+def _prepare(name: str, start: datetime, end: datetime, rules: dict = None):
+    """(rules, start, end) for a run: AutoApproveError when it cannot run, range widened to whole days"""
+    if name not in DATASETS:
+        raise AutoApproveError(f"Unknown dataset (expected one of {', '.join(DATASETS)})")
+    rules = rules if rules is not None else load_rules().get(name)
+    if not rules:
+        raise AutoApproveError(f"No auto-approve rules for '{name}'"
+                               + ("" if RULES_FILE else " (AUTO_APPROVE_RULES_FILE is not set)"))
+    start, end = naive_utc(start), naive_utc(end)
+    if start and end and start >= end:
+        raise AutoApproveError("start must be before end")
+    # Whole days only: a day is approved or held as a unit
+    start = _day(start) if start else None
+    end = _day(end - timedelta(microseconds=1)) + _DAY if end else None
+    return rules, start, end
+
+
+def run(name: str, start: datetime = None, end: datetime = None, dry_run: bool = False,
+        rules: dict = None) -> dict:
+    """Evaluate the staged days of `name` overlapping [start, end) and approve the passing ones"""
+    rules, start, end = _prepare(name, start, end, rules)
+
+    series_field = DATASETS[name]["series_field"]
+    report = {"dataset": name, "dry_run": dry_run, "days": 0, "passed": 0, "approved_rows": 0,
+              "held_total": 0, "held": []}
+
+    def hold(group, reasons):
+        report["held_total"] += 1
+        if len(report["held"]) < MAX_HELD_REPORT:
+            held = {"day": f"{group['_id']['day']:%Y-%m-%d}", "rows": group["rows"], "reasons": reasons}
+            if series_field:
+                held[series_field] = group["_id"].get("series")
+            report["held"].append(held)
+
+    passing = []
+    for group, reasons in evaluate(name, rules, start, end):
+        report["days"] += 1
+        if reasons:
+            hold(group, reasons)
+        else:
+            passing.append(group)
+
+    if dry_run:
+        report["passed"] = len(passing)
+        report["approved_rows"] = sum(group["rows"] for group in passing)
+    elif passing:
+        report["approved_rows"], changed = migrate(name, passing, version_fields(name, rules))
+        report["passed"] = len(passing) - len(changed)
+        for group in changed:
+            hold(group, ["changed since evaluation"])
+        print(f"[Auto Approve] {name}: {report['passed']} day(s), {report['approved_rows']} row(s) approved, "
+              f"{report['held_total']} held")
+    return report
+
+
+# ── Triggers ────────────────────────────────────────────────────────
+def _bulk_add_loop():
+    while True:
+        name, start, end = _queue.get()
+        try:
+            run(name, start, end)
+        except Exception as e:
+            print(f"[Auto Approve Error] {name}: {e}")
+
+
+def _enqueue(name: str, start: datetime, end: datetime):
+    with _workers_lock:
+        if not _workers["bulk_add"]:
+            threading.Thread(target=_bulk_add_loop, name="auto-approve", daemon=True).start()
+            _workers["bulk_add"] = True
+    _queue.put((name, start, end))
+
+
+def enqueue(name: str, start: datetime = None, end: datetime = None) -> dict:
+    """Check that a run can start, then queue it on the background thread → the range it will cover"""
+    _, start, end = _prepare(name, start, end)
+    _enqueue(name, start, end)
+    return {"dataset": name, "start": start, "end": end, "queued_runs": _queue.qsize()}
+
+
+def after_bulk_add(name: str, time_range: tuple = None):
+    """Queue the uploaded range for evaluation when the dataset's rules ask for it"""
+    if not time_range:
+        return
+    try:
+        rules = load_rules().get(name)
+    except Exception as e:
+        print(f"[Auto Approve Error] rules: {e}")
+        return
+    if not rules or not rules.get("on_bulk_add"):
+        return
+    _enqueue(name, time_range[0], time_range[1] + timedelta(microseconds=1))
+
+
+def _schedule_loop():
+    # Only one worker per host holds the lock; the rest stay idle
+    with open(LOCK_FILE, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        while True:
+            try:
+                names = list(load_rules())
+            except Exception as e:
+                print(f"[Auto Approve Error] rules: {e}")
+                names = []
+            for name in names:
+                try:
+                    run(name)
+                except Exception as e:
+                    print(f"[Auto Approve Error] {name}: {e}")
+            time.sleep(INTERVAL_SECONDS)
+
+
+def start_schedule_worker():
+    """Start the periodic auto-approve thread (no-op when the interval is 0)"""
+    if INTERVAL_SECONDS <= 0 or not RULES_FILE or _workers["schedule"]:
+        return
+    with _workers_lock:
+        if _workers["schedule"]:
+            return
+        threading.Thread(target=_schedule_loop, name="auto-approve-schedule", daemon=True).start()
+        _workers["schedule"] = True
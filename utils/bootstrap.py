@@ -0,0 +1,51 @@
+from dotenv import load_dotenv
+import threading
+
+load_dotenv()
+
+# One-time startup work (index builds etc.), registered at import time
+# by the route modules but only executed by `ensure_indexes()`.
+_tasks = []
+_done = False
+_lock = threading.Lock()
+
+
+def register_index(collection, keys, **options):
+    """Declare an index to build during bootstrap (no I/O at call time)"""
+    _tasks.append((f"{collection.name}: {keys}", lambda: collection.create_index(keys, **options)))
+
+
+def register_task(name: str, fn):
+    """Declare any other idempotent bootstrap step"""
+    _tasks.append((name, fn))
+
+
+def ensure_indexes(force: bool = False) -> dict:
+    """
+    Run every registered bootstrap step once per process.
+    Failures are reported, not raised, matching the old import-time behaviour.
+    """
+    global _done
+    with _lock:
+        if _done and not force:
+            return {"skipped": True}
+        results = {}
+        for name, fn in _tasks:
+            try:
+                fn()
+                results[name] = "ok"
+            except Exception as e:
+                results[name] = f"error: {e}"
+                print(f"[Bootstrap Error] {name}: {e}")
+        _done = True
+        return results
+
+
+if __name__ == "__main__":
+    # Importing the app registers every route module's indexes; use the
+    # imported module's registry, not this __main__ copy
+    import app  # noqa: F401
+    from utils import bootstrap
+
+    for task_name, outcome in bootstrap.ensure_indexes().items():
+        print(f"[Bootstrap] {task_name} → {outcome}")
@@ -0,0 +1,367 @@
+"""
+Change notifications for the approval queues, pushed over SSE.
+
+The write sites (bulk-add, PATCH, DELETE and approve routes, Flask and
+ASGI) publish one compact event per request, not per document:
+
+    {"dataset": "plant", "op": "inserted", "count": 9600, "replaced": 0,
+     "start": "2025-08-01T00:00:00", "end": "2025-08-31T23:45:00",
+     "by": "a@b.c", "at": "2025-09-01T10:00:00.123000"}
+
+    op  inserted  bulk-add (count new, replaced existing, start/end of the upload)
+        updated   PATCH of one staging record (ids)
+        deleted   DELETE of one staging record (ids)
+        approved  moved to the final collection (count, start/end)
+
+Transport, picked once per process (CHANGE_FEED_MODE=auto|mongo|file):
+  mongo  events are inserted into Change_Feed (TTL CHANGE_FEED_TTL_SECONDS)
+         and subscribers follow a change stream on it; needs a replica set
+         or mongos. Event ids are resume tokens.
+  file   events are appended to CHANGE_FEED_FILE (shared by every worker on
+         the host, rotated at CHANGE_FEED_FILE_MAX_BYTES) and subscribers
+         tail it; publishers in the same process wake them immediately.
+         Event ids are <inode>-<offset>.
+Either way a reconnecting EventSource resumes from Last-Event-ID.
+
+Subscribers are served by the async app (asgi.py, native Quart route with
+an async tail): a stream only holds a coroutine there. The Flask route
+streams only under a threaded or gevent/eventlet worker; under gunicorn's
+sync workers (start_app.sh) each subscriber would hold a whole worker, so
+it answers 503 instead. Streams end after CHANGE_FEED_STREAM_MAX_SECONDS,
+below the gunicorn --timeout, and the client reconnects.
+
+Publishing never fails the write it describes: errors are printed.
+"""
+from datetime import datetime
+import asyncio
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+
+from pymongo import ASCENDING
+
+from utils.async_mongo import get_async_collection
+from utils.datasets import DATASETS
+from utils.mongo import POWERCASTING_DB, collection, get_client
+
+MODE = os.getenv("CHANGE_FEED_MODE", "auto").lower()
+FEED_COLLECTION = "Change_Feed"
+TTL_SECONDS = int(os.getenv("CHANGE_FEED_TTL_SECONDS", "86400"))
+FILE_PATH = os.getenv("CHANGE_FEED_FILE", "/tmp/guvnl_change_feed.log")
+FILE_MAX_BYTES = int(os.getenv("CHANGE_FEED_FILE_MAX_BYTES", str(16 * 1024 * 1024)))
+POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "0.5"))
+HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+# Clients reconnect after this; keep it well below gunicorn's --timeout (120 s)
+STREAM_MAX_SECONDS = float(os.getenv("CHANGE_FEED_STREAM_MAX_SECONDS", "50"))
+RETRY_MS = int(os.getenv("CHANGE_FEED_RETRY_MS", "3000"))
+
+feed_collection = collection(FEED_COLLECTION)
+
+_mode = {"pid": None, "value": None}
+_mode_lock = threading.Lock()
+# Wakes this process's file subscribers as soon as a local publish lands
+_wakeup = threading.Condition()
+
+
+class ChangeFeedError(ValueError):
+    """Invalid subscription (→ 400)"""
+
+
+def ensure_feed_indexes():
+    if transport() == "mongo":
+        feed_collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=TTL_SECONDS)
+
+
+def transport() -> str:
+    """'mongo' or 'file', decided once per process"""
+    if MODE in ("mongo", "file"):
+        return MODE
+    if _mode["pid"] == os.getpid():
+        return _mode["value"]
+    with _mode_lock:
+        if _mode["pid"] != os.getpid():
+            try:
+                hello = get_client().admin.command("hello")
+                value = "mongo" if hello.get("setName") or hello.get("msg") == "isdbgrid" else "file"
+            except Exception as e:
+                print(f"[ChangeFeed Error] transport probe failed, using file: {e}")
+                value = "file"
+            _mode.update(pid=os.getpid(), value=value)
+    return _mode["value"]
+
+
+# ── Publishing ──────────────────────────────────────────────────────
+def _iso(ts):
+    return ts.isoformat() if isinstance(ts, datetime) else ts
+
+
+def make_event(name: str, op: str, count: int, docs: list = None, time_range: tuple = None,
+               ids: list = None, by: str = None, **counts) -> dict:
+    """Event body; the range comes from `docs` or an explicit (start, end)"""
+    if docs:
+        time_field = DATASETS[name]["time_field"]
+        stamps = [d[time_field] for d in docs if isinstance(d.get(time_field), datetime)]
+        if stamps:
+            time_range = (min(stamps), max(stamps))
+    event = {"dataset": name, "op": op, "count": count, **counts}
+    if time_range:
+        event["start"], event["end"] = _iso(time_range[0]), _iso(time_range[1])
+    if ids:
+        event["ids"] = [str(i) for i in ids]
+    if by:
+        event["by"] = by
+    event["at"] = datetime.utcnow().isoformat()
+    return event
+
+
+def _append_line(line: bytes):
+    with open(FILE_PATH, "ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Another worker may have rotated the file since we opened it
+            if os.fstat(f.fileno()).st_ino != os.stat(FILE_PATH).st_ino:
+                raise FileNotFoundError
+            if f.tell() + len(line) > FILE_MAX_BYTES:
+                os.replace(FILE_PATH, FILE_PATH + ".1")
+                raise FileNotFoundError
+            f.write(line)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def publish(name: str, op: str, count: int, **fields):
+    """Record one change event; see make_event() for the fields"""
+    try:
+        event = make_event(name, op, count, **fields)
+        if transport() == "mongo":
+            feed_collection.insert_one({**event, "created_at": datetime.utcnow()})
+        else:
+            line = (json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8")
+            try:
+                _append_line(line)
+            except FileNotFoundError:
+                _append_line(line)
+            with _wakeup:
+                _wakeup.notify_all()
+    except Exception as e:
+        print(f"[ChangeFeed Error] {name} {op}: {e}")
+
+
+def publish_bulk_add(name: str, summary: dict, time_range: tuple = None, by: str = None):
+    """inserted event for a bulk-add summary; nothing written → nothing published"""
+    if summary.get("inserted_new") or summary.get("replaced_existing"):
+        publish(name, "inserted", summary["inserted_new"], replaced=summary["replaced_existing"],
+                time_range=time_range, by=by)
+
+
+async def publish_async(name: str, op: str, count: int, **fields):
+    await asyncio.to_thread(publish, name, op, count, **fields)
+
+
+async def publish_bulk_add_async(name: str, summary: dict, time_range: tuple = None, by: str = None):
+    await asyncio.to_thread(publish_bulk_add, name, summary, time_range, by)
+
+
+# ── Subscribing ─────────────────────────────────────────────────────
+class _MongoTail:
+    def __init__(self, names: list, last_id: str = None):
+        pipeline = [{"$match": {"operationType": "insert", "fullDocument.dataset": {"$in": names}}}]
+        options = {"max_await_time_ms": int(min(HEARTBEAT_SECONDS, 5) * 1000)}
+        if last_id:
+            options["resume_after"] = {"_data": last_id}
+        # Opened here so a bad token / missing replica set fails before streaming
+        self._stream = feed_collection.watch(pipeline, **options)
+
+    def poll(self):
+        """[(id, event)] available now (waits up to max_await_time_ms)"""
+        change = self._stream.try_next()
+        if change is None:
+            return []
+        event = change["fullDocument"]
+        event.pop("_id", None)
+        event.pop("created_at", None)
+        return [(change["_id"]["_data"], event)]
+
+    def close(self):
+        self._stream.close()
+
+
+class _FileTail:
+    def __init__(self, names: list, last_id: str = None):
+        self.names = set(names)
+        open(FILE_PATH, "ab").close()
+        self._open()
+        self._file.seek(0, os.SEEK_END)
+        if last_id:
+            inode, _, offset = last_id.partition("-")
+            if inode == str(self._inode) and offset.isdigit() and int(offset) <= self._file.tell():
+                self._file.seek(int(offset))
+        self._partial = b""
+
+    def _open(self):
+        self._file = open(FILE_PATH, "rb")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+    def _read(self) -> list:
+        out = []
+        for chunk in iter(self._file.readline, b""):
+            line = self._partial + chunk
+            if not line.endswith(b"\n"):
+                # Writer mid-line: keep it for the next poll
+                self._partial = line
+                break
+            self._partial = b""
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("dataset") in self.names:
+                out.append((f"{self._inode}-{self._file.tell()}", event))
+        return out
+
+    def _poll_now(self):
+        """Events available without waiting, or None when the caller should wait"""
+        events = self._read()
+        if events:
+            return events
+        try:
+            rotated = os.stat(FILE_PATH).st_ino != self._inode
+        except FileNotFoundError:
+            rotated = False
+        if rotated:
+            # Finish the old file, then follow the new one from its start
+            events = self._read()
+            self._file.close()
+            self._open()
+            self._partial = b""
+            return events + self._read()
+        return None
+
+    def poll(self):
+        events = self._poll_now()
+        if events is not None:
+            return events
+        with _wakeup:
+            _wakeup.wait(POLL_SECONDS)
+        return self._read()
+
+    async def poll_async(self):
+        # Publishers in other threads cannot wake the event loop: plain polling
+        events = self._poll_now()
+        if events is not None:
+            return events
+        await asyncio.sleep(POLL_SECONDS)
+        return self._read()
+
+    def close(self):
+        self._file.close()
+
+    async def aclose(self):
+        self._file.close()
+
+
+class _AsyncMongoTail:
+    """_MongoTail on the async client (asgi.py); opened by open()"""
+
+    def __init__(self, names: list, last_id: str = None):
+        self._pipeline = [{"$match": {"operationType": "insert", "fullDocument.dataset": {"$in": names}}}]
+        self._options = {"max_await_time_ms": int(min(HEARTBEAT_SECONDS, 5) * 1000)}
+        if last_id:
+            self._options["resume_after"] = {"_data": last_id}
+        self._stream = None
+
+    async def open(self):
+        feed = get_async_collection(POWERCASTING_DB, FEED_COLLECTION)
+        self._stream = await feed.watch(self._pipeline, **self._options)
+        return self
+
+    async def poll_async(self):
+        change = await self._stream.try_next()
+        if change is None:
+            return []
+        event = change["fullDocument"]
+        event.pop("_id", None)
+        event.pop("created_at", None)
+        return [(change["_id"]["_data"], event)]
+
+    async def aclose(self):
+        if self._stream is not None:
+            await self._stream.close()
+
+
+def _check_names(names: list):
+    unknown = [n for n in names if n not in DATASETS]
+    if not names or unknown:
+        raise ChangeFeedError(f"Unknown dataset(s) {', '.join(unknown)} (expected one of {', '.join(DATASETS)})")
+
+
+def open_tail(names: list, last_id: str = None):
+    _check_names(names)
+    if transport() == "mongo":
+        return _MongoTail(names, last_id)
+    return _FileTail(names, last_id)
+
+
+async def open_tail_async(names: list, last_id: str = None):
+    _check_names(names)
+    if await asyncio.to_thread(transport) == "mongo":
+        return await _AsyncMongoTail(names, last_id).open()
+    return _FileTail(names, last_id)
+
+
+def wsgi_can_stream(environ) -> bool:
+    """True when a long-lived response does not pin a whole WSGI worker (threads or greenlets)"""
+    if environ.get("wsgi.multithread"):
+        return True
+    for name, check in (("gevent.monkey", "is_module_patched"), ("eventlet.patcher", "is_monkey_patched")):
+        module = sys.modules.get(name)
+        if module is not None and getattr(module, check)("socket"):
+            return True
+    return False
+
+
+def _sse(event_id: str, event: dict) -> str:
+    return f"id: {event_id}\nevent: {event['op']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+def iter_sse(tail, max_seconds: float = STREAM_MAX_SECONDS):
+    """Server-Sent Events for `tail`, with heartbeats, ending after max_seconds"""
+    deadline = time.monotonic() + max_seconds
+    last_sent = time.monotonic()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while time.monotonic() < deadline:
+            events = tail.poll()
+            for event_id, event in events:
+                yield _sse(event_id, event)
+            now = time.monotonic()
+            if events:
+                last_sent = now
+            elif now - last_sent >= HEARTBEAT_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = now
+    finally:
+        tail.close()
+
+
+async def aiter_sse(tail, max_seconds: float = STREAM_MAX_SECONDS):
+    """iter_sse() for a tail from open_tail_async()"""
+    deadline = time.monotonic() + max_seconds
+    last_sent = time.monotonic()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while time.monotonic() < deadline:
+            events = await tail.poll_async()
+            for event_id, event in events:
+                yield _sse(event_id, event)
+            now = time.monotonic()
+            if events:
+                last_sent = now
+            elif now - last_sent >= HEARTBEAT_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = now
+    finally:
+        await tail.aclose()
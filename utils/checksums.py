@@ -0,0 +1,323 @@
+"""
+Per-day checksums of approved data, for reconciliation with source systems.
+
+For every dataset with value_fields, <final>_checksums holds one document
+per calendar day of the stored time field (and per series, for plant data):
+
+    {day, <series_field>, count, checksum, updated_at}
+
+checksum is the SHA-256 hex digest of the day's rows in time order, one
+line per row, each line ending in "\\n":
+
+    <time as YYYY-MM-DDTHH:MM:SS>|<value_field 1>|<value_field 2>…
+
+with numbers written as "%.6f" and missing / non-numeric values as an
+empty string. Value fields are taken in DATASETS order (demand:
+Demand(Actual)|Demand(Pred); iex_price: Actual|Pred; iex_quantity:
+Qty_Pred|Pred_Price; plant: Actual|Pred, per Plant_Name). A source system
+computes the same digests from its own rows, and reconcile() returns only
+the days whose digest or row count differ.
+
+Approvals replace rows, so the touched days are recomputed from the final
+collection (96 rows per series and day) rather than adjusted. Run
+rebuild() once after deploying, for backfills and after a refresh failed:
+
+    flask --app app rebuild-checksums [DATASET] [--start ISO] [--end ISO]
+    python -m utils.checksums [DATASET] [--start ISO] [--end ISO]
+"""
+from datetime import date, datetime, timedelta
+import hashlib
+import os
+
+from pymongo import ASCENDING, DeleteOne, ReplaceOne
+
+from utils.datasets import DATASETS
+from utils.mongo import collection
+
+# Past this many disjoint touched day runs, refresh() recomputes their overall span instead
+MAX_REFRESH_RUNS = int(os.getenv("CHECKSUM_MAX_REFRESH_RUNS", "200"))
+# Entries accepted by one reconcile request (a year of 96 plants ≈ 35k)
+MAX_RECONCILE_ITEMS = int(os.getenv("CHECKSUM_MAX_RECONCILE_ITEMS", "100000"))
+CURSOR_BATCH = 10000
+
+_DAY = timedelta(days=1)
+
+
+class ChecksumError(ValueError):
+    """Invalid checksum / reconcile request (→ 400)"""
+
+
+def checksum_datasets() -> list:
+    return [name for name, d in DATASETS.items() if d["value_fields"]]
+
+
+def checksum_collection(name: str):
+    dataset = DATASETS[name]
+    return collection(f"{dataset['final']}_checksums", dataset["db"])
+
+
+def ensure_checksum_indexes():
+    for name in checksum_datasets():
+        series_field = DATASETS[name]["series_field"]
+        keys = [("day", ASCENDING)] + ([(series_field, ASCENDING)] if series_field else [])
+        checksum_collection(name).create_index(keys, unique=True)
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _day_runs(days) -> list:
+    """Contiguous [start, end) day runs covering the given days"""
+    runs = []
+    for d in sorted(set(days)):
+        if runs and runs[-1][1] == d:
+            runs[-1][1] = d + _DAY
+        else:
+            runs.append([d, d + _DAY])
+    if len(runs) > MAX_REFRESH_RUNS:
+        runs = [[runs[0][0], runs[-1][1]]]
+    return runs
+
+
+def _range_match(field: str, runs: list) -> dict:
+    clauses = [{field: {"$gte": start, "$lt": end}} for start, end in runs]
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+# ── Digest ──────────────────────────────────────────────────────────
+def _value(v) -> str:
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return "%.6f" % v
+    return ""
+
+
+def row_line(ts: datetime, values) -> bytes:
+    return (f"{ts:%Y-%m-%dT%H:%M:%S}|" + "|".join(_value(v) for v in values) + "\n").encode("ascii")
+
+
+def _compute(name: str, match: dict, only: set = None) -> dict:
+    """{(day, series): (count, checksum)} over the final rows matching `match`"""
+    dataset = DATASETS[name]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    fields = dataset["value_fields"]
+    final = collection(dataset["final"], dataset["db"])
+    projection = {"_id": 0, time_field: 1, **{f: 1 for f in fields}}
+    if series_field:
+        projection[series_field] = 1
+
+    digests = {}
+    # Time order overall is time order within every (day, series)
+    for doc in final.find(match, projection).sort(time_field, ASCENDING).batch_size(CURSOR_BATCH):
+        ts = doc.get(time_field)
+        if not isinstance(ts, datetime):
+            continue
+        key = (_day(ts), doc.get(series_field) if series_field else None)
+        if only is not None and key not in only:
+            continue
+        entry = digests.get(key)
+        if entry is None:
+            entry = digests[key] = [0, hashlib.sha256()]
+        entry[0] += 1
+        entry[1].update(row_line(ts, (doc.get(f) for f in fields)))
+    return {key: (count, h.hexdigest()) for key, (count, h) in digests.items()}
+
+
+def _key_filter(series_field, day: datetime, series) -> dict:
+    flt = {"day": day}
+    if series_field:
+        flt[series_field] = series
+    return flt
+
+
+def _write(name: str, keys, digests: dict):
+    """Upsert the digests of `keys`; keys without rows lose their document"""
+    series_field = DATASETS[name]["series_field"]
+    now = datetime.utcnow()
+    ops = []
+    for key in keys:
+        flt = _key_filter(series_field, *key)
+        if key in digests:
+            count, checksum = digests[key]
+            ops.append(ReplaceOne(flt, {**flt, "count": count, "checksum": checksum, "updated_at": now},
+                                  upsert=True))
+        else:
+            ops.append(DeleteOne(flt))
+    if ops:
+        checksum_collection(name).bulk_write(ops, ordered=False)
+
+
+# ── Maintenance ─────────────────────────────────────────────────────
+def refresh(name: str, docs: list) -> int:
+    """Recompute the (day, series) checksums touched by approved `docs`; returns how many"""
+    if name not in checksum_datasets():
+        return 0
+    dataset = DATASETS[name]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    touched = {(_day(d[time_field]), d.get(series_field) if series_field else None)
+               for d in docs if isinstance(d.get(time_field), datetime)}
+    if not touched:
+        return 0
+    match = _range_match(time_field, _day_runs(day for day, _ in touched))
+    if series_field:
+        match = {"$and": [match, {series_field: {"$in": list({s for _, s in touched})}}]}
+    _write(name, touched, _compute(name, match, only=touched))
+    return len(touched)
+
+
+def _extent(name: str):
+    dataset = DATASETS[name]
+    final, time_field = collection(dataset["final"], dataset["db"]), dataset["time_field"]
+    first = final.find_one({}, {time_field: 1}, sort=[(time_field, ASCENDING)])
+    last = final.find_one({}, {time_field: 1}, sort=[(time_field, -1)])
+    if not first or not last:
+        return None, None
+    return first[time_field], last[time_field]
+
+
+def rebuild(name: str, start: datetime = None, end: datetime = None, log=print) -> int:
+    """
+    Drop and recompute the checksums of `name` in [start, end) (default: all
+    approved data), widened to whole days, 31 days per pass. Returns the days covered.
+    """
+    if name not in checksum_datasets():
+        raise ChecksumError(f"No checksums for '{name}' (expected one of {', '.join(checksum_datasets())})")
+    first, last = _extent(name)
+    start = _day(start or first) if (start or first) else None
+    end = _day(end + _DAY - timedelta(microseconds=1)) if end else (_day(last) + _DAY if last else None)
+    if start is None or end is None or start >= end:
+        return 0
+
+    time_field = DATASETS[name]["time_field"]
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + 31 * _DAY, end)
+        digests = _compute(name, {time_field: {"$gte": chunk_start, "$lt": chunk_end}})
+        checksum_collection(name).delete_many({"day": {"$gte": chunk_start, "$lt": chunk_end}})
+        _write(name, digests.keys(), digests)
+        log(f"[Checksums] {name} {chunk_start:%Y-%m-%d}..{chunk_end - _DAY:%Y-%m-%d} rebuilt")
+        chunk_start = chunk_end
+    return (end - start) // _DAY
+
+
+# ── Reads ───────────────────────────────────────────────────────────
+def _entry(series_field, doc: dict) -> dict:
+    out = {"day": f"{doc['day']:%Y-%m-%d}"}
+    if series_field:
+        out[series_field] = doc.get(series_field)
+    out["count"] = doc["count"]
+    out["checksum"] = doc["checksum"]
+    return out
+
+
+def list_checksums(name: str, start: date, end: date, series: str = None) -> list:
+    """Stored checksums for days in [start, end)"""
+    if name not in checksum_datasets():
+        raise ChecksumError(f"No checksums for '{name}' (expected one of {', '.join(checksum_datasets())})")
+    series_field = DATASETS[name]["series_field"]
+    if series and not series_field:
+        raise ChecksumError(f"{name} has a single series")
+    if not start or not end or start >= end:
+        raise ChecksumError("start and end are required, with start before end")
+    flt = {"day": {"$gte": datetime.combine(start, datetime.min.time()),
+                   "$lt": datetime.combine(end, datetime.min.time())}}
+    if series:
+        flt[series_field] = series
+    sort = [("day", ASCENDING)] + ([(series_field, ASCENDING)] if series_field else [])
+    return [_entry(series_field, doc) for doc in checksum_collection(name).find(flt, {"_id": 0}).sort(sort)]
+
+
+def _parse_item(series_field, item) -> tuple:
+    if not isinstance(item, dict):
+        raise ChecksumError("each entry must be an object with day and checksum")
+    try:
+        day = datetime.combine(date.fromisoformat(str(item.get("day"))), datetime.min.time())
+    except ValueError:
+        raise ChecksumError(f"invalid day {item.get('day')!r} (expected YYYY-MM-DD)") from None
+    checksum = item.get("checksum")
+    if not isinstance(checksum, str) or not checksum:
+        raise ChecksumError(f"missing checksum for {item.get('day')}")
+    series = None
+    if series_field:
+        series = item.get(series_field) or item.get("plant")
+        if not series:
+            raise ChecksumError(f"{series_field} is required on every entry")
+    count = item.get("count")
+    if count is not None and not isinstance(count, int):
+        raise ChecksumError(f"count must be an integer ({item.get('day')})")
+    return (day, series), checksum.lower(), count
+
+
+def reconcile(name: str, items: list) -> dict:
+    """
+    Compare a client's per-day checksums with ours.
+
+    items: [{"day": "YYYY-MM-DD", "checksum": hex, "count": n (optional),
+             "Plant_Name" / "plant": series (plant data)}]
+    Days we hold in the span of the client's days (and series) but the
+    client did not send come back under missing_client.
+    """
+    if name not in checksum_datasets():
+        raise ChecksumError(f"No checksums for '{name}' (expected one of {', '.join(checksum_datasets())})")
+    if not isinstance(items, list) or not items:
+        raise ChecksumError("days must be a non-empty list")
+    if len(items) > MAX_RECONCILE_ITEMS:
+        raise ChecksumError(f"at most {MAX_RECONCILE_ITEMS} entries per request")
+    series_field = DATASETS[name]["series_field"]
+
+    theirs = {}
+    for item in items:
+        key, checksum, count = _parse_item(series_field, item)
+        theirs[key] = (checksum, count)
+
+    days = [day for day, _ in theirs]
+    flt = {"day": {"$gte": min(days), "$lte": max(days)}}
+    if series_field:
+        flt[series_field] = {"$in": list({s for _, s in theirs})}
+    ours = {}
+    for doc in checksum_collection(name).find(flt, {"_id": 0}):
+        ours[(doc["day"], doc.get(series_field) if series_field else None)] = doc
+
+    def describe(key, doc=None, client=None):
+        out = {"day": f"{key[0]:%Y-%m-%d}"}
+        if series_field:
+            out[series_field] = key[1]
+        if doc is not None:
+            out["count"], out["checksum"] = doc["count"], doc["checksum"]
+        if client is not None:
+            out["client_checksum"] = client[0]
+            if client[1] is not None:
+                out["client_count"] = client[1]
+        return out
+
+    mismatched, missing_here = [], []
+    for key in sorted(theirs, key=lambda k: (k[0], str(k[1]))):
+        doc = ours.get(key)
+        checksum, count = theirs[key]
+        if doc is None:
+            missing_here.append(describe(key, client=theirs[key]))
+        elif doc["checksum"] != checksum or (count is not None and doc["count"] != count):
+            mismatched.append(describe(key, doc, theirs[key]))
+    missing_client = [describe(key, ours[key]) for key in sorted(ours, key=lambda k: (k[0], str(k[1])))
+                      if key not in theirs]
+
+    return {
+        "dataset": name,
+        "compared": len(theirs),
+        "matching": len(theirs) - len(mismatched) - len(missing_here),
+        "mismatched": mismatched,
+        "missing_here": missing_here,
+        "missing_client": missing_client,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild per-day checksums")
+    parser.add_argument("dataset", nargs="?", help="one of the checksum datasets (default: all)")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    args = parser.parse_args()
+    for dataset_name in [args.dataset] if args.dataset else checksum_datasets():
+        print(f"[Checksums] {dataset_name}: {rebuild(dataset_name, args.start, args.end)} day(s) rebuilt")
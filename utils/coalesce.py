@@ -0,0 +1,183 @@
+"""
+Single-flight coalescing for read-only listing routes.
+
+Identical GETs (same path and query string) that arrive while one is
+already running in this worker wait for it and get a copy of its
+serialized response instead of running their own Mongo query. With
+COALESCE_CACHE_MS > 0 a finished response is also served for that many
+milliseconds afterwards.
+
+Any non-GET request drops the cached responses of its dataset (URL prefix)
+in this worker (app.py / asgi.py call invalidate()); other workers keep
+theirs until the window expires, so keep the window short.
+
+Waiters only exist when a worker serves requests concurrently (gunicorn
+--threads, or the ASGI app); with plain sync workers only the micro-cache
+removes duplicate queries.
+"""
+from functools import wraps
+import asyncio
+import os
+import threading
+import time
+
+from flask import Response, make_response, request
+
+from utils.datasets import DATASETS
+from utils.metrics import record_coalesce
+
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") not in ("0", "false", "False")
+CACHE_SECONDS = float(os.getenv("COALESCE_CACHE_MS", "0")) / 1000
+CACHE_MAX_ENTRIES = int(os.getenv("COALESCE_CACHE_MAX_ENTRIES", "256"))
+
+_lock = threading.Lock()
+_inflight = {}        # key → _Flight (threads)
+_inflight_async = {}  # (loop id, key) → asyncio.Future
+_cache = {}           # key → (expires_at, result)
+_generation = {}      # scope → bumped by invalidate()
+
+# Longest prefix first so /iex/price and /iex/quantity stay separate
+_SCOPES = sorted([d["url_prefix"] for d in DATASETS.values()] + ["/transaction"], key=len, reverse=True)
+
+
+def _scope(path: str) -> str:
+    for prefix in _SCOPES:
+        if path == prefix or path.startswith(prefix + "/"):
+            return prefix
+    return "/" + path.strip("/").split("/", 1)[0]
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _cached(key):
+    entry = _cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _store(key, generation, result):
+    """Cache a finished result unless a write invalidated its scope meanwhile"""
+    if CACHE_SECONDS <= 0 or result[1] >= 500 or _generation.get(key[0], 0) != generation:
+        return
+    if len(_cache) >= CACHE_MAX_ENTRIES:
+        now = time.monotonic()
+        for k in [k for k, (expires, _) in _cache.items() if expires <= now]:
+            del _cache[k]
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            del _cache[min(_cache, key=lambda k: _cache[k][0])]
+    _cache[key] = (time.monotonic() + CACHE_SECONDS, result)
+
+
+def invalidate(path: str):
+    """Forget cached responses of the dataset `path` writes to"""
+    scope = _scope(path)
+    with _lock:
+        _generation[scope] = _generation.get(scope, 0) + 1
+        for key in [k for k in _cache if k[0] == scope]:
+            del _cache[key]
+
+
+def _to_response(result) -> Response:
+    body, status, headers = result
+    return Response(body, status=status, headers=headers)
+
+
+def coalesced(view):
+    """Decorator for Flask GET views whose output depends only on path + query string"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not COALESCE_ENABLED:
+            return view(*args, **kwargs)
+        key = (_scope(request.path), request.path, request.query_string)
+        with _lock:
+            result = _cached(key)
+            if result is not None:
+                record_coalesce(key[0], "cached")
+                return _to_response(result)
+            flight = _inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _inflight[key] = _Flight()
+                generation = _generation.get(key[0], 0)
+
+        if not leader:
+            flight.event.wait()
+            record_coalesce(key[0], "shared")
+            if flight.error is not None:
+                raise flight.error
+            return _to_response(flight.result)
+
+        record_coalesce(key[0], "leader")
+        try:
+            response = make_response(view(*args, **kwargs))
+            flight.result = (response.get_data(), response.status_code, list(response.headers.items()))
+            return _to_response(flight.result)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with _lock:
+                del _inflight[key]
+                if flight.error is None:
+                    _store(key, generation, flight.result)
+            flight.event.set()
+
+    return wrapper
+
+
+def coalesced_async(view):
+    """coalesced() for Quart views; waiters share an asyncio.Future"""
+    from quart import request as async_request, make_response as make_async_response, Response as AsyncResponse
+
+    def to_async_response(result):
+        body, status, headers = result
+        return AsyncResponse(body, status=status, headers=headers)
+
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        if not COALESCE_ENABLED:
+            return await view(*args, **kwargs)
+        key = (_scope(async_request.path), async_request.path, async_request.query_string)
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with _lock:
+            result = _cached(key)
+            generation = _generation.get(key[0], 0)
+        if result is not None:
+            record_coalesce(key[0], "cached")
+            return to_async_response(result)
+
+        future = _inflight_async.get(loop_key)
+        if future is not None:
+            record_coalesce(key[0], "shared")
+            return to_async_response(await asyncio.shield(future))
+
+        future = _inflight_async[loop_key] = asyncio.get_running_loop().create_future()
+        record_coalesce(key[0], "leader")
+        try:
+            response = await make_async_response(await view(*args, **kwargs))
+            result = (await response.get_data(), response.status_code, list(response.headers.items()))
+            future.set_result(result)
+            with _lock:
+                _store(key, generation, result)
+            return to_async_response(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception with no waiters is not reported as unhandled
+            future.exception()
+            raise
+        finally:
+            del _inflight_async[loop_key]
+
+    return wrapper
@@ -0,0 +1,200 @@
+"""
+Negotiated response compression (zstd, brotli, gzip).
+
+The encoding is picked from Accept-Encoding by q-value, ties going to
+COMPRESSION_PREFERENCE. Buffered responses smaller than
+COMPRESSION_MIN_BYTES are sent as-is. Streamed responses are compressed
+chunk by chunk with a flush after each chunk, so consumers still see every
+chunk as soon as it is produced.
+
+brotli and zstandard are optional: without them only gzip is offered.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional
+    zstandard = None
+
+from utils.metrics import record_compression
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") not in ("0", "false", "False")
+MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+PREFERENCE = [e.strip() for e in os.getenv("COMPRESSION_PREFERENCE", "zstd,br,gzip").split(",") if e.strip()]
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+
+class _GzipStream:
+    def __init__(self):
+        self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._obj.compress(chunk) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._obj.process(chunk) + self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class _ZstdStream:
+    def __init__(self):
+        self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._obj.compress(chunk) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+def _compress_gzip(data: bytes) -> bytes:
+    obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return obj.compress(data) + obj.flush()
+
+
+_STREAMS = {"gzip": _GzipStream}
+_ONE_SHOT = {"gzip": _compress_gzip}
+if brotli is not None:
+    _STREAMS["br"] = _BrotliStream
+    _ONE_SHOT["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+if zstandard is not None:
+    _STREAMS["zstd"] = _ZstdStream
+    _ONE_SHOT["zstd"] = lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+AVAILABLE = [e for e in PREFERENCE if e in _ONE_SHOT]
+
+
+def choose_encoding(accept_encoding: str):
+    """Best available encoding the client accepts, or None for identity"""
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            weights[token] = q
+    best, best_q = None, 0.0
+    for encoding in AVAILABLE:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressible(mimetype) -> bool:
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    out = _ONE_SHOT[encoding](data)
+    record_compression(encoding, len(data), len(out))
+    return out
+
+
+def compress_stream(chunks, encoding: str):
+    """Compress an iterable of str/bytes chunks, flushing after each one"""
+    stream = _STREAMS[encoding]()
+    size_in = size_out = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if not chunk:
+                continue
+            out = stream.compress(chunk)
+            size_in += len(chunk)
+            size_out += len(out)
+            yield out
+        tail = stream.finish()
+        size_out += len(tail)
+        yield tail
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        record_compression(encoding, size_in, size_out)
+
+
+def _skip(status: int, headers) -> bool:
+    return status < 200 or status in (204, 206, 304) or "Content-Encoding" in headers
+
+
+def _add_vary(headers):
+    vary = headers.get("Vary", "")
+    if "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+
+
+def compress_flask_response(response, accept_encoding: str, method: str = "GET"):
+    """Compress a Flask response in place (buffered or streamed)"""
+    if _skip(response.status_code, response.headers) or not compressible(response.mimetype):
+        return response
+    _add_vary(response.headers)
+    encoding = choose_encoding(accept_encoding)
+    # send_file responses (profiles, exports of binary formats) pass through untouched
+    if encoding is None or method == "HEAD" or response.direct_passthrough:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_BYTES:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+async def compress_quart_response(response, accept_encoding: str, method: str = "GET"):
+    """compress_flask_response() for the ASGI app's buffered responses"""
+    if _skip(response.status_code, response.headers) or not compressible(response.mimetype):
+        return response
+    if not hasattr(response.response, "data"):
+        # Streamed body (the change feed): reading it here would drain the stream
+        return response
+    _add_vary(response.headers)
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None or method == "HEAD":
+        return response
+    data = await response.get_data()
+    if len(data) < MIN_BYTES:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
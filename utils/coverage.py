@@ -0,0 +1,157 @@
+"""
+Slot coverage (gaps and duplicates) of a dataset's time series.
+
+One aggregation walks the indexed time range and returns, per series
+(Plant_Name for plant data) and per ~month bucket, the slot number of each
+point: (TimeStamp − start) // slot. Only those integers cross the wire.
+Each series gets a bytearray with one counter per expected slot:
+  0     missing slot
+  1     present
+  2+    duplicate slot (capped at 255)
+Runs of equal state are then returned as [start, end) ranges. Points that do
+not sit exactly on a slot boundary are counted in `off_grid`, under the
+slot they fall in.
+
+Series with no point at all in the range are not listed, unless asked for
+with `series=`.
+"""
+from datetime import datetime, timedelta
+import os
+import re
+
+from utils.datasets import DATASETS
+from utils.dates import naive_utc
+from utils.mongo import collection
+
+SLOT_MINUTES = int(os.getenv("COVERAGE_SLOT_MINUTES", "15"))
+# Per-series bitmap size cap (≈ 11 years of 15-minute slots)
+MAX_SLOTS = int(os.getenv("COVERAGE_MAX_SLOTS", "400000"))
+# Gap / duplicate ranges returned per series before truncating
+MAX_RANGES = int(os.getenv("COVERAGE_MAX_RANGES", "1000"))
+# Slots per aggregation output document (keeps each one far below 16 MB)
+BUCKET_SLOTS = 2976
+
+
+class CoverageError(ValueError):
+    """Invalid coverage request (→ 400)"""
+
+
+_MISSING_RUNS = re.compile(b"\x00+")
+_DUPLICATE_RUNS = re.compile(b"[\x02-\xff]+")
+
+
+def _stage_collection(name: str, stage: str):
+    dataset = DATASETS[name]
+    if stage not in ("staging", "final"):
+        raise CoverageError("stage must be 'staging' or 'final'")
+    return collection(dataset[stage], dataset["db"])
+
+
+def _bounds(coll, time_field: str, flt: dict, slot: timedelta):
+    """Oldest point and one slot past the newest one, read off the index"""
+    first = coll.find_one(flt, {time_field: 1}, sort=[(time_field, 1)])
+    last = coll.find_one(flt, {time_field: 1}, sort=[(time_field, -1)])
+    if not first or not last:
+        return None, None
+    return first[time_field], last[time_field] + slot
+
+
+def _pipeline(time_field: str, series_field, flt: dict, start: datetime, slot_ms: int) -> list:
+    offset = {"$subtract": [f"${time_field}", start]}
+    return [
+        {"$match": flt},
+        {"$project": {
+            "_id": 0,
+            "s": f"${series_field}" if series_field else {"$literal": None},
+            "d": offset,
+        }},
+        {"$group": {
+            "_id": {"s": "$s", "b": {"$floor": {"$divide": ["$d", slot_ms * BUCKET_SLOTS]}}},
+            "slots": {"$push": {"$toLong": {"$floor": {"$divide": ["$d", slot_ms]}}}},
+            "off_grid": {"$sum": {"$cond": [{"$ne": [{"$mod": ["$d", slot_ms]}, 0]}, 1, 0]}},
+        }},
+    ]
+
+
+def _ranges(pattern, bitmap: bytearray, start: datetime, slot: timedelta):
+    out = []
+    for m in pattern.finditer(bitmap):
+        if len(out) == MAX_RANGES:
+            return out, True
+        out.append({"start": start + m.start() * slot, "end": start + m.end() * slot,
+                    "slots": m.end() - m.start()})
+    return out, False
+
+
+def coverage(name: str, stage: str = "final", start: datetime = None, end: datetime = None,
+             slot_minutes: int = SLOT_MINUTES, series: str = None) -> dict:
+    """Missing / duplicate slots of `name`'s staging or final collection in [start, end)"""
+    dataset = DATASETS[name]
+    coll = _stage_collection(name, stage)
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    if slot_minutes <= 0:
+        raise CoverageError("slot_minutes must be positive")
+    if series and not series_field:
+        raise CoverageError(f"{name} has a single series")
+    slot = timedelta(minutes=slot_minutes)
+    # _bounds() and the bitmap offsets work on stored (naive) timestamps
+    start, end = naive_utc(start), naive_utc(end)
+
+    base = {series_field: series} if series else {}
+    if start is None or end is None:
+        first, past_last = _bounds(coll, time_field, base, slot)
+        start = start or first
+        end = end or past_last
+    report = {
+        "dataset": name,
+        "stage": stage,
+        "collection": coll.name,
+        "slot_minutes": slot_minutes,
+        "start": start,
+        "end": end,
+        "expected_slots": 0,
+        "series": [],
+    }
+    if start is None or end is None or start >= end:
+        return report
+
+    expected = -(-(end - start) // slot)
+    if expected > MAX_SLOTS:
+        raise CoverageError(f"Range spans {expected} slots; the limit is {MAX_SLOTS} (narrow start/end)")
+    report["expected_slots"] = expected
+
+    flt = {**base, time_field: {"$gte": start, "$lt": end}}
+    slot_ms = slot // timedelta(milliseconds=1)
+    bitmaps, off_grid = {}, {}
+    if series:
+        bitmaps[series], off_grid[series] = bytearray(expected), 0
+
+    for group in coll.aggregate(_pipeline(time_field, series_field, flt, start, slot_ms), allowDiskUse=True):
+        key = group["_id"]["s"]
+        bitmap = bitmaps.get(key)
+        if bitmap is None:
+            bitmap = bitmaps[key] = bytearray(expected)
+            off_grid[key] = 0
+        off_grid[key] += group["off_grid"]
+        for i in group["slots"]:
+            if bitmap[i] < 255:
+                bitmap[i] += 1
+
+    for key in sorted(bitmaps, key=lambda k: (k is None, k)):
+        bitmap = bitmaps[key]
+        gaps, gaps_truncated = _ranges(_MISSING_RUNS, bitmap, start, slot)
+        duplicates, dup_truncated = _ranges(_DUPLICATE_RUNS, bitmap, start, slot)
+        missing = bitmap.count(0)
+        entry = {
+            "present": expected - missing,
+            "missing": missing,
+            "duplicate_slots": expected - missing - bitmap.count(1),
+            "off_grid": off_grid[key],
+            "gaps": gaps,
+            "duplicates": duplicates,
+            "truncated": gaps_truncated or dup_truncated,
+        }
+        if series_field:
+            entry = {series_field: key, **entry}
+        report["series"].append(entry)
+    return report
@@ -0,0 +1,96 @@
+from utils.mongo import POWERCASTING_DB, POWERCASTING_NEW_DB
+
+# Staging → final collection pairs served by the approval routes.
+#   key_fields     fields that identify a slot (the ReplaceOne filter)
+#   time_field     the indexed timestamp field
+#   series_field   extra key for multi-series data (one series per plant)
+#   url_prefix     where the blueprint is mounted in app.py
+#   approve_message  summary message returned by /approvals/approve
+#   accuracy_fields  (actual, predicted) pair scored by /accuracy, or None
+DATASETS = {
+    "demand": {
+        "db": POWERCASTING_DB,
+        "staging": "Demand_approval",
+        "final": "Demand",
+        "time_field": "TimeStamp",
+        "key_fields": ("TimeStamp",),
+        "series_field": None,
+        "value_fields": ("Demand(Actual)", "Demand(Pred)"),
+        "url_prefix": "/demand",
+        "approve_message": "Approval migration completed",
+        "accuracy_fields": ("Demand(Actual)", "Demand(Pred)"),
+    },
+    "iex_price": {
+        "db": POWERCASTING_DB,
+        "staging": "IEX_Price_approval",
+        "final": "IEX_Price",
+        "time_field": "TimeStamp",
+        "key_fields": ("TimeStamp",),
+        "series_field": None,
+        "value_fields": ("Actual", "Pred"),
+        "url_prefix": "/iex/price",
+        "approve_message": "Price approval migration completed",
+        "accuracy_fields": ("Actual", "Pred"),
+    },
+    "iex_quantity": {
+        "db": POWERCASTING_DB,
+        "staging": "IEX_Generation_approval",
+        "final": "IEX_Generation",
+        "time_field": "TimeStamp",
+        "key_fields": ("TimeStamp",),
+        "series_field": None,
+        "value_fields": ("Qty_Pred", "Pred_Price"),
+        "url_prefix": "/iex/quantity",
+        "approve_message": "Generation approval migration completed",
+        "accuracy_fields": None,
+    },
+    "plant": {
+        "db": POWERCASTING_DB,
+        "staging": "mustrunplantconsumption_approval",
+        "final": "mustrunplantconsumption",
+        "time_field": "TimeStamp",
+        "key_fields": ("TimeStamp", "Plant_Name"),
+        "series_field": "Plant_Name",
+        "value_fields": ("Actual", "Pred"),
+        "url_prefix": "/plant-consumption",
+        "approve_message": "Plant approval migration completed",
+        "accuracy_fields": ("Actual", "Pred"),
+    },
+    "demand_output": {
+        "db": POWERCASTING_DB,
+        "staging": "Demand_Output_Approval",
+        "final": "Demand_Output",
+        "time_field": "TimeStamp",
+        "key_fields": ("TimeStamp",),
+        "series_field": None,
+        "value_fields": (),
+        "url_prefix": "/procurement-output",
+        "approve_message": "Demand Output approval migration completed",
+        "accuracy_fields": None,
+    },
+    "banking": {
+        "db": POWERCASTING_NEW_DB,
+        "staging": "Banking_Adjust_Consolidated_approval",
+        "final": "Banking_Adjust_Consolidated",
+        "time_field": "Timestamp",
+        "key_fields": ("Timestamp",),
+        "series_field": None,
+        "value_fields": (),
+        "url_prefix": "/baking-charges",
+        "approve_message": "Banking approval migration completed",
+        "accuracy_fields": None,
+    },
+}
+
+
+# Bulk-add URL → dataset, for the routes that ingest uploads
+BULK_ADD_PATHS = {
+    f"{DATASETS[name]['url_prefix']}/bulk-add": name
+    for name in ("demand", "iex_price", "iex_quantity", "plant")
+}
+
+
+def get_dataset(name: str) -> dict:
+    if name not in DATASETS:
+        raise KeyError(f"Unknown dataset '{name}' (expected one of {', '.join(DATASETS)})")
+    return DATASETS[name]
@@ -0,0 +1,25 @@
+"""
+Date helpers shared by the query routes and the utils they call.
+
+Stored timestamps are naive (BSON dates come back without tzinfo), while
+query parameters may carry an offset or a trailing Z. Anything compared
+or subtracted in Python against stored values goes through naive_utc().
+"""
+from datetime import datetime, timezone
+
+
+def parse_date(val):
+    """ISO date/datetime query parameter (a trailing Z is accepted), or None when empty"""
+    if not val:
+        return None
+    s = str(val).strip()
+    if s.endswith("Z"):
+        s = s.replace("Z", "+00:00")
+    return datetime.fromisoformat(s)
+
+
+def naive_utc(ts: datetime) -> datetime:
+    """Aware datetimes as naive UTC, the way stored timestamps come back; naive ones unchanged"""
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
@@ -0,0 +1,160 @@
+"""
+Staging vs final diff: what approving a range would change.
+
+One aggregation over the staging collection:
+  - staged rows in [start, end) in key order
+  - $lookup of the final row with the same key: localField/foreignField on
+    the time field (index-backed), plus the series field for plant data
+  - per row the value_fields whose staged and final values differ
+  - status  new        no final row yet
+            changed    at least one value field differs
+            identical  approving would rewrite the same values
+  - $facet: status counts over the whole range + one page of the rows
+    whose status was asked for (identical ones are not sent by default)
+
+Rows carry only the key, the staging _id and the value fields of both
+sides, never the rest of either document.
+
+Concise $lookup (localField + pipeline) and $getField need MongoDB 5.0+.
+"""
+from datetime import datetime
+import os
+
+from utils.datasets import DATASETS
+from utils.dates import naive_utc
+from utils.mongo import collection
+
+STATUSES = ("new", "changed", "identical")
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = int(os.getenv("DIFF_MAX_PAGE_SIZE", "5000"))
+
+
+class DiffError(ValueError):
+    """Invalid diff request (→ 400)"""
+
+
+def diff_datasets() -> list:
+    return [name for name, d in DATASETS.items() if d["value_fields"]]
+
+
+def final_value(field: str) -> dict:
+    # $getField: value field names like "Demand(Actual)" are not safe in a path under $_final
+    return {"$getField": {"field": field, "input": "$_final"}}
+
+
+def final_lookup(name: str) -> list:
+    """Stages setting _final to the value fields of the final row with the same key (missing if none)"""
+    dataset = DATASETS[name]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    lookup = {
+        "from": dataset["final"],
+        "localField": time_field,
+        "foreignField": time_field,
+        "pipeline": [{"$project": {"_id": 0, **{f: 1 for f in dataset["value_fields"]}}}],
+        "as": "_final",
+    }
+    if series_field:
+        lookup["let"] = {"series": f"${series_field}"}
+        lookup["pipeline"].insert(0, {"$match": {"$expr": {"$eq": [f"${series_field}", "$$series"]}}})
+    return [{"$lookup": lookup}, {"$set": {"_final": {"$first": "$_final"}}}]
+
+
+def build_pipeline(name: str, start: datetime = None, end: datetime = None, series: str = None,
+                   statuses: tuple = ("new", "changed"), skip: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> list:
+    dataset = DATASETS[name]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    fields = dataset["value_fields"]
+
+    flt = {}
+    if start or end:
+        flt[time_field] = {}
+        if start:
+            flt[time_field]["$gte"] = start
+        if end:
+            flt[time_field]["$lt"] = end
+    if series:
+        flt[series_field] = series
+
+    sort = {time_field: 1}
+    if series_field:
+        sort[series_field] = 1
+
+    is_new = {"$eq": ["$_status", "new"]}
+    row = {
+        "_id": {"$toString": "$_id"},
+        time_field: 1,
+        "status": "$_status",
+        "staged": {f: f"${f}" for f in fields},
+        "final": {"$cond": [is_new, "$$REMOVE", {f: final_value(f) for f in fields}]},
+        "changed_fields": {"$cond": [is_new, "$$REMOVE", "$_changed"]},
+    }
+    if series_field:
+        row[series_field] = 1
+
+    return [
+        {"$match": flt},
+        {"$sort": sort},
+        *final_lookup(name),
+        {"$set": {"_changed": {"$map": {
+            "input": {"$filter": {
+                "input": [{"field": f, "staged": f"${f}", "final": final_value(f)} for f in fields],
+                "cond": {"$ne": ["$$this.staged", "$$this.final"]},
+            }},
+            "in": "$$this.field",
+        }}}},
+        {"$set": {"_status": {"$switch": {
+            "branches": [
+                {"case": {"$eq": [{"$type": "$_final"}, "missing"]}, "then": "new"},
+                {"case": {"$gt": [{"$size": "$_changed"}, 0]}, "then": "changed"},
+            ],
+            "default": "identical",
+        }}}},
+        {"$facet": {
+            "summary": [{"$group": {"_id": "$_status", "n": {"$sum": 1}}}],
+            "rows": [
+                {"$match": {"_status": {"$in": list(statuses)}}},
+                {"$skip": skip},
+                {"$limit": limit},
+                {"$project": row},
+            ],
+        }},
+    ]
+
+
+def diff(name: str, start: datetime = None, end: datetime = None, series: str = None,
+         statuses: tuple = ("new", "changed"), page: int = 1, page_size: int = DEFAULT_PAGE_SIZE) -> dict:
+    """Summary + one page of staged rows of `name` compared to the final collection"""
+    if name not in DATASETS:
+        raise DiffError(f"Unknown dataset (expected one of {', '.join(diff_datasets())})")
+    dataset = DATASETS[name]
+    if not dataset["value_fields"]:
+        raise DiffError(f"{name} has no declared value fields to compare "
+                        f"(expected one of {', '.join(diff_datasets())})")
+    if series and not dataset["series_field"]:
+        raise DiffError(f"{name} has a single series")
+    unknown = [s for s in statuses if s not in STATUSES]
+    if not statuses or unknown:
+        raise DiffError(f"status must be a comma-separated subset of {', '.join(STATUSES)}")
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise DiffError(f"page must be ≥ 1 and page_size between 1 and {MAX_PAGE_SIZE}")
+    start, end = naive_utc(start), naive_utc(end)
+    if start and end and start >= end:
+        raise DiffError("start must be before end")
+
+    staging = collection(dataset["staging"], dataset["db"])
+    pipeline = build_pipeline(name, start, end, series, statuses, (page - 1) * page_size, page_size)
+    result = next(staging.aggregate(pipeline, allowDiskUse=True), {"summary": [], "rows": []})
+
+    summary = {status: 0 for status in STATUSES}
+    summary.update({g["_id"]: g["n"] for g in result["summary"]})
+    summary["total"] = sum(summary[s] for s in STATUSES)
+    matching = sum(summary[s] for s in statuses)
+    return {
+        "dataset": name,
+        "summary": summary,
+        "status": list(statuses),
+        "page": page,
+        "page_size": page_size,
+        "pages": -(-matching // page_size),
+        "rows": result["rows"],
+    }
@@ -0,0 +1,234 @@
+"""
+Streamed columnar export of a final collection (Parquet, Arrow IPC, CSV).
+
+The range is read in time order in EXPORT_BATCH_ROWS batches. Each batch
+becomes one typed record batch (a Parquet row group / IPC message / CSV
+block) and is written out before the next one is read, so memory stays at
+one batch whatever the export size.
+
+The schema is fixed from the first batch: time field → timestamp[ms],
+series field → string, value_fields → float64, other fields by their first non-null value
+(numbers float64, datetimes timestamp[ms], bools, everything else string).
+Values that do not fit their column become null; fields that first appear
+after the first batch are not exported. `_id` is never exported.
+
+Parquet and Arrow need pyarrow; CSV does not.
+"""
+from datetime import datetime
+import csv
+import io
+import os
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional
+    pyarrow = None
+
+from utils.datasets import DATASETS
+from utils.dates import naive_utc
+from utils.mongo import collection
+
+BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "65536"))
+PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+class ExportError(ValueError):
+    """Invalid export request (→ 400)"""
+
+
+class _Sink:
+    """Write-only file object pyarrow writes into; drained after every batch"""
+
+    closed = False
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+# ── Schema / conversion ─────────────────────────────────────────────
+def _kind(value) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "float"
+    if isinstance(value, datetime):
+        return "time"
+    return "string"
+
+
+def infer_columns(dataset: dict, docs: list) -> list:
+    """[(field, kind)]: the dataset's key and value fields first, then others in first-seen order"""
+    kinds = {dataset["time_field"]: "time"}
+    if dataset["series_field"]:
+        kinds[dataset["series_field"]] = "string"
+    kinds.update((f, "float") for f in dataset["value_fields"])
+    forced = set(kinds)
+    for doc in docs:
+        for field, value in doc.items():
+            if field == "_id" or field in forced:
+                continue
+            if kinds.get(field) is None:
+                kinds[field] = None if value is None else _kind(value)
+    return [(field, kind or "string") for field, kind in kinds.items()]
+
+
+def _clean(value, kind):
+    if value is None:
+        return None
+    if kind == "float":
+        return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+    if kind == "time":
+        return naive_utc(value) if isinstance(value, datetime) else None
+    if kind == "bool":
+        return value if isinstance(value, bool) else None
+    return value if isinstance(value, str) else str(value)
+
+
+_ARROW_TYPES = {}
+
+
+def _arrow_type(kind):
+    if not _ARROW_TYPES:
+        _ARROW_TYPES.update(float=pyarrow.float64(), time=pyarrow.timestamp("ms"),
+                            bool=pyarrow.bool_(), string=pyarrow.string())
+    return _ARROW_TYPES[kind]
+
+
+def arrow_schema(columns: list):
+    return pyarrow.schema([(field, _arrow_type(kind)) for field, kind in columns])
+
+
+def record_batch(columns: list, schema, docs: list):
+    arrays = []
+    for field, kind in columns:
+        values = [doc.get(field) for doc in docs]
+        try:
+            arrays.append(pyarrow.array(values, type=_arrow_type(kind)))
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            arrays.append(pyarrow.array([_clean(v, kind) for v in values], type=_arrow_type(kind)))
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# ── Export ──────────────────────────────────────────────────────────
+class Export:
+    def __init__(self, name: str, start: datetime = None, end: datetime = None, fmt: str = "parquet",
+                 series: str = None):
+        if name not in DATASETS:
+            raise ExportError(f"Unknown dataset (expected one of {', '.join(DATASETS)})")
+        if fmt not in FORMATS:
+            raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+        if fmt != "csv" and pyarrow is None:
+            raise ExportError(f"{fmt} export needs pyarrow installed on the server")
+        start, end = naive_utc(start), naive_utc(end)
+        if start and end and start >= end:
+            raise ExportError("start must be before end")
+        self.dataset = DATASETS[name]
+        if series and not self.dataset["series_field"]:
+            raise ExportError(f"{name} has a single series")
+
+        time_field = self.dataset["time_field"]
+        flt = {}
+        if start or end:
+            flt[time_field] = {}
+            if start:
+                flt[time_field]["$gte"] = start
+            if end:
+                flt[time_field]["$lt"] = end
+        if series:
+            flt[self.dataset["series_field"]] = series
+
+        self.name, self.fmt, self.start, self.end = name, fmt, start, end
+        self.mimetype, extension = FORMATS[fmt]
+        span = "_".join(f"{ts:%Y%m%d%H%M}" for ts in (start, end) if ts) or "all"
+        self.filename = f"{self.dataset['final']}_{span}.{extension}"
+
+        final = collection(self.dataset["final"], self.dataset["db"])
+        self._cursor = final.find(flt).sort(time_field, 1).batch_size(BATCH_ROWS)
+        # First batch read up front: errors surface before the response starts
+        self._first = self._next_batch()
+        self.columns = infer_columns(self.dataset, self._first)
+
+    def _next_batch(self) -> list:
+        batch = []
+        for doc in self._cursor:
+            batch.append(doc)
+            if len(batch) == BATCH_ROWS:
+                break
+        return batch
+
+    def _batches(self):
+        batch = self._first
+        self._first = None
+        try:
+            while batch:
+                yield batch
+                batch = self._next_batch()
+        finally:
+            self._cursor.close()
+
+    def __iter__(self):
+        if self.fmt == "csv":
+            return self._iter_csv()
+        return self._iter_arrow()
+
+    def _iter_arrow(self):
+        schema = arrow_schema(self.columns)
+        sink = _Sink()
+        if self.fmt == "parquet":
+            writer = pyarrow.parquet.ParquetWriter(sink, schema, compression=PARQUET_COMPRESSION)
+            write = writer.write_batch
+        else:
+            writer = pyarrow.ipc.new_stream(sink, schema)
+            write = writer.write_batch
+        try:
+            for docs in self._batches():
+                write(record_batch(self.columns, schema, docs))
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def _iter_csv(self):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow([field for field, _ in self.columns])
+        for docs in self._batches():
+            for doc in docs:
+                row = []
+                for field, kind in self.columns:
+                    value = _clean(doc.get(field), kind)
+                    row.append("" if value is None else value.isoformat() if kind == "time" else value)
+                writer.writerow(row)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue()
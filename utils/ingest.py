@@ -0,0 +1,338 @@
+"""
+Low-memory bulk-add path shared by the ingestion routes.
+
+The old loop held the parsed JSON list (one dict per row), a validated doc
+and a ReplaceOne per row at once. Here:
+  - large bodies are parsed as a stream, one array element at a time
+    (small ones still go through request.get_json, so the audit log keeps them)
+  - each validated doc is folded into RowBuffer: typed columns
+    (epoch microseconds as int64, float64, interned strings as uint32 indexes)
+    plus a one-byte "shape" per row recording which fields it had
+  - docs and ReplaceOne ops are only rebuilt per flush batch, after the whole
+    body parsed, so a malformed payload still writes nothing
+
+Each summary carries the upload's peak RSS (see PeakMemory).
+"""
+from array import array
+from datetime import datetime, timedelta, timezone
+from pymongo import ReplaceOne
+import codecs
+import json
+import os
+
+# Bodies up to this size are parsed whole (and logged in full by app.py)
+STREAM_MIN_BYTES = int(os.getenv("INGEST_STREAM_MIN_BYTES", str(1024 * 1024)))
+# Rows per bulk_write when replaying the buffer
+FLUSH_ROWS = int(os.getenv("INGEST_FLUSH_ROWS", "10000"))
+READ_CHUNK_BYTES = 64 * 1024
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_WHITESPACE = " \t\n\r"
+
+
+class PayloadError(ValueError):
+    """Body is not a JSON array of records"""
+
+
+def streams_body(req) -> bool:
+    """True when a bulk-add body is big enough to be parsed as a stream"""
+    length = req.content_length
+    return length is None or length > STREAM_MIN_BYTES
+
+
+# ── Streaming JSON array parser ─────────────────────────────────────
+def iter_json_array(stream, chunk_bytes: int = READ_CHUNK_BYTES):
+    """Yield the elements of a top-level JSON array read from a binary stream"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + utf8.decode(chunk or b"", final=eof)
+        pos = 0
+
+    def next_char():
+        """Skip whitespace; the next significant character or '' at EOF"""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return ""
+            fill()
+
+    fill()
+    if buf.startswith("\ufeff"):
+        pos = 1
+    if next_char() != "[":
+        raise PayloadError("Payload must be a list of records")
+    pos += 1
+
+    first = True
+    while True:
+        ch = next_char()
+        if ch == "]":
+            pos += 1
+            break
+        if not first:
+            if ch != ",":
+                raise PayloadError("Invalid JSON payload: expected ',' or ']'")
+            pos += 1
+            next_char()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise PayloadError(f"Invalid JSON payload: {e}") from None
+                fill()
+                continue
+            # A value ending exactly at the buffer edge (e.g. a number) may continue in the next read
+            if end == len(buf) and not eof:
+                fill()
+                continue
+            break
+        pos = end
+        first = False
+        yield item
+
+    if next_char() != "":
+        raise PayloadError("Invalid JSON payload: data after the closing ']'")
+
+
+def iter_request_rows(req):
+    """Rows of a bulk-add request; raises PayloadError like the old isinstance check"""
+    if not streams_body(req):
+        data = req.get_json(silent=True, force=True)
+        if not isinstance(data, list):
+            raise PayloadError("Payload must be a list of records")
+        return iter(data)
+    return iter_json_array(req.stream)
+
+
+# ── Typed row buffer ────────────────────────────────────────────────
+def _to_micros(ts: datetime) -> int:
+    # BSON dates are UTC; aware datetimes are stored the way pymongo would store them
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return (ts - _EPOCH) // _MICROSECOND
+
+
+class RowBuffer:
+    """Column store for validated docs whose values are float, datetime, str or None"""
+
+    def __init__(self):
+        self._columns = {}        # field → (kind, array)
+        self._strings = []        # interned str/None values
+        self._string_ids = {}
+        self._shapes = []         # distinct field tuples, in doc key order
+        self._shape_ids = {}
+        self._row_shapes = array("B")
+
+    def __len__(self):
+        return len(self._row_shapes)
+
+    @staticmethod
+    def _kind(field, value) -> str:
+        if isinstance(value, float):
+            return "f"
+        if isinstance(value, datetime):
+            return "t"
+        if value is None or isinstance(value, str):
+            return "s"
+        raise TypeError(f"RowBuffer cannot store {type(value).__name__} field '{field}'")
+
+    def _column(self, field, kind):
+        col = self._columns.get(field)
+        if col is None:
+            col = (kind, array({"f": "d", "t": "q", "s": "I"}[kind]))
+            # Rows seen before this field appeared get a placeholder their shape never reads
+            col[1].extend([0] * len(self))
+            self._columns[field] = col
+        elif col[0] != kind:
+            raise TypeError(f"field '{field}' changed type mid-upload")
+        return col
+
+    def _intern(self, value) -> int:
+        idx = self._string_ids.get(value)
+        if idx is None:
+            idx = self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+        return idx
+
+    def append(self, doc: dict):
+        shape = tuple(doc)
+        shape_id = self._shape_ids.get(shape)
+        if shape_id is None and len(self._shapes) >= 256:
+            raise ValueError("RowBuffer supports at most 256 distinct row shapes")
+        # Resolve every column before appending so a bad row leaves no partial values
+        columns = [(self._column(field, self._kind(field, value)), value) for field, value in doc.items()]
+        for (kind, values), value in columns:
+            if kind == "f":
+                values.append(value)
+            elif kind == "t":
+                values.append(_to_micros(value))
+            else:
+                values.append(self._intern(value))
+        if shape_id is None:
+            shape_id = self._shape_ids[shape] = len(self._shapes)
+            self._shapes.append(shape)
+        for field, (_, values) in self._columns.items():
+            if len(values) == len(self):
+                values.append(0)
+        self._row_shapes.append(shape_id)
+
+    def docs(self, start: int = 0, stop: int = None):
+        """Rebuild docs for rows [start, stop) in their original key order"""
+        columns, strings = self._columns, self._strings
+        stop = len(self) if stop is None else min(stop, len(self))
+        for row in range(start, stop):
+            doc = {}
+            for field in self._shapes[self._row_shapes[row]]:
+                kind, values = columns[field]
+                if kind == "f":
+                    doc[field] = values[row]
+                elif kind == "t":
+                    doc[field] = _EPOCH + values[row] * _MICROSECOND
+                else:
+                    doc[field] = strings[values[row]]
+            yield doc
+
+    def column(self, field: str):
+        """(kind, values, has) of a field, or None: the raw typed array ('s' values index strings())
+        and, per shape id, whether rows of that shape carry the field (other rows hold a placeholder)"""
+        col = self._columns.get(field)
+        if col is None:
+            return None
+        return col[0], col[1], [field in shape for shape in self._shapes]
+
+    def row_shapes(self) -> array:
+        """Shape id of every row"""
+        return self._row_shapes
+
+    def strings(self) -> list:
+        return self._strings
+
+    def time_range(self, field: str):
+        """(earliest, latest) of a datetime column, or None"""
+        col = self._columns.get(field)
+        if col is None or col[0] != "t" or not len(self):
+            return None
+        return _EPOCH + min(col[1]) * _MICROSECOND, _EPOCH + max(col[1]) * _MICROSECOND
+
+    def nbytes(self) -> int:
+        arrays = [values for _, values in self._columns.values()] + [self._row_shapes]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+
+# ── Peak memory ─────────────────────────────────────────────────────
+def _status_kb(field: str):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class PeakMemory:
+    """
+    Peak RSS while the block runs. On Linux the process high-water mark is
+    reset on entry (/proc/self/clear_refs), so the peak is per upload as long
+    as the worker serves one upload at a time (gunicorn sync workers);
+    elsewhere it falls back to the process-lifetime peak.
+    """
+
+    def __enter__(self):
+        self.scope = "process"
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            self.scope = "upload"
+        except OSError:
+            pass
+        self.rss_before_kb = _status_kb("VmRSS")
+        return self
+
+    def __exit__(self, *exc):
+        self.peak_kb = _status_kb("VmHWM")
+        if self.peak_kb is None:
+            import resource
+            self.peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return False
+
+    def report(self, buffer: RowBuffer = None) -> dict:
+        out = {"peak_rss_mb": round(self.peak_kb / 1024, 1), "peak_scope": self.scope}
+        if self.rss_before_kb is not None:
+            out["peak_increase_mb"] = round((self.peak_kb - self.rss_before_kb) / 1024, 1)
+        if buffer is not None:
+            out["row_buffer_mb"] = round(buffer.nbytes() / (1024 * 1024), 2)
+        return out
+
+
+# ── Bulk add ────────────────────────────────────────────────────────
+def bulk_ingest(rows, build_doc, target, key_fields, sample_fields=None, flag_rows=None) -> dict:
+    """
+    Validate `rows` with `build_doc(item)` into a RowBuffer, then upsert them
+    into `target` in FLUSH_ROWS batches keyed on `key_fields`.
+
+    `flag_rows(buffer)` → ({row: [flag]}, report), run once the body is parsed
+    (see utils.anomaly), sets "anomalies" on the flagged docs and adds its
+    report under "anomalies".
+
+    Returns the counters of the bulk-add summary plus "sample_errors",
+    "memory" and "time_range" (first key field's span, for the change feed;
+    not part of the response); PayloadError from the row iterator propagates before any write.
+    """
+    with PeakMemory() as peak:
+        buffer = RowBuffer()
+        received = skipped_invalid = 0
+        first_errors = []
+        for i, item in enumerate(rows):
+            received += 1
+            try:
+                buffer.append(build_doc(item))
+            except Exception as ex:
+                skipped_invalid += 1
+                if len(first_errors) < 5:
+                    sample = item if sample_fields is None else \
+                        {k: item.get(k) for k in sample_fields} if isinstance(item, dict) else item
+                    first_errors.append({"row_index": i, "error": str(ex), "row_sample": sample})
+
+        row_flags, flag_report = flag_rows(buffer) if flag_rows and len(buffer) else ({}, None)
+
+        total_upserts = total_matched = total_modified = 0
+        for start in range(0, len(buffer), FLUSH_ROWS):
+            ops = []
+            for row, doc in enumerate(buffer.docs(start, start + FLUSH_ROWS), start):
+                if row in row_flags:
+                    doc["anomalies"] = row_flags[row]
+                ops.append(ReplaceOne({k: doc[k] for k in key_fields}, doc, upsert=True))
+            result = target.bulk_write(ops, ordered=False, bypass_document_validation=True)
+            total_upserts += result.upserted_count or 0
+            total_matched += result.matched_count or 0
+            total_modified += result.modified_count or 0
+            del ops
+
+    summary = {
+        "received": received,
+        "inserted_new": total_upserts,
+        "replaced_existing": total_matched,
+        "modified_existing": total_modified,
+        "skipped_invalid": skipped_invalid,
+        "sample_errors": first_errors,
+        "memory": peak.report(buffer),
+        "time_range": buffer.time_range(key_fields[0]),
+    }
+    if flag_report is not None:
+        summary["anomalies"] = flag_report
+    return summary
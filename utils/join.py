@@ -0,0 +1,209 @@
+"""
+Slot-aligned merge join of several datasets' final collections.
+
+Each dataset gets one cursor over [start, end), sorted on its time index,
+reduced to (slot number, {column: value}) as it is read:
+  - single-series data: the last point in a slot wins
+  - plant data: summed over plants per slot, or one column per plant
+    when `plants` is given
+Columns are "<dataset>.<field>" (plants: "plant.<Plant_Name>.<field>").
+Datasets without declared value_fields contribute the numeric fields of
+their first point in the range.
+
+Join.rows() walks the slot grid once, advancing every cursor in step, so
+memory is one pending slot per dataset whatever the range. Fill policies
+for a cell with no point:
+  null    leave it null
+  ffill   repeat the dataset's previous value
+  zero    0
+  drop    skip rows where any cell is empty
+"""
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+import os
+
+from utils.datasets import DATASETS
+from utils.dates import naive_utc
+from utils.mongo import collection
+
+FILL_POLICIES = ("null", "ffill", "zero", "drop")
+FORMATS = ("json", "ndjson", "csv")
+MAX_ROWS = int(os.getenv("JOIN_MAX_ROWS", "1000000"))
+# Rows per chunk of the streamed response (and per compression flush)
+CHUNK_ROWS = 500
+CURSOR_BATCH = 5000
+
+# Fields that describe an upload rather than a measurement
+_META_FIELDS = {"_id", "uploaded_by", "uploaded_at", "approved_by", "approved_at"}
+
+
+class JoinError(ValueError):
+    """Invalid join request (→ 400)"""
+
+
+class _SlotStream:
+    """One dataset's cursor, reduced to (slot, {column: value}) in slot order"""
+
+    def __init__(self, name: str, start: datetime, end: datetime, slot: timedelta, plants: list = None):
+        dataset = DATASETS[name]
+        self.name = name
+        self.start, self.slot = start, slot
+        self.time_field = dataset["time_field"]
+        self.series_field = dataset["series_field"]
+        self.plants = plants if self.series_field else None
+        final = collection(dataset["final"], dataset["db"])
+        flt = {self.time_field: {"$gte": start, "$lt": end}}
+        if self.plants:
+            flt[self.series_field] = {"$in": self.plants}
+
+        self.fields = list(dataset["value_fields"]) or self._peek_fields(final, flt)
+        if self.plants:
+            self.columns = [f"{name}.{p}.{f}" for p in self.plants for f in self.fields]
+        else:
+            self.columns = [f"{name}.{f}" for f in self.fields]
+
+        sort = [(self.time_field, 1)] + ([(self.series_field, 1)] if self.series_field else [])
+        projection = {"_id": 0, self.time_field: 1, **{f: 1 for f in self.fields}}
+        if self.series_field:
+            projection[self.series_field] = 1
+        self._cursor = final.find(flt, projection).sort(sort).batch_size(CURSOR_BATCH)
+        self._next_doc = None
+        self._advance_doc()
+
+    def _peek_fields(self, final, flt) -> list:
+        first = final.find_one(flt, sort=[(self.time_field, 1)])
+        if not first:
+            return []
+        skip = _META_FIELDS | {self.time_field, self.series_field}
+        return [k for k, v in first.items()
+                if k not in skip and isinstance(v, (int, float)) and not isinstance(v, bool)]
+
+    def _advance_doc(self):
+        self._next_doc = next(self._cursor, None)
+
+    def __iter__(self):
+        while self._next_doc is not None:
+            slot_no = (self._next_doc[self.time_field] - self.start) // self.slot
+            values = {}
+            while self._next_doc is not None and \
+                    (self._next_doc[self.time_field] - self.start) // self.slot == slot_no:
+                self._fold(values, self._next_doc)
+                self._advance_doc()
+            yield slot_no, values
+
+    def _fold(self, values: dict, doc: dict):
+        if self.series_field and self.plants:
+            prefix = f"{self.name}.{doc.get(self.series_field)}."
+            for f in self.fields:
+                if isinstance(doc.get(f), (int, float)):
+                    values[prefix + f] = doc[f]
+        elif self.series_field:
+            # Total over plants
+            for f in self.fields:
+                if isinstance(doc.get(f), (int, float)):
+                    values[f"{self.name}.{f}"] = values.get(f"{self.name}.{f}", 0) + doc[f]
+        else:
+            for f in self.fields:
+                if isinstance(doc.get(f), (int, float)):
+                    values[f"{self.name}.{f}"] = doc[f]
+
+    def close(self):
+        self._cursor.close()
+
+
+class Join:
+    def __init__(self, names: list, start: datetime, end: datetime, slot_minutes: int = 15,
+                 fill: str = "null", plants: list = None, time_field: str = "TimeStamp"):
+        start, end = naive_utc(start), naive_utc(end)
+        if not names:
+            raise JoinError("datasets is required")
+        unknown = [n for n in names if n not in DATASETS]
+        if unknown:
+            raise JoinError(f"Unknown dataset(s) {', '.join(unknown)} (expected {', '.join(DATASETS)})")
+        if not start or not end or start >= end:
+            raise JoinError("start and end are required, with start before end")
+        if slot_minutes <= 0:
+            raise JoinError("slot_minutes must be positive")
+        if fill not in FILL_POLICIES:
+            raise JoinError(f"fill must be one of {', '.join(FILL_POLICIES)}")
+        self.slot = timedelta(minutes=slot_minutes)
+        self.n_slots = -(-(end - start) // self.slot)
+        if self.n_slots > MAX_ROWS:
+            raise JoinError(f"{self.n_slots} rows exceeds {MAX_ROWS}; shorten the range or widen slot_minutes")
+        self.start, self.end, self.fill, self.time_field = start, end, fill, time_field
+
+        # Cursors open (first batch read) here, so setup errors surface before streaming starts
+        self.streams = []
+        try:
+            for name in names:
+                self.streams.append(_SlotStream(name, start, end, self.slot, plants))
+        except Exception:
+            self.close()
+            raise
+        self.columns = [c for s in self.streams for c in s.columns]
+
+    def close(self):
+        for stream in self.streams:
+            stream.close()
+
+    def rows(self):
+        """Aligned rows: (timestamp, [value per column])"""
+        iters = [iter(s) for s in self.streams]
+        pending = [next(it, None) for it in iters]
+        last = {}
+        zero = 0 if self.fill == "zero" else None
+        try:
+            for slot_no in range(self.n_slots):
+                cells = {}
+                for i, it in enumerate(iters):
+                    if pending[i] is not None and pending[i][0] == slot_no:
+                        cells.update(pending[i][1])
+                        pending[i] = next(it, None)
+                if self.fill == "ffill":
+                    last.update(cells)
+                    row = [last.get(c) for c in self.columns]
+                else:
+                    row = [cells.get(c, zero) for c in self.columns]
+                if self.fill == "drop" and (not row or any(v is None for v in row)):
+                    continue
+                yield self.start + slot_no * self.slot, row
+        finally:
+            self.close()
+
+    # ── Renderers (chunked for streaming) ───────────────────────────
+    def _chunks(self, render):
+        out = []
+        for ts, row in self.rows():
+            out.append(render(ts, row))
+            if len(out) == CHUNK_ROWS:
+                yield out
+                out = []
+        if out:
+            yield out
+
+    def _json_row(self, ts, row) -> str:
+        return json.dumps({self.time_field: ts.isoformat(), **dict(zip(self.columns, row))})
+
+    def iter_ndjson(self):
+        for chunk in self._chunks(self._json_row):
+            yield "\n".join(chunk) + "\n"
+
+    def iter_json(self):
+        first = True
+        for chunk in self._chunks(self._json_row):
+            yield ("[" if first else ",") + ",".join(chunk)
+            first = False
+        yield "[]" if first else "]"
+
+    def iter_csv(self):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow([self.time_field] + self.columns)
+        yield buf.getvalue()
+        for chunk in self._chunks(lambda ts, row: [ts.isoformat()] + ["" if v is None else v for v in row]):
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(chunk)
+            yield buf.getvalue()
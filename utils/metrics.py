@@ -0,0 +1,236 @@
+"""
+Prometheus metrics shared by every route module.
+
+With PROMETHEUS_MULTIPROC_DIR set (start_app.sh does this) each gunicorn
+worker writes its samples to mmap'd files in that directory and
+/metrics aggregates all workers; without it the registry is per-process.
+"""
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST,
+)
+from prometheus_client import multiprocess
+from pymongo import monitoring
+import os
+import threading
+import time
+
+from utils.mongo import register_listener
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MIGRATION_BUCKETS = (1, 10, 100, 1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by blueprint and route",
+    ["blueprint", "route", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+BULK_ROWS = Counter(
+    "bulk_add_rows_total",
+    "Rows seen by bulk-add routes by outcome (received/upserted/matched/modified/skipped)",
+    ["dataset", "outcome"],
+)
+APPROVAL_MIGRATION_SIZE = Histogram(
+    "approval_migration_documents",
+    "Documents moved from staging to final per approve call",
+    ["dataset"],
+    buckets=MIGRATION_BUCKETS,
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds",
+    "Mongo command latency by collection and command",
+    ["database", "collection", "command", "outcome"],
+    buckets=MONGO_BUCKETS,
+)
+MONGO_CONNECTIONS_CHECKED_OUT = Gauge(
+    "mongo_pool_connections_checked_out",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum",
+)
+MONGO_CONNECTIONS_OPEN = Gauge(
+    "mongo_pool_connections_open",
+    "Open pool connections",
+    multiprocess_mode="livesum",
+)
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total",
+    "Bulk-add admission outcomes (admitted/queued/rejected)",
+    ["dataset", "outcome"],
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time bulk uploads waited for an admission slot",
+    ["dataset"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+COALESCED_READS = Counter(
+    "coalesced_reads_total",
+    "Listing GETs by coalescing outcome (leader ran the query; shared/cached reused it)",
+    ["scope", "outcome"],
+)
+COMPRESSION_BYTES = Counter(
+    "response_compression_bytes_total",
+    "Response bytes before (in) and after (out) compression by encoding",
+    ["encoding", "stage"],
+)
+QUERY_GUARD_DECISIONS = Counter(
+    "query_guard_decisions_total",
+    "Listing query shapes blocked by the plan guard (rejected/rewritten/logged)",
+    ["collection", "outcome", "reason", "shape"],
+)
+ACCURACY_CACHE = Counter(
+    "accuracy_cache_total",
+    "Forecast accuracy requests served from the cache (hit) or aggregated (miss)",
+    ["dataset", "outcome"],
+)
+MONGO_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total",
+    "Failed pool checkouts by reason",
+    ["reason"],
+)
+
+# Query shapes come from user-supplied sort fields; cap the label's cardinality
+MAX_GUARD_SHAPES = 50
+_guard_shapes = set()
+
+# Commands whose first field is not the collection name
+_COLLECTION_FIELDS = {"getMore": "collection"}
+
+
+class _CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        command_name = event.command_name
+        field = _COLLECTION_FIELDS.get(command_name, command_name)
+        coll = event.command.get(field)
+        if not isinstance(coll, str):
+            coll = "-"
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = (event.database_name, coll)
+
+    def _finish(self, event, outcome):
+        with self._lock:
+            database, coll = self._started.pop((event.connection_id, event.request_id), (event.database_name, "-"))
+        MONGO_COMMAND_LATENCY.labels(database, coll, event.command_name, outcome).observe(
+            event.duration_micros / 1_000_000
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "succeeded")
+
+    def failed(self, event):
+        self._finish(event, "failed")
+
+
+class _PoolMetricsListener(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_CONNECTIONS_OPEN.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_CONNECTIONS_OPEN.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_CONNECTIONS_CHECKED_OUT.inc()
+
+    def connection_checked_in(self, event):
+        MONGO_CONNECTIONS_CHECKED_OUT.dec()
+
+
+# Attached to the shared client when it is first created (utils/mongo.py)
+register_listener(_CommandMetricsListener())
+register_listener(_PoolMetricsListener())
+
+
+def observe_request(blueprint, route, method, status, started_at: float):
+    REQUEST_LATENCY.labels(blueprint or "-", route or "-", method, str(status)).observe(
+        time.perf_counter() - started_at
+    )
+
+
+def record_bulk_add(dataset: str, summary: dict):
+    """Count rows from a bulk-add summary dict"""
+    BULK_ROWS.labels(dataset, "received").inc(summary.get("received", 0))
+    BULK_ROWS.labels(dataset, "upserted").inc(summary.get("inserted_new", 0))
+    BULK_ROWS.labels(dataset, "matched").inc(summary.get("replaced_existing", 0))
+    BULK_ROWS.labels(dataset, "modified").inc(summary.get("modified_existing", 0))
+    BULK_ROWS.labels(dataset, "skipped").inc(summary.get("skipped_invalid", 0))
+
+
+def record_approval(dataset: str, migrated: int):
+    APPROVAL_MIGRATION_SIZE.labels(dataset).observe(migrated)
+
+
+def record_admission(dataset: str, admitted: bool, waited: float):
+    if not admitted:
+        outcome = "rejected"
+    elif waited >= 0.05:
+        outcome = "queued"
+    else:
+        outcome = "admitted"
+    ADMISSION_DECISIONS.labels(dataset, outcome).inc()
+    ADMISSION_WAIT.labels(dataset).observe(waited)
+
+
+def record_coalesce(scope: str, outcome: str):
+    COALESCED_READS.labels(scope, outcome).inc()
+
+
+def record_compression(encoding: str, size_in: int, size_out: int):
+    COMPRESSION_BYTES.labels(encoding, "in").inc(size_in)
+    COMPRESSION_BYTES.labels(encoding, "out").inc(size_out)
+
+
+def record_query_guard(collection: str, outcome: str, reason: str, shape: str):
+    if shape not in _guard_shapes:
+        if len(_guard_shapes) >= MAX_GUARD_SHAPES:
+            shape = "other"
+        else:
+            _guard_shapes.add(shape)
+    QUERY_GUARD_DECISIONS.labels(collection, outcome, reason, shape).inc()
+
+
+def record_accuracy_cache(dataset: str, hit: bool):
+    ACCURACY_CACHE.labels(dataset, "hit" if hit else "miss").inc()
+
+
+def render_metrics():
+    """(body, content_type) aggregated across workers when multiprocess"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: int):
+    """gunicorn child_exit hook: drop live gauges of a dead worker"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,185 @@
+from pymongo import MongoClient, monitoring
+from dotenv import load_dotenv
+import os
+import threading
+
+load_dotenv()
+
+# ── Config (one place for every route module) ───────────────────────
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+
+# Databases used by the route modules
+POWERCASTING_DB = "powercasting"
+POWERCASTING_NEW_DB = "power_casting_new"
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_event_listeners = []
+
+_pool_stats = {
+    "connections_created": 0,
+    "connections_closed": 0,
+    "checked_out": 0,
+    "checkout_failed": 0,
+    "pools_cleared": 0,
+}
+_pool_stats_lock = threading.Lock()
+
+
+def _bump(key: str, delta: int = 1):
+    with _pool_stats_lock:
+        _pool_stats[key] += delta
+
+
+class _PoolStatsListener(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        _bump("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        _bump("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        _bump("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        _bump("checkout_failed")
+
+    def connection_checked_out(self, event):
+        _bump("checked_out")
+
+    def connection_checked_in(self, event):
+        _bump("checked_out", -1)
+
+
+def register_listener(listener):
+    """Add a pymongo event listener to the shared client (before first use)"""
+    with _lock:
+        _event_listeners.append(listener)
+
+
+def registered_listeners() -> list:
+    """Listeners registered so far (also attached to the async client)"""
+    with _lock:
+        return list(_event_listeners)
+
+
+def _reset_after_fork():
+    # The parent's sockets and monitor threads are not usable in the child
+    global _client, _client_pid
+    _client = None
+    _client_pid = None
+    with _pool_stats_lock:
+        for key in _pool_stats:
+            _pool_stats[key] = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client() -> MongoClient:
+    """Shared MongoClient for this process, created on first use"""
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            options = {
+                "maxPoolSize": MAX_POOL_SIZE,
+                "minPoolSize": MIN_POOL_SIZE,
+                "maxIdleTimeMS": MAX_IDLE_TIME_MS,
+                "connectTimeoutMS": CONNECT_TIMEOUT_MS,
+                "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+                "socketTimeoutMS": SOCKET_TIMEOUT_MS,
+                "waitQueueTimeoutMS": WAIT_QUEUE_TIMEOUT_MS,
+                "event_listeners": [_PoolStatsListener(), *_event_listeners],
+            }
+            if COMPRESSORS:
+                options["compressors"] = COMPRESSORS
+            _client = MongoClient(MONGO_URI, **options)
+            _client_pid = os.getpid()
+    return _client
+
+
+def use_client(client):
+    """Swap in another client for this process (benchmarks / local stand-ins)"""
+    global _client, _client_pid
+    with _lock:
+        _client = client
+        _client_pid = os.getpid()
+
+
+def get_db(name: str = POWERCASTING_DB):
+    return get_client()[name]
+
+
+def get_collection(db_name: str, collection_name: str):
+    return get_client()[db_name][collection_name]
+
+
+class LazyCollection:
+    """
+    Module-level collection handle that resolves against the shared
+    client on each use, so importing a route module opens no sockets
+    and forked workers never reuse the parent's client.
+    """
+
+    def __init__(self, db_name: str, collection_name: str):
+        self.db_name = db_name
+        self.collection_name = collection_name
+
+    def resolve(self):
+        return get_collection(self.db_name, self.collection_name)
+
+    @property
+    def name(self) -> str:
+        return self.collection_name
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.db_name!r}, {self.collection_name!r})"
+
+
+def collection(collection_name: str, db_name: str = POWERCASTING_DB) -> LazyCollection:
+    return LazyCollection(db_name, collection_name)
+
+
+def pool_stats() -> dict:
+    """Pool counters for this worker plus the configured limits"""
+    with _pool_stats_lock:
+        stats = dict(_pool_stats)
+    stats.update({
+        "open_connections": stats["connections_created"] - stats["connections_closed"],
+        "pid": os.getpid(),
+        "client_created": _client is not None and _client_pid == os.getpid(),
+        "max_pool_size": MAX_POOL_SIZE,
+        "min_pool_size": MIN_POOL_SIZE,
+        "compressors": COMPRESSORS or None,
+    })
+    return stats
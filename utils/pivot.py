@@ -0,0 +1,163 @@
+"""
+Timestamp × series matrix of a multi-series dataset (plant consumption).
+
+The range is streamed from the (TimeStamp, Plant_Name) index with a
+three-field projection; each point only contributes its bucket number,
+series number and value to typed arrays. The matrix is then built in one
+vectorized pass (np.bincount / np.maximum.at over bucket × series cell
+ids) and rendered column-wise:
+
+    json   {"TimeStamp": [...], "columns": [plants], "values": {plant: [...]}}
+    csv    TimeStamp,<plant>,…  streamed in row chunks
+    arrow  Arrow IPC stream (needs pyarrow)
+
+Rows are dense: one per bucket in [start, end), empty cells are null.
+"""
+from array import array
+from datetime import datetime, timedelta
+import csv
+import io
+import os
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - optional
+    pyarrow = None
+
+from utils.datasets import DATASETS
+from utils.dates import naive_utc
+from utils.mongo import collection
+
+# Matrix size cap (rows × columns); 5M float64 cells ≈ 40 MB
+MAX_CELLS = int(os.getenv("PIVOT_MAX_CELLS", "5000000"))
+CSV_CHUNK_ROWS = 5000
+AGGREGATES = ("mean", "sum", "min", "max", "count")
+FORMATS = ("json", "csv", "arrow")
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+
+class PivotError(ValueError):
+    """Invalid pivot request (→ 400)"""
+
+
+class Pivot:
+    def __init__(self, start: datetime, every: timedelta, columns: list, matrix):
+        self.start = start
+        self.every = every
+        self.columns = columns
+        self.matrix = matrix  # float64 (rows, columns), NaN = empty cell
+
+    def timestamps(self):
+        step = np.timedelta64(self.every // timedelta(microseconds=1), "us")
+        return np.datetime64(self.start, "us") + step * np.arange(self.matrix.shape[0])
+
+    # ── Renderers ───────────────────────────────────────────────────
+    def to_columnar(self) -> dict:
+        return {
+            "TimeStamp": np.datetime_as_string(self.timestamps(), unit="s").tolist(),
+            "columns": self.columns,
+            "values": {
+                name: np.where(np.isnan(col), None, col).tolist()
+                for name, col in zip(self.columns, self.matrix.T)
+            },
+        }
+
+    def iter_csv(self, time_field: str = "TimeStamp"):
+        stamps = np.datetime_as_string(self.timestamps(), unit="s")
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow([time_field] + self.columns)
+        for lo in range(0, self.matrix.shape[0], CSV_CHUNK_ROWS):
+            block = self.matrix[lo:lo + CSV_CHUNK_ROWS]
+            cells = np.where(np.isnan(block), "", block.astype(str))
+            writer.writerows([stamp, *row] for stamp, row in zip(stamps[lo:lo + CSV_CHUNK_ROWS], cells.tolist()))
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    def to_arrow(self, time_field: str = "TimeStamp") -> bytes:
+        if pyarrow is None:
+            raise PivotError("Arrow output needs pyarrow installed on the server")
+        arrays = [pyarrow.array(self.timestamps().astype("datetime64[ms]"))]
+        arrays += [pyarrow.array(col, mask=np.isnan(col)) for col in self.matrix.T]
+        table = pyarrow.Table.from_arrays(arrays, names=[time_field] + self.columns)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def build_pivot(name: str, start: datetime, end: datetime, every: timedelta, field: str,
+                agg: str = "mean", series: list = None) -> Pivot:
+    """Stream [start, end) of `name` and pivot `field` into buckets of `every` × series"""
+    dataset = DATASETS[name]
+    time_field, series_field = dataset["time_field"], dataset["series_field"]
+    if not series_field:
+        raise PivotError(f"{name} has a single series")
+    if field not in dataset["value_fields"]:
+        raise PivotError(f"field must be one of {', '.join(dataset['value_fields'])}")
+    if agg not in AGGREGATES:
+        raise PivotError(f"agg must be one of {', '.join(AGGREGATES)}")
+    start, end = naive_utc(start), naive_utc(end)
+    if not start or not end or start >= end:
+        raise PivotError("start and end are required, with start before end")
+    if every <= timedelta(0):
+        raise PivotError("interval must be positive")
+
+    n_rows = -(-(end - start) // every)
+    if n_rows > MAX_CELLS:
+        raise PivotError(f"{n_rows} rows exceeds {MAX_CELLS} cells; widen the interval")
+    flt = {time_field: {"$gte": start, "$lt": end}}
+    if series:
+        flt[series_field] = {"$in": series}
+    # A fixed subset bounds the matrix before reading anything
+    if series and n_rows * len(series) > MAX_CELLS:
+        raise PivotError(f"{n_rows} rows × {len(series)} plants exceeds {MAX_CELLS} cells")
+
+    final = collection(dataset["final"], dataset["db"])
+    cursor = final.find(flt, {"_id": 0, time_field: 1, series_field: 1, field: 1}) \
+        .sort([(time_field, 1), (series_field, 1)]).batch_size(10000)
+
+    column_ids = {plant: i for i, plant in enumerate(series or [])}
+    buckets, cols, values = array("q"), array("i"), array("d")
+    for doc in cursor:
+        value = doc.get(field)
+        if not isinstance(value, (int, float)):
+            continue
+        key = doc.get(series_field)
+        col = column_ids.get(key)
+        if col is None:
+            col = column_ids[key] = len(column_ids)
+            if n_rows * len(column_ids) > MAX_CELLS:
+                raise PivotError(f"{n_rows} rows × {len(column_ids)}+ plants exceeds {MAX_CELLS} cells; "
+                                 f"narrow the range, widen the interval or pass plants=")
+        buckets.append((doc[time_field] - start) // every)
+        cols.append(col)
+        values.append(value)
+
+    n_cols = len(column_ids)
+    cells = np.frombuffer(buckets, dtype=np.int64) * n_cols + np.frombuffer(cols, dtype=np.int32)
+    vals = np.frombuffer(values, dtype=np.float64)
+    size = n_rows * n_cols
+    counts = np.bincount(cells, minlength=size)
+    if agg in ("mean", "sum"):
+        flat = np.bincount(cells, weights=vals, minlength=size)
+        if agg == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                flat = flat / counts
+    elif agg == "count":
+        flat = counts.astype(np.float64)
+    else:
+        flat = np.full(size, -np.inf if agg == "max" else np.inf)
+        (np.maximum if agg == "max" else np.minimum).at(flat, cells, vals)
+    if agg != "count":
+        flat[counts == 0] = np.nan
+
+    # Requested plants keep their order; discovered ones are sorted
+    names = sorted(column_ids, key=lambda k: (series.index(k) if series else 0, str(k)))
+    order = [column_ids[k] for k in names]
+    matrix = flat.reshape(n_rows, n_cols)[:, order] if n_cols else np.empty((n_rows, 0))
+    return Pivot(start, every, names, matrix)
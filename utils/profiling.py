@@ -0,0 +1,193 @@
+"""
+On-demand per-request profiling.
+
+A request is profiled when it carries `X-Profile-Token: <PROFILE_TOKEN>`
+or is picked by PROFILE_SAMPLE_RATE. `X-Profile-Mode: sample` selects
+the stack sampler (speedscope output) instead of cProfile (pstats).
+Profiles are written to PROFILE_DIR with a small JSON sidecar.
+"""
+from datetime import datetime
+from dotenv import load_dotenv
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+load_dotenv()
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/guvnl_profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "2")) / 1000
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+
+
+def token_ok(headers) -> bool:
+    return bool(PROFILE_TOKEN) and headers.get("X-Profile-Token") == PROFILE_TOKEN
+
+
+def should_profile(headers) -> bool:
+    if token_ok(headers):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class _StackSampler:
+    """Samples one thread's Python stack on a timer (speedscope 'sampled')"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = {}
+        self.frame_list = []
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        idx = self.frames.get(key)
+        if idx is None:
+            idx = len(self.frame_list)
+            self.frames[key] = idx
+            self.frame_list.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return idx
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def to_speedscope(self, name: str) -> dict:
+        total = sum(self.weights)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": self.frame_list},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": self.samples,
+                "weights": self.weights,
+            }],
+            "name": name,
+            "exporter": "guvnl-alternate-server",
+        }
+
+
+def start(mode: str) -> dict:
+    """Begin profiling the current thread; returns the handle to pass to finish()"""
+    handle = {"id": uuid.uuid4().hex, "mode": mode, "started": time.perf_counter()}
+    if mode == MODE_SAMPLE:
+        sampler = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL_SECONDS)
+        sampler.start()
+        handle["sampler"] = sampler
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        handle["profiler"] = profiler
+    return handle
+
+
+def finish(handle: dict, meta: dict) -> str:
+    """Stop profiling and persist the result; returns the profile id"""
+    duration = time.perf_counter() - handle["started"]
+    profile_id = handle["id"]
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{meta.get('method')} {meta.get('endpoint')}"
+
+    if handle["mode"] == MODE_SAMPLE:
+        handle["sampler"].stop()
+        data_file = f"{profile_id}.speedscope.json"
+        with open(os.path.join(PROFILE_DIR, data_file), "w") as f:
+            json.dump(handle["sampler"].to_speedscope(name), f)
+        formats = ["speedscope"]
+    else:
+        handle["profiler"].disable()
+        data_file = f"{profile_id}.prof"
+        handle["profiler"].dump_stats(os.path.join(PROFILE_DIR, data_file))
+        formats = ["pstats"]
+
+    meta = {
+        **meta,
+        "id": profile_id,
+        "mode": handle["mode"],
+        "duration_s": round(duration, 6),
+        "created_at": datetime.utcnow().isoformat(),
+        "file": data_file,
+        "formats": formats,
+        "pid": os.getpid(),
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.meta.json"), "w") as f:
+        json.dump(meta, f)
+    _prune()
+    return profile_id
+
+
+def _prune():
+    metas = sorted(
+        (os.path.join(PROFILE_DIR, n) for n in os.listdir(PROFILE_DIR) if n.endswith(".meta.json")),
+        key=os.path.getmtime,
+    )
+    for meta_path in metas[:-PROFILE_MAX_FILES] if PROFILE_MAX_FILES > 0 else []:
+        profile_id = os.path.basename(meta_path)[: -len(".meta.json")]
+        for suffix in (".meta.json", ".prof", ".speedscope.json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(limit: int = 50) -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    records = []
+    for n in os.listdir(PROFILE_DIR):
+        if n.endswith(".meta.json"):
+            try:
+                with open(os.path.join(PROFILE_DIR, n)) as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    records.sort(key=lambda r: r.get("created_at", ""), reverse=True)
+    return records[:limit]
+
+
+def get_profile(profile_id: str):
+    """(meta, absolute data path) or None; ids are hex so no path traversal"""
+    if not profile_id.isalnum():
+        return None
+    meta_path = os.path.join(PROFILE_DIR, f"{profile_id}.meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta, os.path.join(PROFILE_DIR, meta["file"])
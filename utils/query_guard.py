@@ -0,0 +1,173 @@
+"""
+Query-plan guard for the listing routes.
+
+`sort` comes straight from the query string, so one request can make Mongo
+scan and sort a multi-million document staging collection in memory. The
+first time a query shape (collection, filter fields, sort) is seen, the
+guard runs `explain` and caches a verdict for QUERY_GUARD_TTL_SECONDS:
+  - ok        the plan is index-backed (or the collection is small)
+  - blocked   the plan has a blocking SORT stage, or a COLLSCAN that a
+              limit cannot cut short, on a collection larger than
+              QUERY_GUARD_MAX_SCAN_DOCS
+
+Blocked shapes are rejected with QueryRejected (→ 400) or, with
+QUERY_GUARD_MODE=rewrite, re-planned with the route's default sort when
+that one is index-backed; QUERY_GUARD_MODE=log only records them. Every
+blocked shape is printed and counted in query_guard_decisions_total.
+
+The default is reject: a listing sorted on an unindexed field (e.g.
+sort=uploaded_at) of a staging queue over QUERY_GUARD_MAX_SCAN_DOCS now
+gets a 400 instead of a slow 200; rewrite keeps those clients working.
+
+If explain itself fails (e.g. no server support) the shape is allowed.
+"""
+import os
+import threading
+import time
+
+from pymongo import ASCENDING
+
+from utils.metrics import record_query_guard
+
+QUERY_GUARD_MODE = os.getenv("QUERY_GUARD_MODE", "reject")  # reject | rewrite | log | off
+MAX_SCAN_DOCS = int(os.getenv("QUERY_GUARD_MAX_SCAN_DOCS", "50000"))
+VERDICT_TTL_SECONDS = float(os.getenv("QUERY_GUARD_TTL_SECONDS", "600"))
+
+_verdicts = {}  # shape → (expires_at, blocked_reason or None)
+_lock = threading.Lock()
+
+
+class QueryRejected(Exception):
+    def __init__(self, shape: str, reason: str):
+        super().__init__(f"Query rejected ({reason}): {shape}. Sort on an indexed field "
+                         f"or narrow the query.")
+        self.shape = shape
+        self.reason = reason
+
+
+# ── Shapes / plans ──────────────────────────────────────────────────
+def _filter_shape(flt: dict) -> str:
+    parts = []
+    for field, cond in sorted((flt or {}).items()):
+        if isinstance(cond, dict):
+            parts.append(f"{field}:{'|'.join(sorted(cond))}")
+        else:
+            parts.append(f"{field}:eq")
+    return ",".join(parts)
+
+
+def query_shape(collection_name: str, flt: dict, sort: list) -> str:
+    sort_part = ",".join(f"{f}:{1 if d == ASCENDING else -1}" for f, d in sort or [])
+    return f"{collection_name} filter[{_filter_shape(flt)}] sort[{sort_part}]"
+
+
+def plan_stages(explain: dict) -> list:
+    """Every `stage` name in the winning plan (classic and SBE explain layouts)"""
+    planner = explain.get("queryPlanner", {})
+    root = planner.get("winningPlan", {})
+    root = root.get("queryPlan", root)
+    stages, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            stack.extend(v for k, v in node.items() if k in ("inputStage", "inputStages", "queryPlan"))
+        elif isinstance(node, list):
+            stack.extend(node)
+    return stages
+
+
+def blocked_reason(stages: list, flt: dict, doc_count: int):
+    """Why a plan is too expensive for this collection size, or None"""
+    if doc_count <= MAX_SCAN_DOCS:
+        return None
+    if "SORT" in stages:
+        return "in-memory SORT"
+    # An unfiltered, unsorted COLLSCAN under a LIMIT stops after `limit` docs
+    if "COLLSCAN" in stages and flt:
+        return "COLLSCAN"
+    return None
+
+
+def _cached_verdict(shape: str):
+    with _lock:
+        entry = _verdicts.get(shape)
+    if entry and entry[0] > time.monotonic():
+        return True, entry[1]
+    return False, None
+
+
+def _remember(shape: str, reason):
+    with _lock:
+        _verdicts[shape] = (time.monotonic() + VERDICT_TTL_SECONDS, reason)
+
+
+def _decide(collection_name, shape, reason, rewrite_ok):
+    """Apply QUERY_GUARD_MODE to a blocked shape; returns True to use the fallback sort"""
+    if QUERY_GUARD_MODE == "rewrite" and rewrite_ok:
+        print(f"[Query Guard] rewrote {shape}: {reason}")
+        record_query_guard(collection_name, "rewritten", reason, shape)
+        return True
+    if QUERY_GUARD_MODE == "log":
+        print(f"[Query Guard] allowed (log mode) {shape}: {reason}")
+        record_query_guard(collection_name, "logged", reason, shape)
+        return False
+    print(f"[Query Guard] rejected {shape}: {reason}")
+    record_query_guard(collection_name, "rejected", reason, shape)
+    raise QueryRejected(shape, reason)
+
+
+# ── Sync (pymongo) ──────────────────────────────────────────────────
+def _verdict(collection, flt, sort, limit):
+    shape = query_shape(collection.name, flt, sort)
+    known, reason = _cached_verdict(shape)
+    if known:
+        return shape, reason
+    try:
+        explain = collection.find(flt).sort(sort).limit(limit).explain()
+        reason = blocked_reason(plan_stages(explain), flt, collection.estimated_document_count())
+    except Exception as e:
+        print(f"[Query Guard] explain failed for {shape}, allowing: {e}")
+        reason = None
+    _remember(shape, reason)
+    return shape, reason
+
+
+def guarded_find(collection, flt: dict, sort: list, limit: int, fallback_sort: list = None):
+    """collection.find(flt).sort(sort).limit(limit), unless the plan is blocked"""
+    if QUERY_GUARD_MODE != "off":
+        shape, reason = _verdict(collection, flt, sort, limit)
+        if reason:
+            rewrite_ok = QUERY_GUARD_MODE == "rewrite" and bool(fallback_sort) and fallback_sort != sort \
+                and not _verdict(collection, flt, fallback_sort, limit)[1]
+            if _decide(collection.name, shape, reason, rewrite_ok):
+                sort = fallback_sort
+    return collection.find(flt).sort(sort).limit(limit)
+
+
+# ── Async (AsyncMongoClient) ────────────────────────────────────────
+async def _verdict_async(collection, flt, sort, limit):
+    shape = query_shape(collection.name, flt, sort)
+    known, reason = _cached_verdict(shape)
+    if known:
+        return shape, reason
+    try:
+        explain = await collection.find(flt).sort(sort).limit(limit).explain()
+        reason = blocked_reason(plan_stages(explain), flt, await collection.estimated_document_count())
+    except Exception as e:
+        print(f"[Query Guard] explain failed for {shape}, allowing: {e}")
+        reason = None
+    _remember(shape, reason)
+    return shape, reason
+
+
+async def guarded_find_async(collection, flt: dict, sort: list, limit: int, fallback_sort: list = None):
+    if QUERY_GUARD_MODE != "off":
+        shape, reason = await _verdict_async(collection, flt, sort, limit)
+        if reason:
+            rewrite_ok = QUERY_GUARD_MODE == "rewrite" and bool(fallback_sort) and fallback_sort != sort \
+                and not (await _verdict_async(collection, flt, fallback_sort, limit))[1]
+            if _decide(collection.name, shape, reason, rewrite_ok):
+                sort = fallback_sort
+    return collection.find(flt).sort(sort).limit(limit)
@@ -0,0 +1,315 @@
+"""
+Materialized hourly / daily / monthly rollups of approved data.
+
+For every dataset with value_fields, each rollup collection
+(<final>_rollup_hour, _day, _month) holds one document per bucket (and per
+series, for plant data):
+
+    {_id: {bucket, series}, bucket, <series_field>, count,
+     sum: {field: x}, min: {...}, max: {...}, n: {field: numeric points}}
+
+Approvals replace points (ReplaceOne upsert), so buckets are recomputed
+rather than adjusted by deltas: refresh() re-aggregates the touched hours
+from the final collection, then the touched days from the hourly rollup and
+the touched months from the daily one, each written with $merge.
+rebuild() does the same over a whole range one month at a time; run it once
+after deploying (day/month buckets are only as complete as the hours below
+them), for backfills, and after a refresh failed:
+
+    flask --app app rebuild-rollups [DATASET] [--start ISO] [--end ISO]
+    python -m utils.rollups [DATASET] [--start ISO] [--end ISO]
+
+resample() serves range reads at any fixed interval (or calendar months)
+from the coarsest rollup that lines up with it, falling back to the raw
+points otherwise.
+
+$dateTrunc / $merge need MongoDB 5.0+.
+"""
+from datetime import datetime, timedelta
+import os
+
+from pymongo import ASCENDING
+
+from utils.datasets import DATASETS
+from utils.dates import naive_utc
+from utils.mongo import collection
+
+LEVELS = ("hour", "day", "month")
+# Upper bound on buckets returned by resample()
+MAX_BUCKETS = int(os.getenv("ROLLUP_MAX_BUCKETS", "50000"))
+# Past this many disjoint touched ranges, refresh() recomputes their overall span instead
+MAX_REFRESH_RUNS = int(os.getenv("ROLLUP_MAX_REFRESH_RUNS", "200"))
+
+_HOUR = timedelta(hours=1)
+_DAY = timedelta(days=1)
+_MS = timedelta(milliseconds=1)
+
+
+class RollupError(ValueError):
+    """Invalid resample / rebuild request (→ 400)"""
+
+
+def rollup_datasets() -> list:
+    return [name for name, d in DATASETS.items() if d["value_fields"]]
+
+
+def rollup_collection(name: str, level: str):
+    dataset = DATASETS[name]
+    return collection(f"{dataset['final']}_rollup_{level}", dataset["db"])
+
+
+def ensure_rollup_indexes():
+    for name in rollup_datasets():
+        series_field = DATASETS[name]["series_field"]
+        keys = [("bucket", ASCENDING)] + ([(series_field, ASCENDING)] if series_field else [])
+        for level in LEVELS:
+            rollup_collection(name, level).create_index(keys)
+
+
+# ── Bucket helpers ──────────────────────────────────────────────────
+def truncate(ts: datetime, level: str) -> datetime:
+    if level == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if level == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_bucket(ts: datetime, level: str) -> datetime:
+    if level == "hour":
+        return ts + _HOUR
+    if level == "day":
+        return ts + _DAY
+    return ts.replace(year=ts.year + 1, month=1) if ts.month == 12 else ts.replace(month=ts.month + 1)
+
+
+def _ranges(buckets, level: str) -> list:
+    """Contiguous [start, end) runs covering the given bucket starts"""
+    runs = []
+    for b in sorted(set(buckets)):
+        if runs and runs[-1][1] == b:
+            runs[-1][1] = next_bucket(b, level)
+        else:
+            runs.append([b, next_bucket(b, level)])
+    if len(runs) > MAX_REFRESH_RUNS:
+        runs = [[runs[0][0], runs[-1][1]]]
+    return runs
+
+
+def _range_match(field: str, runs: list) -> dict:
+    clauses = [{field: {"$gte": start, "$lt": end}} for start, end in runs]
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+# ── Pipelines ───────────────────────────────────────────────────────
+def _group_stage(bucket_expr, series_expr, fields: list, from_rollup: bool) -> dict:
+    group = {"_id": {"bucket": bucket_expr, "series": series_expr}}
+    if from_rollup:
+        group["count"] = {"$sum": "$count"}
+    else:
+        group["count"] = {"$sum": 1}
+    for i, field in enumerate(fields):
+        if from_rollup:
+            group[f"sum{i}"] = {"$sum": f"$sum.{field}"}
+            group[f"min{i}"] = {"$min": f"$min.{field}"}
+            group[f"max{i}"] = {"$max": f"$max.{field}"}
+            group[f"n{i}"] = {"$sum": f"$n.{field}"}
+        else:
+            group[f"sum{i}"] = {"$sum": f"${field}"}
+            group[f"min{i}"] = {"$min": f"${field}"}
+            group[f"max{i}"] = {"$max": f"${field}"}
+            group[f"n{i}"] = {"$sum": {"$cond": [{"$isNumber": f"${field}"}, 1, 0]}}
+    return {"$group": group}
+
+
+def _shape_stage(series_field, fields: list) -> dict:
+    # $group output names are positional (sum0…); give them their field names back
+    project = {
+        "bucket": "$_id.bucket",
+        "count": 1,
+        "sum": {field: f"$sum{i}" for i, field in enumerate(fields)},
+        "min": {field: f"$min{i}" for i, field in enumerate(fields)},
+        "max": {field: f"$max{i}" for i, field in enumerate(fields)},
+        "n": {field: f"$n{i}" for i, field in enumerate(fields)},
+    }
+    if series_field:
+        project[series_field] = "$_id.series"
+    return {"$project": project}
+
+
+def _level_pipeline(name: str, level: str, match: dict) -> list:
+    """Aggregation writing `level` buckets; hour reads raw points, day/month the level below"""
+    dataset = DATASETS[name]
+    series_field, fields = dataset["series_field"], list(dataset["value_fields"])
+    from_rollup = level != "hour"
+    date = "$bucket" if from_rollup else f"${dataset['time_field']}"
+    series = (f"${series_field}" if series_field else {"$literal": None})
+    target = rollup_collection(name, level)
+    return [
+        {"$match": match},
+        _group_stage({"$dateTrunc": {"date": date, "unit": level}}, series, fields, from_rollup),
+        _shape_stage(series_field, fields),
+        {"$merge": {"into": target.name, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def _source(name: str, level: str):
+    if level == "hour":
+        dataset = DATASETS[name]
+        return collection(dataset["final"], dataset["db"]), dataset["time_field"]
+    return rollup_collection(name, LEVELS[LEVELS.index(level) - 1]), "bucket"
+
+
+def _recompute(name: str, level: str, runs: list):
+    source, field = _source(name, level)
+    source.aggregate(_level_pipeline(name, level, _range_match(field, runs)), allowDiskUse=True)
+
+
+# ── Incremental refresh (approvals) ─────────────────────────────────
+def refresh(name: str, docs: list) -> dict:
+    """Recompute the hour/day/month buckets touched by approved `docs`"""
+    if name not in rollup_datasets():
+        return {}
+    time_field = DATASETS[name]["time_field"]
+    stamps = [d[time_field] for d in docs if isinstance(d.get(time_field), datetime)]
+    touched = {}
+    for level in LEVELS:
+        runs = _ranges((truncate(ts, level) for ts in stamps), level)
+        if runs:
+            _recompute(name, level, runs)
+        touched[level] = len(runs)
+    return touched
+
+
+# ── Rebuild (backfills) ─────────────────────────────────────────────
+def _extent(name: str):
+    dataset = DATASETS[name]
+    final, time_field = collection(dataset["final"], dataset["db"]), dataset["time_field"]
+    first = final.find_one({}, {time_field: 1}, sort=[(time_field, ASCENDING)])
+    last = final.find_one({}, {time_field: 1}, sort=[(time_field, -1)])
+    if not first or not last:
+        return None, None
+    return first[time_field], last[time_field]
+
+
+def rebuild(name: str, start: datetime = None, end: datetime = None, log=print) -> int:
+    """
+    Drop and recompute every rollup of `name` in [start, end) (default: all
+    approved data), widened to whole months. Returns the months rebuilt.
+    """
+    if name not in rollup_datasets():
+        raise RollupError(f"No rollups for '{name}' (expected one of {', '.join(rollup_datasets())})")
+    first, last = _extent(name)
+    start = start or first
+    end = end or (last + _HOUR if last else None)
+    if start is None or end is None or start >= end:
+        return 0
+
+    month = truncate(start, "month")
+    months = 0
+    while month < end:
+        run = [[month, next_bucket(month, "month")]]
+        for level in LEVELS:
+            rollup_collection(name, level).delete_many(_range_match("bucket", run))
+        for level in LEVELS:
+            _recompute(name, level, run)
+        log(f"[Rollups] {name} {month:%Y-%m} rebuilt")
+        month = run[0][1]
+        months += 1
+    return months
+
+
+# ── Resampled reads ─────────────────────────────────────────────────
+def parse_interval(value: str):
+    """'month' or a fixed interval like 15m, 1h, 1d, 7d → ('month', None) / ('fixed', timedelta)"""
+    value = (value or "").strip().lower()
+    if value in ("month", "1mo"):
+        return "month", None
+    units = {"m": "minutes", "h": "hours", "d": "days"}
+    if len(value) < 2 or value[-1] not in units or not value[:-1].isdigit() or int(value[:-1]) <= 0:
+        raise RollupError("interval must look like 15m, 1h, 1d, 7d or month")
+    return "fixed", timedelta(**{units[value[-1]]: int(value[:-1])})
+
+
+def _aligned(ts: datetime, level: str) -> bool:
+    return truncate(ts, level) == ts
+
+
+def pick_source(kind: str, every: timedelta, start: datetime, end: datetime):
+    """Coarsest rollup level a [start, end) read at this interval can use, or None for raw points"""
+    if kind == "month":
+        candidates = LEVELS[::-1]
+    else:
+        candidates = [lvl for lvl, size in (("day", _DAY), ("hour", _HOUR)) if every % size == timedelta(0)]
+    for level in candidates:
+        if _aligned(start, level) and _aligned(end, level):
+            return level
+    return None
+
+
+def resample(name: str, start: datetime, end: datetime, interval: str = "1h", series: str = None) -> dict:
+    """Buckets of `name` in [start, end) at `interval`, from rollups where they line up"""
+    start, end = naive_utc(start), naive_utc(end)
+    if name not in rollup_datasets():
+        raise RollupError(f"No rollups for '{name}' (expected one of {', '.join(rollup_datasets())})")
+    if not start or not end or start >= end:
+        raise RollupError("start and end are required, with start before end")
+    dataset = DATASETS[name]
+    series_field, fields = dataset["series_field"], list(dataset["value_fields"])
+    if series and not series_field:
+        raise RollupError(f"{name} has a single series")
+
+    kind, every = parse_interval(interval)
+    if kind == "fixed" and (end - start) // every > MAX_BUCKETS:
+        raise RollupError(f"More than {MAX_BUCKETS} buckets; use a wider interval or a shorter range")
+
+    level = pick_source(kind, every, start, end)
+    if level is None:
+        coll, time_field = collection(dataset["final"], dataset["db"]), dataset["time_field"]
+    else:
+        coll, time_field = rollup_collection(name, level), "bucket"
+
+    match = {time_field: {"$gte": start, "$lt": end}}
+    if series:
+        match[series_field] = series
+    date = f"${time_field}"
+    if kind == "month":
+        bucket = {"$dateTrunc": {"date": date, "unit": "month"}}
+    else:
+        # Fixed-size buckets counted from `start`
+        every_ms = every // _MS
+        bucket = {"$add": [start, {"$multiply": [
+            {"$floor": {"$divide": [{"$subtract": [date, start]}, every_ms]}}, every_ms]}]}
+    series_expr = f"${series_field}" if series_field else {"$literal": None}
+
+    pipeline = [
+        {"$match": match},
+        _group_stage(bucket, series_expr, fields, from_rollup=level is not None),
+        _shape_stage(series_field, fields),
+        {"$sort": {"bucket": 1, **({series_field: 1} if series_field else {})}},
+    ]
+    rows = []
+    for doc in coll.aggregate(pipeline, allowDiskUse=True):
+        doc.pop("_id", None)
+        doc["avg"] = {f: (doc["sum"][f] / doc["n"][f] if doc["n"][f] else None) for f in fields}
+        rows.append(doc)
+    return {
+        "dataset": name,
+        "interval": interval,
+        "source": f"rollup_{level}" if level else "raw",
+        "start": start,
+        "end": end,
+        "rows": rows,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild materialized rollups")
+    parser.add_argument("dataset", nargs="?", help="one of the rollup datasets (default: all)")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    args = parser.parse_args()
+    for dataset_name in [args.dataset] if args.dataset else rollup_datasets():
+        print(f"[Rollups] {dataset_name}: {rebuild(dataset_name, args.start, args.end)} month(s) rebuilt")
@@ -1,21 +1,23 @@
-from pymongo import MongoClient
 from datetime import datetime
 from dotenv import load_dotenv
 import os
 
+from utils import transaction_spool
+from utils.mongo import collection
+
 load_dotenv()
 
 # MongoDB setup
-mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(mongo_uri, maxPoolSize=200)
-db = client["powercasting"]
-transaction_collection = db["Transaction_History"]
+transaction_collection = collection("Transaction_History")
+
+# Logs go to the local spool first and are replayed into Mongo in batches
+SPOOL_ENABLED = os.getenv("TRANSACTION_SPOOL_ENABLED", "1") not in ("0", "false", "False")
 
 
 def log_transaction(endpoint, method, request_body, request_headers,
                     response_status, response_body):
     """
-    Save a transaction log into MongoDB
+    Save a transaction log into MongoDB (via the local spool when enabled)
     """
     try:
         user_email = request_headers.get("X-User-Email") or None
@@ -28,6 +30,12 @@ def log_transaction(endpoint, method, request_body, request_headers,
             "response_body": response_body,
             "timestamp": datetime.utcnow()
         }
+        if SPOOL_ENABLED:
+            try:
+                transaction_spool.append(log_entry)
+                return
+            except OSError as e:
+                print(f"[Transaction Spool Error] {e}")
         transaction_collection.insert_one(log_entry)
     except Exception as e:
         print(f"[Transaction Logger Error] {e}")
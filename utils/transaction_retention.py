@@ -0,0 +1,154 @@
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import fcntl
+import os
+import threading
+import time
+
+from utils.transaction_logger import transaction_collection
+
+load_dotenv()
+
+# ── Config ──────────────────────────────────────────────────────────
+# TTL is applied by a Mongo TTL index on `timestamp`; 0 disables it.
+TTL_DAYS = int(os.getenv("TRANSACTION_TTL_DAYS", "0"))
+# Background purge keeps `RETENTION_DAYS` of history (0 disables it).
+RETENTION_DAYS = int(os.getenv("TRANSACTION_RETENTION_DAYS", "0"))
+PURGE_BATCH_SIZE = int(os.getenv("TRANSACTION_PURGE_BATCH_SIZE", "1000"))
+PURGE_PAUSE_SECONDS = float(os.getenv("TRANSACTION_PURGE_PAUSE_MS", "200")) / 1000
+PURGE_INTERVAL_SECONDS = int(os.getenv("TRANSACTION_PURGE_INTERVAL_SECONDS", "3600"))
+PURGE_LOCK_FILE = os.getenv("TRANSACTION_PURGE_LOCK_FILE", "/tmp/guvnl_transaction_purge.lock")
+
+TTL_INDEX_NAME = "timestamp_ttl"
+
+_worker_started = False
+_worker_lock = threading.Lock()
+
+
+def ensure_ttl_index():
+    """Create (or retune) the TTL index on Transaction_History.timestamp"""
+    if TTL_DAYS <= 0:
+        # Plain index still backs the history listing and range deletes
+        transaction_collection.create_index([("timestamp", DESCENDING)])
+        return
+
+    expire_after = TTL_DAYS * 24 * 3600
+    try:
+        transaction_collection.create_index(
+            [("timestamp", ASCENDING)],
+            name=TTL_INDEX_NAME,
+            expireAfterSeconds=expire_after,
+        )
+    except OperationFailure:
+        # Index exists with another expiry → retune it in place
+        transaction_collection.database.command({
+            "collMod": transaction_collection.name,
+            "index": {"name": TTL_INDEX_NAME, "expireAfterSeconds": expire_after},
+        })
+
+
+def _timestamp_range(start=None, end=None) -> dict:
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+    return {"timestamp": bounds} if bounds else {}
+
+
+def purge_range(start=None, end=None, batch_size: int = PURGE_BATCH_SIZE,
+                pause_seconds: float = PURGE_PAUSE_SECONDS) -> int:
+    """
+    Delete logs with start <= timestamp < end in small batches.
+    Each batch is bounded by the timestamp of the batch_size-th oldest
+    matching log, so only one boundary document is read per batch.
+    """
+    base_filter = _timestamp_range(start, end)
+    deleted = 0
+    while True:
+        boundary = list(
+            transaction_collection.find(base_filter, {"timestamp": 1, "_id": 0})
+            .sort("timestamp", ASCENDING)
+            .skip(batch_size - 1)
+            .limit(1)
+        )
+        if not boundary:
+            # Fewer than one batch left → finish in a single delete
+            deleted += transaction_collection.delete_many(base_filter).deleted_count
+            return deleted
+
+        batch_filter = _timestamp_range(start, None)
+        batch_filter.setdefault("timestamp", {})["$lte"] = boundary[0]["timestamp"]
+        result = transaction_collection.delete_many(batch_filter)
+        deleted += result.deleted_count
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+def purge_newest(limit: int) -> int:
+    """Delete the `limit` newest logs without loading their ids"""
+    if limit <= 0:
+        return 0
+
+    boundary = list(
+        transaction_collection.find({}, {"timestamp": 1, "_id": 0})
+        .sort("timestamp", DESCENDING)
+        .skip(limit - 1)
+        .limit(1)
+    )
+    if not boundary:
+        return transaction_collection.delete_many({}).deleted_count
+
+    boundary_ts = boundary[0]["timestamp"]
+    deleted = transaction_collection.delete_many({"timestamp": {"$gt": boundary_ts}}).deleted_count
+
+    # Logs sharing the boundary timestamp: remove only as many as still needed
+    while deleted < limit:
+        if transaction_collection.find_one_and_delete({"timestamp": boundary_ts}) is None:
+            break
+        deleted += 1
+    return deleted
+
+
+def purge_expired() -> int:
+    """Apply RETENTION_DAYS once"""
+    if RETENTION_DAYS <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+    return purge_range(end=cutoff)
+
+
+def _purge_loop():
+    # Only one gunicorn worker holds the lock; the rest stay idle
+    with open(PURGE_LOCK_FILE, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        while True:
+            try:
+                deleted = purge_expired()
+                if deleted:
+                    print(f"[Transaction Retention] purged {deleted} logs")
+            except Exception as e:
+                print(f"[Transaction Retention Error] {e}")
+            time.sleep(PURGE_INTERVAL_SECONDS)
+
+
+def start_retention_worker():
+    """Start the background purge thread (no-op when retention is disabled)"""
+    global _worker_started
+    if RETENTION_DAYS <= 0 or _worker_started:
+        return
+    with _worker_lock:
+        if _worker_started:
+            return
+        threading.Thread(target=_purge_loop, name="transaction-retention", daemon=True).start()
+        _worker_started = True
+
+
+if __name__ == "__main__":
+    ensure_ttl_index()
+    print(f"[Transaction Retention] purged {purge_expired()} logs")
@@ -0,0 +1,214 @@
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+import atexit
+import glob
+import os
+import threading
+import time
+
+load_dotenv()
+
+# ── Config ──────────────────────────────────────────────────────────
+SPOOL_DIR = os.getenv("TRANSACTION_SPOOL_DIR", "/tmp/guvnl_transaction_spool")
+SEGMENT_MAX_BYTES = int(os.getenv("TRANSACTION_SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+SEGMENT_MAX_AGE_SECONDS = float(os.getenv("TRANSACTION_SPOOL_SEGMENT_AGE_SECONDS", "2"))
+FSYNC_INTERVAL_SECONDS = float(os.getenv("TRANSACTION_SPOOL_FSYNC_SECONDS", "1"))
+REPLAY_BATCH_SIZE = int(os.getenv("TRANSACTION_SPOOL_REPLAY_BATCH", "500"))
+REPLAY_BACKOFF_SECONDS = float(os.getenv("TRANSACTION_SPOOL_BACKOFF_SECONDS", "5"))
+
+# Segment lifecycle: <pid>-<ms>-<seq>.open → .sealed → .replaying → removed
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".sealed"
+REPLAYING_SUFFIX = ".replaying"
+
+DUPLICATE_KEY = 11000
+
+_lock = threading.Lock()
+_state = {
+    "pid": None,
+    "file": None,
+    "path": None,
+    "opened_at": 0.0,
+    "seq": 0,
+    "dirty": False,
+}
+
+
+def _segment_path(pid: int, seq: int, suffix: str) -> str:
+    return os.path.join(SPOOL_DIR, f"{pid}-{int(time.time() * 1000)}-{seq:06d}{suffix}")
+
+
+def _open_segment():
+    _state["seq"] += 1
+    path = _segment_path(os.getpid(), _state["seq"], OPEN_SUFFIX)
+    _state["file"] = open(path, "ab")
+    _state["path"] = path
+    _state["opened_at"] = time.monotonic()
+
+
+def _seal_segment():
+    """Close the active segment and hand it to the replayer"""
+    f = _state["file"]
+    if f is None:
+        return
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    path = _state["path"]
+    if os.path.getsize(path) == 0:
+        os.remove(path)
+    else:
+        os.rename(path, path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+    _state["file"] = None
+    _state["path"] = None
+    _state["dirty"] = False
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _recover_orphans():
+    """Seal segments left open by dead workers and requeue stalled replays"""
+    for path in glob.glob(os.path.join(SPOOL_DIR, "*" + OPEN_SUFFIX)) + \
+            glob.glob(os.path.join(SPOOL_DIR, "*" + REPLAYING_SUFFIX)):
+        pid = int(os.path.basename(path).split("-", 1)[0])
+        if pid == os.getpid() or _pid_alive(pid):
+            continue
+        base = path.rsplit(".", 1)[0]
+        try:
+            os.rename(path, base + SEALED_SUFFIX)
+        except OSError:
+            pass
+
+
+def _ensure_started():
+    # Runs in each process after fork; the parent's handles are discarded
+    if _state["pid"] == os.getpid():
+        return
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    _state.update({"pid": os.getpid(), "file": None, "path": None, "seq": 0, "dirty": False})
+    _recover_orphans()
+    atexit.register(flush)
+    threading.Thread(target=_fsync_loop, name="transaction-spool-fsync", daemon=True).start()
+    threading.Thread(target=_replay_loop, name="transaction-spool-replay", daemon=True).start()
+
+
+def append(entry: dict):
+    """Append one log entry to the local spool (no Mongo I/O)"""
+    entry.setdefault("_id", ObjectId())
+    line = json_util.dumps(entry).encode("utf-8") + b"\n"
+    with _lock:
+        _ensure_started()
+        if _state["file"] is None:
+            _open_segment()
+        _state["file"].write(line)
+        _state["dirty"] = True
+        if _state["file"].tell() >= SEGMENT_MAX_BYTES:
+            _seal_segment()
+
+
+def _fsync_loop():
+    while True:
+        time.sleep(FSYNC_INTERVAL_SECONDS)
+        try:
+            with _lock:
+                f = _state["file"]
+                if f is None:
+                    continue
+                if _state["dirty"]:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    _state["dirty"] = False
+                if time.monotonic() - _state["opened_at"] >= SEGMENT_MAX_AGE_SECONDS:
+                    _seal_segment()
+        except Exception as e:
+            print(f"[Transaction Spool Error] {e}")
+
+
+def _insert_batch(collection, batch: list):
+    try:
+        collection.insert_many(batch, ordered=False)
+    except BulkWriteError as bwe:
+        # Already replayed entries (same _id) are fine; anything else is not
+        errors = bwe.details.get("writeErrors", [])
+        if any(err.get("code") != DUPLICATE_KEY for err in errors) or \
+                bwe.details.get("writeConcernErrors"):
+            raise
+
+
+def replay_segment(collection, path: str) -> int:
+    """Insert one claimed segment into Mongo in batches; returns entries replayed"""
+    replayed = 0
+    batch = []
+    with open(path, "rb") as f:
+        for raw in f:
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                batch.append(json_util.loads(raw))
+            except ValueError:
+                # Torn final line from a crash mid-write
+                continue
+            if len(batch) >= REPLAY_BATCH_SIZE:
+                _insert_batch(collection, batch)
+                replayed += len(batch)
+                batch = []
+    if batch:
+        _insert_batch(collection, batch)
+        replayed += len(batch)
+    os.remove(path)
+    return replayed
+
+
+def drain(collection) -> int:
+    """Replay every sealed segment; stops at the first Mongo failure"""
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(SPOOL_DIR, "*" + SEALED_SUFFIX))):
+        # Claimed name carries our pid so orphan recovery can tell who owns it
+        rest = os.path.basename(path).split("-", 1)[1][: -len(SEALED_SUFFIX)]
+        claimed = os.path.join(SPOOL_DIR, f"{os.getpid()}-{rest}{REPLAYING_SUFFIX}")
+        try:
+            os.rename(path, claimed)  # atomic claim between workers
+        except OSError:
+            continue
+        try:
+            replayed += replay_segment(collection, claimed)
+        except Exception:
+            os.rename(claimed, path)
+            raise
+    return replayed
+
+
+def _replay_loop():
+    from utils.transaction_logger import transaction_collection
+
+    while True:
+        try:
+            _recover_orphans()
+            drain(transaction_collection)
+            time.sleep(SEGMENT_MAX_AGE_SECONDS)
+        except Exception as e:
+            print(f"[Transaction Spool Replay Error] {e}")
+            time.sleep(REPLAY_BACKOFF_SECONDS)
+
+
+def pending_segments() -> int:
+    """Number of segments not yet replayed (for health checks)"""
+    return len(glob.glob(os.path.join(SPOOL_DIR, "*" + SEALED_SUFFIX))) + \
+        len(glob.glob(os.path.join(SPOOL_DIR, "*" + REPLAYING_SUFFIX)))
+
+
+def flush():
+    """Seal the active segment now (used on shutdown)"""
+    with _lock:
+        if _state["pid"] == os.getpid():
+            _seal_segment()